@@ -23,9 +23,22 @@ from optparse import OptionParser
 
 parser = OptionParser(   """
    usage: %prog [options] input_workspace.root output_workspace.root old_pattern new_pattern [ old_pattern2 new_pattern2 ...]
+          %prog [options] --apply-plan plan.json input_workspace.root output_workspace.root
 
    Tool for changing content of RooFormulaVars.
 
+   With -n, only the formula expressions are analyzed and the changes
+   are printed (and written as a json plan with --plan). Such a plan can
+   later be applied with --apply-plan without specifying the patterns again.
+   With --cache-formulas, the formula expressions extracted from the
+   input file are stored in a file next to it (with suffix """ + wsutils.sidecarSuffix + """)
+   and taken from there in subsequent runs.
+
+   With -j, the workspaces in the input file are processed by several
+   worker processes. Each worker writes its rewritten workspace to a
+   temporary file from which the main process copies it to the output
+   file (in the same order as the workspaces in the input file).
+
    WARNING: the program will overwrite the output workspace file without asking for confirmation.
 
    example:
@@ -33,7 +46,7 @@ parser = OptionParser(   """
    %prog --lib $CMSSW_BASE/lib/$SCRAM_ARCH/libHiggsAnalysisCombinedLimit.so input.root output.root \\
       '(.*)_v2$' '\\1'
 
-   will rename e.g. XYZ_v2 to XYZ      
+   will rename e.g. XYZ_v2 to XYZ
 
 """)
 
@@ -44,7 +57,36 @@ parser.add_option("-n",
                   dest="dryrun",
                   default = False,
                   action="store_true",
-                  help="do NOT run any renaming but just check if renamings would not cause any conflict",
+                  help="do NOT change anything but just print the formulas which would be changed",
+                  )
+
+parser.add_option("--plan",
+                  dest="planFname",
+                  default = None,
+                  help="with -n, write the changes as json to the given file",
+                  metavar="FILE",
+                  )
+
+parser.add_option("--apply-plan",
+                  dest="applyPlanFname",
+                  default = None,
+                  help="apply the changes from a plan written with -n --plan instead of applying patterns",
+                  metavar="FILE",
+                  )
+
+parser.add_option("--cache-formulas",
+                  dest="cacheFormulas",
+                  default = False,
+                  action="store_true",
+                  help="store the formula expressions of the input file in a file next to it and reuse them in subsequent runs",
+                  )
+
+parser.add_option("-j",
+                  dest="numProcesses",
+                  default = 1,
+                  type = int,
+                  help="number of worker processes, each processing one workspace at a time (default: %default)",
+                  metavar="N",
                   )
 
 (options, ARGV) = parser.parse_args()
@@ -74,7 +116,7 @@ def findWorkspace(rootFile):
         print >> sys.stderr,"no RooWorkspace found in file",rootFile
         sys.exit(1)
 
-    return retval    
+    return retval
 
 def findAllWorkspace(rootFile):
     """ searches for a toplevel RooWorkspace instance in the given TFile """
@@ -94,7 +136,7 @@ def findAllWorkspace(rootFile):
         print >> sys.stderr,"no RooWorkspace found in file",rootFile
         sys.exit(1)
 
-    return retval    
+    return retval
 
 def Import(w,o,arg=ROOT.RooFit.RecycleConflictNodes()):
     '''RecycleConflictNodes() default (needed in this flow), ROOT.RooArgCmd()'''
@@ -107,60 +149,50 @@ def swap(l,pos1,pos2):
     return l
 
 #----------------------------------------------------------------------
-# main
-#----------------------------------------------------------------------
 
-#----------------------------------------
-wsutils.checkCommonOptions(options)
+def findChanges(ws, renameArgs, fname):
+    """ @return a list of dicts with the name, the old and the new formula
+        of the RooFormulaVars in ws which are modified by the renaming
+        rules. Only the formula expressions are extracted (from the
+        formula catalog of the workspace, which is also stored next
+        to the input file fname unless fname is None), no objects
+        are created. """
 
+    graph = wsutils.getGraph(ws)
+    catalog = wsutils.getFormulaCatalog(ws, fname)
 
-if len(ARGV) < 4:
-    print >> sys.stderr,"must specify at least four positional arguments. Run with -h to get more information"
-    sys.exit(1)
+    changes = []
 
-inputFname = ARGV.pop(0)
-outputFname = ARGV.pop(0)
-
-if len(ARGV) % 2 != 0:
-    print >> sys.stderr,"must specify an even number of arguments after the input and output files"
-    sys.exit(1)
-
-renameArgs = zip(ARGV[::2],ARGV[1::2])
-
-
-#----------------------------------------
+    for name, className in zip(graph.names, graph.classNames):
+        if not wsutils.classInheritsFrom(className, "RooFormulaVar"):
+            continue
 
+        formula = catalog[name][0]
+        formula2 = formula
+        nsubs = 0
+        for src, dest in renameArgs:
+            formula2, numSubs = re.subn(src, dest, formula2)
+            nsubs += numSubs
 
-wsutils.loadLibraries(options)
+        if nsubs > 0:
+            changes.append(dict(name = name, old = formula, new = formula2))
 
-fin = ROOT.TFile.Open(inputFname)
-
-if fin == None or not fin.IsOpen():
-    print >> sys.stderr,"error opening input file " + inputFname
-    sys.exit(1)
+    return changes
 
+#----------------------------------------------------------------------
 
-#ws = findWorkspace(fin)
-allws = findAllWorkspace(fin)
-allws2 = []
-hassub=[]
+def sortFormulas(ws, allRFV):
+    """ sorts the given RooFormulaVars such that servers come
+        before their clients """
 
-import re
-for ws in allws:
-    allMembers = wsutils.getAllMembers(ws)
-    ws2=ROOT.RooWorkspace(ws.GetName(),ws.GetTitle())
-    S_nsubs=0
-    allRFV=[]
-    for x in allMembers:
-        if isinstance(x,ROOT.RooFormulaVar):
-            allRFV.append(x)
+    graph = wsutils.getGraph(ws)
 
     count=0
     changed=True
     while changed:
         changed=False
         count+=1
-        if count > 1002: 
+        if count > 1002:
             print "current allRFV are:"
             print "allRFV:",",".join([k.GetName() for k in allRFV])
             raise ValueError("Unable to sort by swapping?")
@@ -168,19 +200,19 @@ for ws in allws:
             if changed: break
             follow=allRFV[i+1:]
             prec=allRFV[:i]
-            precname=[k.GetName() for k in prec] 
-            for y in wsutils.getClients(x):
+            precname=[k.GetName() for k in prec]
+            for y in graph.clients[graph.index[x.GetName()]]:
                 if changed: break
-                if y.GetName() in precname:
+                if graph.names[y] in precname:
 
                     allRFVname=[k.GetName() for k in allRFV]
-                    j=allRFVname.index(y.GetName())
+                    j=allRFVname.index(graph.names[y])
 
-                    if count> 1000: 
-                        print "->Swapping", x.GetName(),"<->",y.GetName() ## DEBUG
+                    if count> 1000:
+                        print "->Swapping", x.GetName(),"<->",graph.names[y] ## DEBUG
                         print "precname",precname
-                        print "y:", y
-                        print "x clients",",".join([k.GetName() for k in wsutils.getClients(x)])
+                        print "y:", graph.names[y]
+                        print "x clients",",".join([graph.names[k] for k in graph.clients[graph.index[x.GetName()]]])
                         print "allRFVname:",",".join(allRFVname), "len=",len(allRFV)
                         print "want to swap",i,j
 
@@ -190,62 +222,254 @@ for ws in allws:
     for i,x in enumerate(allRFV):
         prec=allRFV[:i]
         precname=[k.GetName() for k in prec]
-        for y in wsutils.getClients(x):
-            if y.GetName() in precname:
-                print "->ERROR Unimplemented (dependencies)", x.GetName(),y.GetName()
+        for y in graph.clients[graph.index[x.GetName()]]:
+            if graph.names[y] in precname:
+                print "->ERROR Unimplemented (dependencies)", x.GetName(),graph.names[y]
+
+    return allRFV
+
+#----------------------------------------------------------------------
+
+def applyChanges(ws, changes):
+    """ @return a new workspace with the given changes (see findChanges(..))
+        applied or None if there are no changes """
+
+    if not changes:
+        return None
+
+    newFormulas = dict((change['name'], change) for change in changes)
+
+    catalog = wsutils.getFormulaCatalog(ws)
+
+    allMembers = wsutils.getAllMembers(ws)
+    ws2=ROOT.RooWorkspace(ws.GetName(),ws.GetTitle())
+
+    allRFV=[]
+    for x in allMembers:
+        if isinstance(x,ROOT.RooFormulaVar):
+            allRFV.append(x)
+
+    # note that we can't exit here when running in a worker process
+    missing = set(newFormulas.keys()) - set(x.GetName() for x in allRFV)
+    if missing:
+        raise Exception("RooFormulaVars %s not found in workspace %s" % (",".join(sorted(missing)), ws.GetName()))
+
+    allRFV = sortFormulas(ws, allRFV)
 
     for x in allRFV:
             name=x.GetName()
 
-            s=ROOT.std.stringstream()
-            x.printMetaArgs(s) ## stringstrema?
-            formula=re.sub('"\ +$','',re.sub('formula="','',s.str()))
-            formula2=formula[:]
-            nsubs=0
-            for src, dest in renameArgs:
-                formula2, numSubs= re.subn(src,dest,formula2)
-                nsubs+=numSubs
-            S_nsubs+=nsubs
-            if nsubs>0:
-                dep=ROOT.RooArgList()
-                idx=0
-                while True:
-                    p=x.getParameter(idx)
-                    if p==None: break
-                    idx+=1
-                    dep.add(p)
-                
-                #x.SetName(name+"_old")
-                x2=ROOT.RooFormulaVar(name,x.GetTitle(),formula2,dep)
-                Import(ws2,x2)
-
-                ### print info
-                print "* changing formula from",formula,"to",formula2 ## DEBUG
-                s2=ROOT.std.stringstream() ## DEBUG
-                x2.printArgs(s2) ## DEBUG
-                s1=ROOT.std.stringstream() ## DEBUG
-                x.printArgs(s1) ## DEBUG
-                print "  X ",s1.str() ## DEBUG
-                print "  ->",s2.str() ## DEBUG
-
-
-    if S_nsubs>0:
-        ''' Copy all remaining stuff'''
-        print "* copying remaining stuff" ## DEBUG
-        for x in allMembers:
-            print "** importing",x.GetName() ## DEBUG
-            Import(ws2,x)
-
-    hassub.append( (S_nsubs >0) )
-    allws2.append( ws2 if S_nsubs>0 else None )
-
-print >> sys.stderr,"writing output file",outputFname ## DEBUG
-if not options.dryrun: fOut=ROOT.TFile.Open(outputFname,"RECREATE")
-for ws,ws2,changed in zip(allws,allws2,hassub):
-    if changed:
-        print "* writing changed version of ws",ws2.GetName() ## DEBUG
-        if not options.dryrun: fOut.WriteTObject(ws2)
+            change = newFormulas.get(name)
+            if change == None:
+                continue
+
+            formula = catalog[name][0]
+            if formula != change['old']:
+                raise Exception("formula of %s in workspace %s is '%s' but expected '%s'" % (name, ws.GetName(), formula, change['old']))
+
+            formula2 = change['new']
+
+            dep=ROOT.RooArgList()
+            for p in wsutils.getFormulaParameters(x):
+                dep.add(p)
+
+            #x.SetName(name+"_old")
+            x2=ROOT.RooFormulaVar(name,x.GetTitle(),formula2,dep)
+            Import(ws2,x2)
+
+            ### print info
+            print "* changing formula from",formula,"to",formula2 ## DEBUG
+            s2=ROOT.std.stringstream() ## DEBUG
+            x2.printArgs(s2) ## DEBUG
+            s1=ROOT.std.stringstream() ## DEBUG
+            x.printArgs(s1) ## DEBUG
+            print "  X ",s1.str() ## DEBUG
+            print "  ->",s2.str() ## DEBUG
+
+    ''' Copy all remaining stuff'''
+    print "* copying remaining stuff" ## DEBUG
+    for x in allMembers:
+        print "** importing",x.GetName() ## DEBUG
+        Import(ws2,x)
+
+    return ws2
+
+#----------------------------------------------------------------------
+
+def processWorkspace(index):
+    """ applies the changes to the index-th workspace and writes the
+        result to a file in tmpdir. Run in a worker process.
+
+        @return the name of the file written or None if the
+        workspace is not changed
+    """
+
+    ws2 = applyChanges(allws[index], allChanges[index])
+
+    if ws2 == None:
+        return None
+
+    fname = os.path.join(tmpdir, "ws%d.root" % index)
+    fTmp = ROOT.TFile.Open(fname, "RECREATE")
+    fTmp.WriteTObject(ws2)
+    fTmp.Close()
+
+    # worker processes are reused for several workspaces
+    wsutils.clearGraphCache()
+
+    return fname
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+import re, json
+
+if options.applyPlanFname != None:
+    if len(ARGV) != 2:
+        print >> sys.stderr,"must specify exactly two positional arguments with --apply-plan. Run with -h to get more information"
+        sys.exit(1)
+
+    if options.dryrun:
+        print >> sys.stderr,"-n and --apply-plan can't be specified together"
+        sys.exit(1)
+
+elif len(ARGV) < 4:
+    print >> sys.stderr,"must specify at least four positional arguments. Run with -h to get more information"
+    sys.exit(1)
+
+if options.planFname != None and not options.dryrun:
+    print >> sys.stderr,"--plan requires -n"
+    sys.exit(1)
+
+inputFname = ARGV.pop(0)
+outputFname = ARGV.pop(0)
+
+if len(ARGV) % 2 != 0:
+    print >> sys.stderr,"must specify an even number of arguments after the input and output files"
+    sys.exit(1)
+
+renameArgs = zip(ARGV[::2],ARGV[1::2])
+
+plan = None
+if options.applyPlanFname != None:
+    planFile = open(options.applyPlanFname)
+    plan = json.load(planFile)
+    planFile.close()
+
+    if plan['fingerprint'] != wsutils.getFileFingerprint(inputFname):
+        print >> sys.stderr,"WARNING: %s is not the file the plan %s was made for, checking that the formulas still match" % (inputFname, options.applyPlanFname)
+
+#----------------------------------------
+
+
+wsutils.loadLibraries(options)
+
+fin = ROOT.TFile.Open(inputFname)
+
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"error opening input file " + inputFname
+    sys.exit(1)
+
+
+#ws = findWorkspace(fin)
+allws = findAllWorkspace(fin)
+
+if plan != None:
+    unknown = set(plan['workspaces'].keys()) - set(ws.GetName() for ws in allws)
+    if unknown:
+        print >> sys.stderr,"workspaces %s of the plan not found in %s" % (",".join(sorted(unknown)), inputFname)
+        sys.exit(1)
+
+#----------------------------------------
+# find the formulas to change
+#----------------------------------------
+allChanges = []
+for ws in allws:
+    if plan != None:
+        changes = plan['workspaces'].get(ws.GetName(), [])
     else:
-        print "* writing original version of ws",ws.GetName() ## DEBUG
-        if not options.dryrun: fOut.WriteTObject(ws)
-if not options.dryrun: fOut.Close()
+        changes = findChanges(ws, renameArgs, inputFname if options.cacheFormulas else None)
+
+    allChanges.append(changes)
+
+if options.dryrun:
+    for ws, changes in zip(allws, allChanges):
+        for change in changes:
+            print "* %s: %s: changing formula from %s to %s" % (ws.GetName(), change['name'], change['old'], change['new'])
+
+    print >> sys.stderr,"%d formulas would be changed" % sum(len(changes) for changes in allChanges)
+
+    if options.planFname != None:
+        plan = dict(input = inputFname,
+                    fingerprint = wsutils.getFileFingerprint(inputFname),
+                    rules = renameArgs,
+                    workspaces = dict((ws.GetName(), changes) for ws, changes in zip(allws, allChanges) if changes),
+                    )
+
+        fout = open(options.planFname, "w")
+        json.dump(plan, fout, indent = 1, sort_keys = True)
+        fout.close()
+
+        print >> sys.stderr,"wrote plan to",options.planFname
+
+    sys.exit(0)
+
+#----------------------------------------
+# apply them
+#----------------------------------------
+
+def writeOutputFile(getChanged):
+    """ writes all workspaces to the output file, the changed version
+        (returned by getChanged(index) for the index-th workspace) if
+        there is one and the original one otherwise """
+
+    print >> sys.stderr,"writing output file",outputFname ## DEBUG
+    fOut=ROOT.TFile.Open(outputFname,"RECREATE")
+    for index, ws in enumerate(allws):
+        ws2 = getChanged(index)
+        if ws2 != None:
+            print "* writing changed version of ws",ws.GetName() ## DEBUG
+            fOut.WriteTObject(ws2)
+        else:
+            print "* writing original version of ws",ws.GetName() ## DEBUG
+            fOut.WriteTObject(ws)
+    fOut.Close()
+
+if options.numProcesses == 1:
+    # no need to pass the changed workspaces through files
+    try:
+        changedWorkspaces = [ applyChanges(ws, changes) for ws, changes in zip(allws, allChanges) ]
+    except Exception, ex:
+        print >> sys.stderr,ex
+        sys.exit(1)
+
+    writeOutputFile(lambda index: changedWorkspaces[index])
+
+else:
+    import tempfile, shutil
+
+    tmpdir = tempfile.mkdtemp(prefix = "wsChangeRooFormulaVar")
+
+    try:
+        try:
+            tmpFnames = wsutils.parallelMap(processWorkspace, range(len(allws)), options.numProcesses)
+        except Exception, ex:
+            print >> sys.stderr,ex
+            sys.exit(1)
+
+        def readChanged(index):
+            if tmpFnames[index] == None:
+                return None
+            fTmp = ROOT.TFile.Open(tmpFnames[index])
+            ws2 = fTmp.Get(allws[index].GetName())
+            fTmp.Close()
+            return ws2
+
+        writeOutputFile(readChanged)
+
+    finally:
+        shutil.rmtree(tmpdir)
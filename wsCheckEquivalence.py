@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+import re
+
+#----------------------------------------------------------------------
+
+def mapName(name, renameArgs, mapping = {}):
+    """ applies the mapping of a renaming plan or the first matching
+        renaming rule to name (as wsRename.py does) """
+
+    if name in mapping:
+        return mapping[name]
+
+    for src, dest in renameArgs:
+        newName, numSubs = re.subn(src, dest, name)
+        if numSubs > 0:
+            return newName
+
+    return name
+
+#----------------------------------------------------------------------
+
+# filled before forking the worker processes:
+#   list of (parameter in first workspace, parameter in second workspace, min, max)
+params = []
+
+#   list of (label, function in first workspace, function in second workspace)
+functions = []
+
+def evaluatePoints(pointRange):
+    """ evaluates all functions at the parameter points with the given
+        range of indices (the values are generated from the point index,
+        so they do not depend on how the points are distributed
+        over the worker processes).
+
+        @return a list with one (max relative deviation, max absolute
+        deviation, index of point with max relative deviation) tuple
+        per function
+    """
+    import random
+
+    start, end = pointRange
+
+    retval = [ (0., 0., None) for func in functions ]
+
+    for point in range(start, end):
+        rng = random.Random(options.seed * 1000003 + point)
+
+        for param1, param2, vmin, vmax in params:
+            value = rng.uniform(vmin, vmax)
+            param1.setVal(value)
+            param2.setVal(value)
+
+        for i, (label, func1, func2) in enumerate(functions):
+            value1 = func1.getVal()
+            value2 = func2.getVal()
+
+            isNaN1, isNaN2 = value1 != value1, value2 != value2
+
+            if isNaN1 or isNaN2:
+                if isNaN1 and isNaN2:
+                    absDev = relDev = 0.
+                else:
+                    absDev = relDev = float('inf')
+            else:
+                absDev = abs(value1 - value2)
+                scale = max(abs(value1), abs(value2))
+
+                if scale > 0:
+                    relDev = absDev / scale
+                else:
+                    relDev = 0.
+
+            maxRelDev, maxAbsDev, worstPoint = retval[i]
+
+            if worstPoint == None or relDev > maxRelDev:
+                maxRelDev, worstPoint = relDev, point
+
+            retval[i] = (maxRelDev, max(maxAbsDev, absDev), worstPoint)
+
+    return retval
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file function1 [ function2 ... ]
+
+  checks that the given functions (or pdfs) of the workspace in input_file
+  evaluate to the same values as the corresponding ones in the workspace
+  in output_file (e.g. after running wsRename.py or wsChangeRooFormulaVar.py
+  on input_file).
+
+  The non-constant parameters the functions depend on are set to random
+  values (uniformly distributed within their ranges) in both workspaces
+  and the maximum relative deviation of each function is reported.
+
+  Names in the second workspace are obtained by applying the renaming
+  rules given with --rename (in the same way as wsRename.py does)
+  or the mapping of a plan written by wsRename.py -n --plan.
+
+  Exits with status 1 if a deviation larger than the --max-deviation
+  is found.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--rename",
+                  dest="renameArgs",
+                  default = [],
+                  nargs = 2,
+                  action="append",
+                  help="renaming rule (regular expression and replacement) to apply to names of the first workspace to obtain the names in the second workspace. Can be specified multiple times",
+                  metavar="OLD_PATTERN NEW_PATTERN",
+                  )
+
+parser.add_option("--plan",
+                  dest="planFname",
+                  default = None,
+                  help="take the names in the second workspace from the given plan written by wsRename.py -n --plan",
+                  metavar="FILE",
+                  )
+
+parser.add_option("--nll",
+                  dest="nllSpecs",
+                  default = [],
+                  action="append",
+                  help="also compare the negative log likelihood of the given pdf on the given dataset. Can be specified multiple times",
+                  metavar="PDF,DATA",
+                  )
+
+parser.add_option("--points",
+                  dest="numPoints",
+                  default = 1000,
+                  type = int,
+                  help="number of parameter points to evaluate (default: %default)",
+                  metavar="N",
+                  )
+
+parser.add_option("--seed",
+                  dest="seed",
+                  default = 1,
+                  type = int,
+                  help="random number seed (default: %default)",
+                  )
+
+parser.add_option("--max-deviation",
+                  dest="maxDeviation",
+                  default = 1e-9,
+                  type = float,
+                  help="maximum relative deviation considered as equivalent (default: %default)",
+                  metavar="DEV",
+                  )
+
+import multiprocessing
+parser.add_option("-j",
+                  dest="numProcesses",
+                  default = multiprocessing.cpu_count(),
+                  type = int,
+                  help="number of worker processes (default: %default)",
+                  metavar="N",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 2 or (len(ARGV) < 3 and not options.nllSpecs):
+    print >> sys.stderr,"expected at least three positional arguments (or two with --nll)"
+    sys.exit(1)
+
+inputFname = ARGV.pop(0)
+outputFname = ARGV.pop(0)
+functionNames = ARGV
+
+plan = None
+if options.planFname != None:
+    import json
+    planFile = open(options.planFname)
+    plan = json.load(planFile)
+    planFile.close()
+
+nllSpecs = wsutils.parseNLLSpecs(options.nllSpecs)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+ws1 = wsutils.readSingleWorkspace(inputFname, options)
+ws2 = wsutils.readSingleWorkspace(outputFname, options)
+
+startTime = wsutils.reportTiming(options, "reading workspaces", startTime)
+
+mapping = {}
+if plan != None:
+    entry = plan['workspaces'].get(ws1.GetName())
+    if entry == None:
+        print >> sys.stderr,"workspace %s not found in plan %s" % (ws1.GetName(), options.planFname)
+        sys.exit(1)
+    mapping = entry['mapping']
+
+def getObj2(name):
+    """ @return the object corresponding to the given name
+        of the first workspace in the second workspace """
+    return wsutils.getObj(ws2, mapName(name, options.renameArgs, mapping))
+
+#----------
+# functions to compare
+#----------
+roots = []
+
+for name in functionNames:
+    functions.append((name, wsutils.getObj(ws1, name), getObj2(name)))
+    roots.append(name)
+
+for pdfName, dataName in nllSpecs:
+    pdf1, data1 = wsutils.getObj(ws1, pdfName), wsutils.getObj(ws1, dataName)
+    pdf2, data2 = getObj2(pdfName), getObj2(dataName)
+
+    nll1 = pdf1.createNLL(data1)
+    nll2 = pdf2.createNLL(data2)
+
+    functions.append(("NLL(%s,%s)" % (pdfName, dataName), nll1, nll2))
+    roots.append(pdfName)
+
+#----------
+# parameters to vary: all non-constant variables
+# the functions depend on
+#----------
+graph1 = wsutils.getGraph(ws1)
+attrs = wsutils.getVarAttributes(ws1.allVars())
+constness = dict(zip(attrs['name'], attrs['constant'].tolist()))
+
+# observables of the datasets are not varied
+observables = set()
+for pdfName, dataName in nllSpecs:
+    observables.update(var.GetName() for var in wsutils.rooArgSetToList(ws1.data(dataName).get()))
+
+for node, depth in graph1.reachable([ graph1.index[name] for name in roots ], servers = True):
+    name = graph1.names[node]
+
+    if constness.get(name, True) or name in observables:
+        continue
+
+    param1 = ws1.var(name)
+    if param1 == None:
+        continue
+
+    vmin, vmax = param1.getMin(), param1.getMax()
+    if ROOT.RooNumber.isInfinite(vmin) or ROOT.RooNumber.isInfinite(vmax):
+        print >> sys.stderr,"WARNING: not varying parameter %s with infinite range" % name
+        continue
+
+    params.append((param1, getObj2(name), vmin, vmax))
+
+print >> sys.stderr,"varying %d parameters" % len(params)
+
+#----------
+# evaluate
+#----------
+numChunks = max(1, min(options.numProcesses * 4, options.numPoints))
+chunkBoundaries = [ options.numPoints * i // numChunks for i in range(numChunks + 1) ]
+chunks = zip(chunkBoundaries[:-1], chunkBoundaries[1:])
+
+results = wsutils.parallelMap(evaluatePoints, chunks, options.numProcesses)
+
+startTime = wsutils.reportTiming(options, "evaluating %d points" % options.numPoints, startTime)
+
+#----------
+# combine and report
+#----------
+failed = False
+
+for i, (label, func1, func2) in enumerate(functions):
+    maxRelDev, maxAbsDev, worstPoint = 0., 0., None
+
+    for result in results:
+        relDev, absDev, point = result[i]
+        if worstPoint == None or relDev > maxRelDev:
+            maxRelDev, worstPoint = relDev, point
+        maxAbsDev = max(maxAbsDev, absDev)
+
+    if maxRelDev > options.maxDeviation:
+        status = "FAIL"
+        failed = True
+    else:
+        status = "OK"
+
+    print "%-4s %s: max relative deviation %g, max absolute deviation %g (worst point %s)" % (
+        status, label, maxRelDev, maxAbsDev, worstPoint)
+
+if failed:
+    sys.exit(1)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+import re
+
+#----------------------------------------------------------------------
+
+# identifiers which may appear in a formula to be compiled
+# (anything else, e.g. TFormula specific constants, is left
+# to the interpreter)
+supportedFunctions = set([
+    "exp", "log", "log10", "sqrt", "pow",
+    "sin", "cos", "tan", "asin", "acos", "atan", "atan2",
+    "sinh", "cosh", "tanh", "abs", "fabs", "min", "max",
+    "floor", "ceil", "erf", "erfc", "TMath",
+    ])
+
+def translateExpression(formula):
+    """ @return the C++ expression corresponding to the given formula
+        (with parameters referred to as @0, @1, ...) where parameter i
+        is replaced by the local variable p_i or None if the formula
+        uses something which can not be translated
+    """
+
+    if '^' in formula or '**' in formula:
+        # power operators in TFormula, xor and
+        # pointer dereferencing in C++
+        return None
+
+    expr = re.sub(r'@(\d+)', r'p_\1', formula)
+
+    for identifier in re.findall(r'(?<![\w.:])([A-Za-z_]\w*)', expr):
+        if re.match(r'p_\d+$', identifier):
+            continue
+
+        if not identifier in supportedFunctions:
+            return None
+
+    return expr
+
+#----------------------------------------------------------------------
+
+def generateClass(className, expr, numParams):
+    """ @return the C++ code of a RooAbsReal class evaluating the
+        given expression of numParams parameters """
+
+    lines = []
+
+    lines.append("class %s : public RooAbsReal {" % className)
+    lines.append("public:")
+    lines.append("  %s() {}" % className)
+    lines.append("  %s(const char *name, const char *title, const RooArgList &params) :" % className)
+    lines.append("    RooAbsReal(name, title), _params(\"params\", \"params\", this) { _params.add(params); }")
+    lines.append("  %s(const %s &other, const char *name = 0) :" % (className, className))
+    lines.append("    RooAbsReal(other, name), _params(\"params\", this, other._params) {}")
+    lines.append("  virtual TObject *clone(const char *newname) const { return new %s(*this, newname); }" % className)
+    lines.append("  virtual ~%s() {}" % className)
+    lines.append("protected:")
+    lines.append("  RooListProxy _params;")
+    lines.append("  Double_t evaluate() const {")
+    lines.append("    using namespace std;")
+
+    for i in range(numParams):
+        lines.append("    const double p_%d = static_cast<const RooAbsReal &>(_params[%d]).getVal();" % (i, i))
+
+    lines.append("    return (%s);" % expr)
+    lines.append("  }")
+    lines.append("private:")
+    lines.append("  ClassDef(%s, 1)" % className)
+    lines.append("};")
+    lines.append("")
+
+    return "\n".join(lines)
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file
+
+  replaces RooFormulaVars by instances of generated C++ classes
+  (one class per distinct expression) which are compiled into a
+  shared library with ACLiC, avoiding the evaluation of the formulas
+  through TFormula.
+
+  The generated library must be loaded (with --lib) when reading
+  the output file.
+
+  By default, all RooFormulaVars are compiled, use --pattern to select
+  some of them. Formulas which can not be translated to C++ (e.g.
+  because they use the ^ operator or TFormula specific functions)
+  are left unchanged.
+
+  With --cache-formulas, the formula expressions extracted from the
+  input file are stored in a file next to it (with suffix """ + wsutils.sidecarSuffix + """)
+  and taken from there in subsequent runs.
+
+  WARNING: the program will overwrite the output workspace file and the generated code and library without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--pattern",
+                  dest="patterns",
+                  default = [],
+                  action="append",
+                  help="only compile the RooFormulaVars whose name matches the given fnmatch pattern. Can be specified multiple times",
+                  metavar="PATTERN",
+                  )
+
+parser.add_option("--outdir",
+                  dest="outdir",
+                  default = ".",
+                  help="directory where the generated code and library are written (default: %default)",
+                  metavar="DIR",
+                  )
+
+parser.add_option("--libname",
+                  dest="libname",
+                  default = "RFWSFormulas",
+                  help="name of the generated source file and library, without extension (default: %default)",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--benchmark",
+                  dest="numEvaluations",
+                  default = 100,
+                  type = int,
+                  help="number of evaluations of all compiled formulas to time before and after the replacement, 0 to disable (default: %default)",
+                  metavar="N",
+                  )
+
+parser.add_option("--cache-formulas",
+                  dest="cacheFormulas",
+                  default = False,
+                  action="store_true",
+                  help="store the formula expressions of the input file in a file next to it and reuse them in subsequent runs",
+                  )
+
+parser.add_option("-n",
+                  dest="dryrun",
+                  default = False,
+                  action="store_true",
+                  help="only print which formulas would be compiled, do not generate any code",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+inputFname, outputFname = ARGV
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time, fnmatch, hashlib
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+#----------
+# find the formulas to compile
+#----------
+graph = wsutils.getGraph(workspace)
+catalog = wsutils.getFormulaCatalog(workspace, inputFname if options.cacheFormulas else None)
+
+# list of (formula, class name)
+formulas = []
+
+# maps from expression to class name
+classNames = {}
+
+numSkipped = 0
+
+for name, className in sorted(zip(graph.names, graph.classNames)):
+    if className != "RooFormulaVar":
+        continue
+
+    if options.patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in options.patterns):
+        continue
+
+    expression, paramNames = catalog[name]
+
+    formula = workspace.obj(name)
+    params = [ workspace.obj(paramName) for paramName in paramNames ]
+
+    expression = wsutils.normalizeFormula(expression, paramNames)
+
+    expr = translateExpression(expression)
+
+    if expr == None or not all(param.InheritsFrom("RooAbsReal") for param in params):
+        print >> sys.stderr,"WARNING: can't compile %s with formula %s" % (name, expression)
+        numSkipped += 1
+        continue
+
+    key = (expr, len(params))
+    if not key in classNames:
+        classNames[key] = "RFWSFormula_" + hashlib.sha1("%s\0%d" % key).hexdigest()[:16]
+
+    formulas.append((formula, classNames[key]))
+
+    if options.dryrun:
+        print "%s: %s -> %s" % (name, expression, classNames[key])
+
+startTime = wsutils.reportTiming(options, "analyzing formulas", startTime)
+
+print >> sys.stderr,"%d formulas (%d distinct expressions) to compile, %d skipped" % (len(formulas), len(classNames), numSkipped)
+
+if not formulas or options.dryrun:
+    sys.exit(0)
+
+#----------
+# generate and compile the code
+#----------
+if not os.path.exists(options.outdir):
+    os.makedirs(options.outdir)
+
+sourceFname = os.path.join(options.outdir, options.libname + ".cxx")
+
+fout = open(sourceFname, "w")
+fout.write("""// generated by wsCompileFormulas.py from %s
+
+#include "RooAbsReal.h"
+#include "RooListProxy.h"
+#include "RooArgList.h"
+#include "TMath.h"
+
+#include <cmath>
+#include <algorithm>
+
+""" % inputFname)
+
+for (expr, numParams), className in sorted(classNames.items(), key = lambda item: item[1]):
+    fout.write(generateClass(className, expr, numParams))
+    fout.write("\n")
+
+fout.close()
+
+libraryName = os.path.join(os.path.abspath(options.outdir), options.libname)
+
+if not ROOT.gSystem.CompileMacro(sourceFname, "kO", libraryName):
+    print >> sys.stderr,"failed to compile " + sourceFname
+    sys.exit(1)
+
+libraryFname = libraryName + "." + ROOT.gSystem.GetSoExt()
+
+startTime = wsutils.reportTiming(options, "compiling %d classes" % len(classNames), startTime)
+
+#----------
+# benchmark the original formulas
+#----------
+if options.numEvaluations > 0:
+    timeBefore = wsutils.timeFunctions([ formula for formula, className in formulas ], options.numEvaluations)
+
+    startTime = wsutils.reportTiming(options, "timing original formulas", startTime)
+
+#----------
+# replace the formulas
+#----------
+# formulas using other compiled formulas must be created after them
+# so that they use the new nodes
+classNameOf = dict((formula.GetName(), className) for formula, className in formulas)
+
+newNodes = {}
+replacements = []
+for node in graph.topologicalOrder():
+    name = graph.names[node]
+    if not name in classNameOf:
+        continue
+
+    formula = workspace.obj(name)
+
+    # RooArgList's constructor takes at most nine arguments
+    # in older ROOT versions
+    params = ROOT.RooArgList()
+    for param in wsutils.getFormulaParameters(formula):
+        params.add(newNodes.get(param.GetName(), param))
+
+    newNodes[name] = getattr(ROOT, classNameOf[name])(name, formula.GetTitle(), params)
+    replacements.append(newNodes[name])
+
+# formulas without clients must be copied explicitly
+topLevelNames = set(graph.names[node] for node in graph.topLevelNodes())
+
+wsutils.replaceNodes(workspace, replacements)
+
+ws2 = wsutils.rebuildWorkspace(workspace,
+                               dropNames = set(formula.GetName() for formula, className in formulas),
+                               extraRoots = [ node for node in replacements if node.GetName() in topLevelNames ])
+
+startTime = wsutils.reportTiming(options, "rebuilding workspace", startTime)
+
+print >> sys.stderr,"writing output file",outputFname
+ws2.writeToFile(outputFname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
+if options.numEvaluations > 0:
+    timeAfter = wsutils.timeFunctions([ ws2.function(formula.GetName()) for formula, className in formulas ], options.numEvaluations)
+
+    print >> sys.stderr,"evaluation time of the %d formulas: %.3g -> %.3g s (speedup %.2f)" % (
+        len(formulas), timeBefore, timeAfter, timeBefore / max(timeAfter, 1e-12))
+
+print >> sys.stderr,"use --lib %s when reading %s" % (libraryFname, outputFname)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, re, wsutils
+
+#----------------------------------------------------------------------
+
+# classes whose instances are completely described by their class,
+# the attributes returned by wsutils.getNodeAttributes(..) and their
+# servers (members of classes with unknown internal state are never
+# grouped as their structural hash includes their name)
+defaultClasses = [
+    "RooFormulaVar",
+    "RooGenericPdf",
+    "RooProduct",
+    "RooAddition",
+    "RooConstVar",
+    ]
+
+#----------------------------------------------------------------------
+
+def findDuplicates(workspace, classNames, keepPatterns):
+    """ @return a list of (representative node, list of duplicate nodes)
+        for groups of nodes of the given classes with the same structural
+        hash (i.e. the same class, attributes and servers).
+
+        Nodes without clients and nodes whose name matches one of
+        keepPatterns are never dropped.
+    """
+    import fnmatch
+
+    graph = wsutils.getGraph(workspace)
+    hashes = wsutils.computeHashes(workspace)
+
+    groups = {}
+
+    for node in graph.topologicalOrder():
+        if not graph.classNames[node] in classNames:
+            continue
+
+        groups.setdefault(hashes[node], []).append(node)
+
+    def mustKeep(node):
+        return not graph.clients[node] or \
+            any(fnmatch.fnmatch(graph.names[node], pattern) for pattern in keepPatterns)
+
+    retval = []
+
+    for nodes in groups.values():
+        if len(nodes) < 2:
+            continue
+
+        keep = [ node for node in nodes if mustKeep(node) ]
+        drop = [ node for node in nodes if not mustKeep(node) ]
+
+        if not drop:
+            continue
+
+        if keep:
+            # the clients of the dropped nodes are redirected to one of
+            # the nodes which are kept anyway
+            representative = min(keep, key = lambda node: graph.names[node])
+        else:
+            drop.sort(key = lambda node: graph.names[node])
+            representative = drop.pop(0)
+
+            if not drop:
+                continue
+
+        retval.append((representative, sorted(drop, key = lambda node: graph.names[node])))
+
+    retval.sort(key = lambda group: graph.names[group[0]])
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def redirectClients(workspace, representative, duplicates):
+    """ makes the clients of the duplicate nodes use the representative """
+    import ROOT
+
+    graph = wsutils.getGraph(workspace)
+
+    repObj = workspace.obj(graph.names[representative])
+    newSet = ROOT.RooArgSet(repObj)
+
+    # with nameChange = True, redirectServers(..) replaces the servers
+    # whose name is given in the ORIGNAME attribute of the new server
+    for node in duplicates:
+        attribute = "ORIGNAME:" + graph.names[node]
+        repObj.setAttribute(attribute)
+
+        for client in graph.clients[node]:
+            workspace.obj(graph.names[client]).redirectServers(newSet, False, True)
+
+        repObj.setAttribute(attribute, False)
+
+def rewriteFormulas(workspace, aliases, catalog):
+    """ creates new versions of the RooFormulaVars and RooGenericPdfs
+        (which are not dropped themselves) whose parameters include
+        dropped members: the expression is rewritten to refer to the
+        parameters as @i and the dropped parameters are replaced by
+        their representatives (which must already be in the
+        workspace). Otherwise the expressions would refer to names
+        which do not exist anymore when the workspace is read back.
+
+        @param catalog the formula catalog from before redirecting
+        the clients of the dropped members
+
+        @return the list of new objects (not yet in the workspace)
+    """
+    import ROOT
+
+    # the graph after redirecting: formulas using other rewritten
+    # formulas must be created after them
+    graph = wsutils.getGraph(workspace, refresh = True)
+
+    newObjs = {}
+    retval = []
+
+    for node in graph.topologicalOrder():
+        name = graph.names[node]
+        if not name in catalog:
+            continue
+
+        formula, paramNames = catalog[name]
+        if name in aliases or not any(param in aliases for param in paramNames):
+            continue
+
+        # duplicate parameters may now be the same member
+        newParamNames = []
+        newIndices = []
+        for param in paramNames:
+            param = aliases.get(param, param)
+            if not param in newParamNames:
+                newParamNames.append(param)
+            newIndices.append(newParamNames.index(param))
+
+        newFormula = re.sub(r'@(\d+)', lambda mo: "@%d" % newIndices[int(mo.group(1))],
+                            wsutils.normalizeFormula(formula, paramNames))
+
+        obj = workspace.obj(name)
+
+        print >> sys.stderr,"changing formula of %s to %s" % (name, newFormula)
+
+        params = ROOT.RooArgList()
+        for param in newParamNames:
+            params.add(newObjs.get(param, workspace.obj(param)))
+
+        if obj.InheritsFrom("RooAbsPdf"):
+            newObj = ROOT.RooGenericPdf(name, obj.GetTitle(), newFormula, params)
+        else:
+            newObj = ROOT.RooFormulaVar(name, obj.GetTitle(), newFormula, params)
+
+        newObjs[name] = newObj
+        retval.append(newObj)
+
+    return retval
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file
+
+  finds groups of functions with the same class, attributes (formula,
+  value) and servers (see wsHash.py) and makes all clients use a single
+  member of each group. The other members of the group are dropped.
+
+  By default, only instances of classes which are completely described
+  by this information are considered (""" + ", ".join(defaultClasses) + """),
+  use --class to add further classes.
+
+  Members without clients (top level members) and members matching
+  one of the --keep patterns are never dropped. Formula expressions
+  referring to dropped members by name are rewritten. With --alias-map,
+  a json file mapping the names of the dropped members to the names
+  of the members replacing them is written.
+
+  WARNING: the program will overwrite the output workspace file without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--class",
+                  dest="classNames",
+                  default = [],
+                  action="append",
+                  help="also deduplicate instances of the given class. Can be specified multiple times",
+                  metavar="CLASS",
+                  )
+
+parser.add_option("--keep",
+                  dest="keepPatterns",
+                  default = [],
+                  action="append",
+                  help="never drop members whose name matches the given fnmatch pattern. Can be specified multiple times",
+                  metavar="PATTERN",
+                  )
+
+parser.add_option("--alias-map",
+                  dest="aliasMapFname",
+                  default = None,
+                  help="write a json file mapping the names of the dropped members to the names of their replacements",
+                  metavar="FILE",
+                  )
+
+parser.add_option("--nll",
+                  dest="nllSpecs",
+                  default = [],
+                  action="append",
+                  help="report the evaluation time of the negative log likelihood of the given pdf on the given dataset before and after deduplication. Can be specified multiple times",
+                  metavar="PDF,DATA",
+                  )
+
+parser.add_option("-n",
+                  dest="dryrun",
+                  default = False,
+                  action="store_true",
+                  help="only print the groups of duplicates, do not write the output file",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+inputFname, outputFname = ARGV
+
+nllSpecs = wsutils.parseNLLSpecs(options.nllSpecs)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+nllTimesBefore = [ wsutils.timeNLL(wsutils.getObj(workspace, pdfName), wsutils.getObj(workspace, dataName))
+                   for pdfName, dataName in nllSpecs ]
+
+startTime = time.time()
+
+#----------
+# find the duplicates
+#----------
+graph = wsutils.getGraph(workspace)
+
+groups = findDuplicates(workspace, set(defaultClasses + options.classNames), options.keepPatterns)
+
+startTime = wsutils.reportTiming(options, "finding duplicates", startTime)
+
+aliases = {}
+for representative, duplicates in groups:
+    for node in duplicates:
+        aliases[graph.names[node]] = graph.names[representative]
+
+    if options.dryrun:
+        print "%s (%s): %s" % (graph.names[representative], graph.classNames[representative],
+                               " ".join(graph.names[node] for node in duplicates))
+
+print >> sys.stderr,"found %d groups of duplicates, %d members to drop" % (len(groups), len(aliases))
+
+if not groups or options.dryrun:
+    sys.exit(0)
+
+#----------
+# rewire the clients and write the result
+#----------
+numBefore = len(graph)
+
+# the parameter names of the formulas before redirecting
+catalog = wsutils.getFormulaCatalog(workspace)
+
+for representative, duplicates in groups:
+    redirectClients(workspace, representative, duplicates)
+
+# formulas referring to dropped members by name
+newFormulas = rewriteFormulas(workspace, aliases, catalog)
+
+graph = wsutils.getGraph(workspace)
+wsutils.replaceNodes(workspace, newFormulas)
+
+ws2 = wsutils.rebuildWorkspace(workspace,
+                               dropNames = set(aliases.keys()) | set(obj.GetName() for obj in newFormulas),
+                               extraRoots = [ obj for obj in newFormulas
+                                              if not graph.clients[graph.index[obj.GetName()]] ])
+
+startTime = wsutils.reportTiming(options, "rebuilding workspace", startTime)
+
+numAfter = len(wsutils.getGraph(ws2))
+
+print >> sys.stderr,"writing output file",outputFname
+ws2.writeToFile(outputFname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
+if options.aliasMapFname != None:
+    import json
+    fout = open(options.aliasMapFname, "w")
+    json.dump(aliases, fout, indent = 1, sort_keys = True)
+    fout.close()
+
+print >> sys.stderr,"number of nodes %d -> %d, file size %d -> %d bytes" % (
+    numBefore, numAfter, os.path.getsize(inputFname), os.path.getsize(outputFname))
+
+for (pdfName, dataName), timeBefore in zip(nllSpecs, nllTimesBefore):
+    timeAfter = wsutils.timeNLL(wsutils.getObj(ws2, aliases.get(pdfName, pdfName)), wsutils.getObj(ws2, dataName))
+    print >> sys.stderr,"NLL(%s,%s) evaluation time: %.3g -> %.3g s (speedup %.2f)" % (
+        pdfName, dataName, timeBefore, timeAfter, timeBefore / max(timeAfter, 1e-12))
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+class WorkspaceInfo:
+    """ graph, attributes and hashes of one of the workspaces to compare """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.graph = wsutils.getGraph(ws)
+        self.attributes = wsutils.getAllNodeAttributes(ws)
+
+        # hashes not depending on any name, used to
+        # find renamed nodes
+        self.hashes = wsutils.computeHashes(ws, includeLeafNames = False,
+                                            attributes = self.attributes)
+
+#----------------------------------------------------------------------
+
+def alignNodes(info1, info2):
+    """ @return a dict mapping node indices in the first workspace
+        to the corresponding node indices in the second one.
+
+        Nodes are matched by name first. Among the remaining nodes, those
+        with a structural hash which is unique on both sides are matched.
+        Finally, unmatched servers at the same position of matched nodes
+        are matched if they have the same structural hash.
+    """
+
+    graph1, graph2 = info1.graph, info2.graph
+
+    mapping = {}
+    for node1, name in enumerate(graph1.names):
+        node2 = graph2.index.get(name)
+        if node2 != None:
+            mapping[node1] = node2
+
+    matched2 = set(mapping.values())
+
+    #----------
+    # unique hashes among the unmatched nodes
+    #----------
+    def uniqueHashes(info, nodes):
+        byHash = {}
+        for node in nodes:
+            byHash.setdefault(info.hashes[node], []).append(node)
+        return dict((h, nodes[0]) for h, nodes in byHash.items() if len(nodes) == 1)
+
+    unique1 = uniqueHashes(info1, [ node for node in range(len(graph1)) if not node in mapping ])
+    unique2 = uniqueHashes(info2, [ node for node in range(len(graph2)) if not node in matched2 ])
+
+    for h, node1 in unique1.items():
+        node2 = unique2.get(h)
+        if node2 != None:
+            mapping[node1] = node2
+            matched2.add(node2)
+
+    #----------
+    # propagate from matched nodes to their servers
+    #----------
+    queue = mapping.items()
+    pos = 0
+    while pos < len(queue):
+        node1, node2 = queue[pos]
+        pos += 1
+
+        servers1, servers2 = graph1.servers[node1], graph2.servers[node2]
+        if len(servers1) != len(servers2):
+            continue
+
+        for server1, server2 in zip(servers1, servers2):
+            if server1 in mapping or server2 in matched2:
+                continue
+
+            if info1.hashes[server1] != info2.hashes[server2]:
+                continue
+
+            mapping[server1] = server2
+            matched2.add(server2)
+            queue.append((server1, server2))
+
+    return mapping
+
+#----------------------------------------------------------------------
+
+def attributesDiffer(value1, value2, tolerance):
+    if isinstance(value1, float) and isinstance(value2, float):
+        return abs(value1 - value2) > tolerance * max(abs(value1), abs(value2))
+
+    return value1 != value2
+
+#----------------------------------------------------------------------
+
+def diffWorkspaces(ws1, ws2, tolerance):
+    """ @return a dict describing the differences between the two
+        workspaces (see the usage message) """
+
+    info1 = WorkspaceInfo(ws1)
+    info2 = WorkspaceInfo(ws2)
+
+    graph1, graph2 = info1.graph, info2.graph
+
+    mapping = alignNodes(info1, info2)
+    matched2 = set(mapping.values())
+
+    result = dict(added = [], removed = [], renamed = [], changed = [], edges = [], datasets = [])
+
+    for node1, name in enumerate(graph1.names):
+        if not node1 in mapping:
+            result['removed'].append(dict(name = name, className = graph1.classNames[node1]))
+
+    for node2, name in enumerate(graph2.names):
+        if not node2 in matched2:
+            result['added'].append(dict(name = name, className = graph2.classNames[node2]))
+
+    for node1 in sorted(mapping.keys(), key = lambda node: graph1.names[node]):
+        node2 = mapping[node1]
+        name1, name2 = graph1.names[node1], graph2.names[node2]
+
+        if name1 != name2:
+            result['renamed'].append(dict(old = name1, new = name2))
+
+        #----------
+        # own attributes
+        #----------
+        changes = []
+
+        if graph1.classNames[node1] != graph2.classNames[node2]:
+            changes.append(dict(attribute = 'className', old = graph1.classNames[node1], new = graph2.classNames[node2]))
+
+        attributes1 = dict(info1.attributes[node1])
+        attributes2 = dict(info2.attributes[node2])
+
+        for key in sorted(set(attributes1.keys()) | set(attributes2.keys())):
+            value1, value2 = attributes1.get(key), attributes2.get(key)
+            if attributesDiffer(value1, value2, tolerance):
+                changes.append(dict(attribute = key, old = value1, new = value2))
+
+        if changes:
+            result['changed'].append(dict(old = name1, new = name2, changes = changes))
+
+        #----------
+        # edges (comparing names in the second workspace)
+        #----------
+        servers1 = set()
+        for server in graph1.servers[node1]:
+            if server in mapping:
+                servers1.add(graph2.names[mapping[server]])
+            else:
+                # removed server
+                servers1.add(graph1.names[server])
+
+        servers2 = set(graph2.names[server] for server in graph2.servers[node2])
+
+        if servers1 != servers2:
+            result['edges'].append(dict(old = name1, new = name2,
+                                        removedServers = sorted(servers1 - servers2),
+                                        addedServers = sorted(servers2 - servers1)))
+
+    #----------
+    # datasets
+    #----------
+    data1 = dict((data.GetName(), data) for data in wsutils.rootListTolist(ws1.allData()))
+    data2 = dict((data.GetName(), data) for data in wsutils.rootListTolist(ws2.allData()))
+
+    for name in sorted(set(data1.keys()) | set(data2.keys())):
+        if not name in data2:
+            result['datasets'].append(dict(name = name, change = 'removed'))
+        elif not name in data1:
+            result['datasets'].append(dict(name = name, change = 'added'))
+        elif data1[name].numEntries() != data2[name].numEntries() or \
+                attributesDiffer(data1[name].sumEntries(), data2[name].sumEntries(), tolerance):
+            result['datasets'].append(dict(name = name, change = 'entries',
+                                           old = [ data1[name].numEntries(), data1[name].sumEntries() ],
+                                           new = [ data2[name].numEntries(), data2[name].sumEntries() ]))
+
+    return result
+
+#----------------------------------------------------------------------
+
+def printDiff(result):
+
+    for item in result['removed']:
+        print "- %s (%s)" % (item['name'], item['className'])
+
+    for item in result['added']:
+        print "+ %s (%s)" % (item['name'], item['className'])
+
+    for item in result['renamed']:
+        print "R %s -> %s" % (item['old'], item['new'])
+
+    for item in result['changed']:
+        for change in item['changes']:
+            print "M %s: %s: %s -> %s" % (item['new'], change['attribute'], change['old'], change['new'])
+
+    for item in result['edges']:
+        for server in item['removedServers']:
+            print "E %s: -%s" % (item['new'], server)
+        for server in item['addedServers']:
+            print "E %s: +%s" % (item['new'], server)
+
+    for item in result['datasets']:
+        if item['change'] == 'entries':
+            print "D %s: entries/sum of weights %s -> %s" % (item['name'], item['old'], item['new'])
+        else:
+            print "D %s: %s" % (item['name'], item['change'])
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file1 input_file2
+
+  compares the workspaces in the two files. Members are aligned by name
+  and, for renamed members, by their structural hash (see wsHash.py).
+
+  Prints one line per difference, starting with:
+
+    -  member only in the first workspace
+    +  member only in the second workspace
+    R  member renamed
+    M  attribute (class, value, range, formula etc.) of a member changed
+    E  member uses a different server
+    D  dataset added, removed or with different number of entries
+       or sum of weights
+
+  Changed histograms of RooHistFuncs and RooHistPdfs are reported as
+  attribute changes. Differences in the internal state of members of
+  other classes with unknown internal state (see wsHash.py) are not
+  detected.
+
+  Exits with status 1 if differences were found.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--tolerance",
+                  dest="tolerance",
+                  default = 1e-9,
+                  type = float,
+                  help="relative tolerance for comparing numerical values (default: %default)",
+                  metavar="TOL",
+                  )
+
+parser.add_option("--json",
+                  dest="json",
+                  default = False,
+                  action="store_true",
+                  help="print the differences in json format",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+ws1 = wsutils.readSingleWorkspace(ARGV[0], options)
+ws2 = wsutils.readSingleWorkspace(ARGV[1], options)
+
+startTime = wsutils.reportTiming(options, "reading workspaces", startTime)
+
+result = diffWorkspaces(ws1, ws2, options.tolerance)
+
+startTime = wsutils.reportTiming(options, "comparing", startTime)
+
+if options.json:
+    import json
+    print json.dumps(result, indent = 1, sort_keys = True)
+else:
+    printDiff(result)
+
+if any(result.values()):
+    sys.exit(1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file=member1[,member2,...] [ output_file2=member3[,...] ... ]
+
+  copies the given members of the workspace in the input file and all
+  objects they depend on (but nothing else) into a new workspace which
+  is written to the given output file. The input file is read only once
+  for all output files.
+
+  Datasets given with --data are reduced to the variables present in
+  the new workspace, snapshots given with --snapshot to the parameters
+  present in the new workspace. They are written to all output files.
+
+  example:
+
+  %prog combined.root ch1.root=pdf_ch1 ch2.root=pdf_ch2,pdf_ch2_bonly --data data_obs
+
+  WARNING: the program will overwrite the output workspace files without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--data",
+                  dest="dataNames",
+                  default = [],
+                  action="append",
+                  help="name of a dataset to copy. Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--snapshot",
+                  dest="snapshotNames",
+                  default = [],
+                  action="append",
+                  help="name of a snapshot to copy. Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 2:
+    print >> sys.stderr,"expected at least two positional arguments"
+    sys.exit(1)
+
+inputFname = ARGV.pop(0)
+
+outputSpecs = []
+for spec in ARGV:
+    if not "=" in spec:
+        print >> sys.stderr,"expected output_file=member1[,member2,...] but got '%s'" % spec
+        sys.exit(1)
+
+    outputFname, memberNames = spec.split("=",1)
+    outputSpecs.append((outputFname, memberNames.split(",")))
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+for outputFname, memberNames in outputSpecs:
+
+    roots = [ wsutils.getObj(workspace, name) for name in memberNames ]
+
+    try:
+        ws2 = wsutils.copyToNewWorkspace(workspace, roots,
+                                         dataNames = options.dataNames,
+                                         snapshotNames = options.snapshotNames,
+                                         reduceData = True)
+    except KeyError, ex:
+        print >> sys.stderr,"could not find dataset or snapshot %s in workspace %s in file %s" % (ex.args[0], workspace.GetName(), inputFname)
+        sys.exit(1)
+
+    print >> sys.stderr,"writing %d members to %s" % (len(wsutils.getAllMembers(ws2)), outputFname)
+    ws2.writeToFile(outputFname)
+
+    startTime = wsutils.reportTiming(options, "extracting " + outputFname, startTime)
+
+    # free the memory before the next extraction
+    del ws2
+
+ROOT.gROOT.cd()
+fin.Close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+def getObservableNames(workspace):
+    """ @return the names of the variables of all datasets in the
+        workspace and of the observables of all ModelConfigs """
+
+    retval = set()
+
+    for data in wsutils.rootListTolist(workspace.allData()):
+        retval.update(var.GetName() for var in wsutils.rooArgSetToList(data.get()))
+
+    for mc in wsutils.getModelConfigs(workspace):
+        observables = mc.GetObservables()
+        if observables != None:
+            retval.update(var.GetName() for var in wsutils.rooArgSetToList(observables))
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def findConstantNodes(workspace):
+    """ @return the set of indices of the graph nodes whose value only
+        depends on constant parameters: constant RooRealVars (which
+        are not observables, see getObservableNames(..)) and
+        RooConstVars as well as functions (but not pdfs, whose values
+        depend on the normalization) all of whose servers are such nodes
+    """
+
+    graph = wsutils.getGraph(workspace)
+
+    # constness of all variables in one go
+    attrs = wsutils.getVarAttributes(workspace.allVars())
+    constantVars = set(name for name, constant in zip(attrs['name'], attrs['constant'].tolist()) if constant)
+
+    # observables are often flagged constant but functions
+    # of them must not be folded
+    constantVars -= getObservableNames(workspace)
+
+    retval = set()
+
+    for node in graph.topologicalOrder():
+        name, className = graph.names[node], graph.classNames[node]
+
+        if not graph.servers[node]:
+            if name in constantVars or wsutils.classInheritsFrom(className, "RooConstVar"):
+                retval.add(node)
+            continue
+
+        if not wsutils.classInheritsFrom(className, "RooAbsReal") or \
+                wsutils.classInheritsFrom(className, "RooAbsPdf") or \
+                wsutils.classInheritsFrom(className, "RooAbsRealLValue"):
+            continue
+
+        if all(server in retval for server in graph.servers[node]):
+            retval.add(node)
+
+    return retval
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file
+
+  replaces the functions which only depend on constant parameters by
+  RooConstVars with the current value of the function. Only the
+  largest such subgraphs are replaced (i.e. functions which have at
+  least one client which is not constant), the functions and
+  parameters which are then not used anymore are dropped.
+
+  Pdfs and top level objects are never replaced.
+
+  Note that the parameters in the folded subgraphs can not be
+  changed anymore in the output workspace.
+
+  WARNING: the program will overwrite the output workspace file without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addSetVars = True,
+                         addTiming = True,
+                         )
+
+parser.add_option("--nll",
+                  dest="nllSpecs",
+                  default = [],
+                  action="append",
+                  help="report the evaluation time of the negative log likelihood of the given pdf on the given dataset before and after folding. Can be specified multiple times",
+                  metavar="PDF,DATA",
+                  )
+
+parser.add_option("-n",
+                  dest="dryrun",
+                  default = False,
+                  action="store_true",
+                  help="only print which functions would be folded, do not write the output file",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+inputFname, outputFname = ARGV
+
+nllSpecs = wsutils.parseNLLSpecs(options.nllSpecs)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+wsutils.applySetVars(workspace, options.setVars)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+nllTimesBefore = [ wsutils.timeNLL(wsutils.getObj(workspace, pdfName), wsutils.getObj(workspace, dataName))
+                   for pdfName, dataName in nllSpecs ]
+
+startTime = time.time()
+
+#----------
+# find the nodes to fold
+#----------
+graph = wsutils.getGraph(workspace)
+constantNodes = findConstantNodes(workspace)
+
+toFold = []
+for node in constantNodes:
+    if not graph.servers[node]:
+        # a parameter, nothing to fold
+        continue
+
+    clients = graph.clients[node]
+    if clients and not all(client in constantNodes for client in clients):
+        toFold.append(node)
+
+toFold.sort(key = lambda node: graph.names[node])
+
+startTime = wsutils.reportTiming(options, "finding constant subgraphs", startTime)
+
+if not toFold:
+    print >> sys.stderr,"no functions to fold found"
+    sys.exit(0)
+
+replacements = []
+for node in toFold:
+    func = workspace.obj(graph.names[node])
+    value = func.getVal()
+
+    print >> sys.stderr,"folding %s (%s) = %g" % (func.GetName(), func.ClassName(), value)
+
+    replacements.append(ROOT.RooConstVar(func.GetName(), func.GetTitle(), value))
+
+if options.dryrun:
+    print >> sys.stderr,"%d functions would be folded" % len(toFold)
+    sys.exit(0)
+
+#----------
+# rewire the clients and write the result
+#----------
+numBefore = len(graph)
+
+wsutils.replaceNodes(workspace, replacements)
+
+ws2 = wsutils.rebuildWorkspace(workspace, dropNames = set(graph.names[node] for node in toFold))
+
+startTime = wsutils.reportTiming(options, "rebuilding workspace", startTime)
+
+numAfter = len(wsutils.getGraph(ws2))
+
+print >> sys.stderr,"writing output file",outputFname
+ws2.writeToFile(outputFname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
+print >> sys.stderr,"folded %d functions, number of nodes %d -> %d" % (len(toFold), numBefore, numAfter)
+
+for (pdfName, dataName), timeBefore in zip(nllSpecs, nllTimesBefore):
+    timeAfter = wsutils.timeNLL(wsutils.getObj(ws2, pdfName), wsutils.getObj(ws2, dataName))
+    print >> sys.stderr,"NLL(%s,%s) evaluation time: %.3g -> %.3g s (speedup %.2f)" % (
+        pdfName, dataName, timeBefore, timeAfter, timeBefore / max(timeAfter, 1e-12))
@@ -19,63 +19,65 @@
 import sys, os, wsutils
 
 #----------------------------------------------------------------------
-def findObjectsOnPaths(ws, srcObj, destObj):
-    """ looks for all objects which can be 'reached' from srcObj
-        and from which one can 'reach' destObj,
-        i.e. all objects which are (indirect) clients of
-        srcObj and (indirect) servers of destObj
-
-        @param srcObj is assumed to be 'lower' than destObj in the tree,
-        i.e. a (possibly indirect) server of destObj.
+def findObjectsOnPaths(graph, srcIndex, destIndex):
+    """ looks for all nodes which can be 'reached' from srcIndex
+        and from which one can 'reach' destIndex,
+        i.e. all nodes which are (indirect) clients of
+        srcIndex and (indirect) servers of destIndex
+
+        @param graph is the WorkspaceGraph of the workspace
+
+        @param srcIndex is assumed to be 'lower' than destIndex in the tree,
+        i.e. a (possibly indirect) server of destIndex.
+
+        @return the list of indices of the nodes found
     """
 
-    # names of nodes from which one can definitively NOT reach destObj
-    badNodeNames = set()
+    # indices of nodes from which one can definitively NOT reach destIndex
+    badNodes = set()
 
-    # names of nodes from which we can definitively reach destObj
-    # (and which we have reached starting from srcObj, so we
+    # indices of nodes from which we can definitively reach destIndex
+    # (and which we have reached starting from srcIndex, so we
     # can return goodNodes)
-    goodNodeNames = set()
+    goodNodeSet = set()
     goodNodes = []
 
     # probably not the most efficient implementation
     # but should at least be easy to understand
     def isGoodNode(node):
-        nodeName = node.GetName()
 
         # query the cache
-        if nodeName in goodNodeNames:
+        if node in goodNodeSet:
             return True
         
-        if nodeName in badNodeNames:
+        if node in badNodes:
             return False
 
         # check if we have reached the destination
-        if nodeName == destObj.GetName():
+        if node == destIndex:
             # we've reached the destination
             # add to the cache
-            if not nodeName in goodNodeNames:
-                goodNodes.append(node)
-                goodNodeNames.add(nodeName)
+            goodNodes.append(node)
+            goodNodeSet.add(node)
 
             return True
 
-        # we don't know if the node is good (can reach destObj)
-        # or bad (can't read destObj for sure)
+        # we don't know if the node is good (can reach destIndex)
+        # or bad (can't read destIndex for sure)
         # 
         # so we look at the node's clients
 
         #----------
         # get all clients
         #----------
-        clients = wsutils.getClients(node)
+        clients = graph.clients[node]
 
         #----------
         # if this node has no clients at this point,
-        # we will not be able to reach destObj
+        # we will not be able to reach destIndex
         
         if not clients:
-            badNodeNames.add(nodeName)
+            badNodes.add(node)
             return False
 
         isGood = False
@@ -87,9 +89,9 @@ def findObjectsOnPaths(ws, srcObj, destObj):
 
             if isGoodNode(client):
                 # client can reach the destination so we can as well
-                if not nodeName in goodNodeNames:
+                if not node in goodNodeSet:
                     goodNodes.append(node)
-                    goodNodeNames.add(nodeName)
+                    goodNodeSet.add(node)
 
                 isGood = True
 
@@ -98,13 +100,13 @@ def findObjectsOnPaths(ws, srcObj, destObj):
             
                 
         if not isGood:
-            # none of the clients could reach destObj so neither can we
-            badNodeNames.add(nodeName)
+            # none of the clients could reach destIndex so neither can we
+            badNodes.add(node)
             
         return isGood
 
     # walk on the graph
-    isGoodNode(srcObj)
+    isGoodNode(srcIndex)
 
     return goodNodes
         
@@ -123,7 +125,9 @@ parser = OptionParser("""
 """
 )
 
-wsutils.addCommonOptions(parser)
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
 
 parser.add_option("--exclude",
                   dest="exclude",
@@ -162,20 +166,30 @@ workspace = wsutils.findSingleWorkspace(fin, options)
 srcObj  = wsutils.getObj(workspace, ARGV.pop(0))
 destObj = wsutils.getObj(workspace, ARGV.pop(0))
 
+import time
+startTime = time.time()
+
+# extract the client/server relations of all nodes in one go
+graph = wsutils.getGraph(workspace)
+wsutils.reportTiming(options, "extracting graph (%d nodes)" % len(graph), startTime)
+
+srcIndex  = graph.index[srcObj.GetName()]
+destIndex = graph.index[destObj.GetName()]
+
 # assume that there are no cycles in the object graph,
 # so if one direction finds a path, the other will not
 
-nodes = findObjectsOnPaths(workspace, srcObj, destObj)
+nodes = findObjectsOnPaths(graph, srcIndex, destIndex)
 
 if not nodes:
     # try the reverse direction
-    nodes = findObjectsOnPaths(workspace, destObj, srcObj)
+    nodes = findObjectsOnPaths(graph, destIndex, srcIndex)
 
     if not(nodes):
         print >> sys.stderr,"no path found beween %s and %s" % (srcObj.GetName(), destObj.GetName())
         sys.exit(1)
 
-# print [ node.GetName() for node in nodes ]
+# print [ graph.names[node] for node in nodes ]
 
 #----------
 # apply list of exclusion patterns
@@ -184,16 +198,16 @@ import fnmatch
 for excludePattern in options.exclude:
     newNodes = []
     for node in nodes:
-        if not fnmatch.fnmatch(node.GetName(), excludePattern):
+        if not fnmatch.fnmatch(graph.names[node], excludePattern):
             newNodes.append(node)
 
     nodes = newNodes
 
 #----------
-# get names of (remaining) good nodes so that we can later on check
+# get the (remaining) good nodes so that we can later on check
 # which edges to draw
 #----------
-nodeNames = set([ node.GetName() for node in nodes ])
+nodeSet = set(nodes)
 
 #----------
 # produce graphviz code
@@ -212,30 +226,26 @@ print >> fout, "  rankdir = BT;"
 for node in nodes:
 
     # print attributes of node first
-    print >> fout,'%s [label="%s\\n%s"]' % (node.GetName(),
-                                           node.ClassName(),
-                                           node.GetName())
+    print >> fout,'%s [label="%s\\n%s"]' % (graph.names[node],
+                                           graph.classNames[node],
+                                           graph.names[node])
 
 print >> fout
 
 # draw edges
 for node in nodes:
 
-    clients = wsutils.getClients(node)
-    
-    for client in clients:
+    for client in graph.clients[node]:
         # note that not all clients are 'good' nodes
         # (i.e. they may not have a path to the upper level
         # object
 
-        if not client.GetName() in nodeNames:
+        if not client in nodeSet:
             continue
 
         # make arrows point 'upwards' in the sense
         # 'A -> B' means 'A influences B'
-        print >> fout,"%s->%s" % (node.GetName(), client.GetName())
+        print >> fout,"%s->%s" % (graph.names[node], graph.names[client])
 
 
 print >> fout,"}" # digraph
-
-
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file [ member1 member2 ... ]
+
+  prints a structural hash for each of the given members (fnmatch patterns,
+  all components if none is given) of the workspace. The hash of a member
+  depends on its class, its own attributes (values, ranges, formulas etc.)
+  and the hashes of the members it depends on, but not on its name
+  (except for variables and categories unless --no-leaf-names is given).
+
+  Identical hashes thus identify identical subgraphs, also across
+  workspaces. Members of classes whose internal state is not known
+  (e.g. third party classes with histograms) are hashed including their
+  name and their hashes start with '""" + wsutils.unhashablePrefix + """': equal hashes of
+  such members in different workspaces do not imply that they are identical.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--no-leaf-names",
+                  dest="includeLeafNames",
+                  default = True,
+                  action="store_false",
+                  help="do not include the names of variables and categories in the hashes",
+                  )
+
+parser.add_option("--json",
+                  dest="json",
+                  default = False,
+                  action="store_true",
+                  help="print a json dict from member name to hash",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 1:
+    print >> sys.stderr,"no input file specified"
+    sys.exit(1)
+
+fname = ARGV.pop(0)
+patterns = ARGV
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(fname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + fname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+graph = wsutils.getGraph(workspace)
+
+startTime = wsutils.reportTiming(options, "extracting graph (%d nodes)" % len(graph), startTime)
+
+hashes = wsutils.computeHashes(workspace, includeLeafNames = options.includeLeafNames)
+
+startTime = wsutils.reportTiming(options, "computing hashes", startTime)
+
+if patterns:
+    import fnmatch
+    names = []
+    for pattern in patterns:
+        matchingNames = fnmatch.filter(graph.names, pattern)
+        if not matchingNames:
+            print >> sys.stderr,"could not find item %s (nor does it match as a wildcard) in workspace %s in file %s" % (pattern, workspace.GetName(), fname)
+            sys.exit(1)
+        names.extend(matchingNames)
+else:
+    names = graph.names
+
+if options.json:
+    import json
+    print json.dumps(dict((name, hashes[graph.index[name]]) for name in names), indent = 1, sort_keys = True)
+else:
+    for name in names:
+        print hashes[graph.index[name]], name
+
+ROOT.gROOT.cd()
+fin.Close()
@@ -23,10 +23,33 @@ from optparse import OptionParser
 parser = OptionParser("""
 
   usage: %prog [options] file output pdf keepindex [keepindex ...]
+         %prog [options] --rules rules.json file output
 
   keep in a RooMultiPdf only a set of nuisances
 
   keepindex can be a number or a regexp on the pdf name
+
+  With --rules, all RooMultiPdfs of the workspace are processed at
+  once. The rules file is a json object mapping names or fnmatch
+  patterns of RooMultiPdfs to lists of keepindex values, e.g.
+
+    { "pdf_cat0": [ 0, 2 ], "pdf_cat*": [ "exp.*" ] }
+
+  The first matching entry (in the order of the file) is applied to
+  each RooMultiPdf, RooMultiPdfs without a matching entry are not
+  modified.
+
+  The index categories are redefined with consecutive indices for the
+  kept pdfs. Their current values (and with --subgraph their values
+  in the snapshots) are mapped to the new indices, or set to the first
+  kept pdf if the selected pdf is dropped. RooMultiPdfs sharing an
+  index category must keep the same indices.
+
+  By default, all members of the workspace are copied into a new
+  workspace. With --subgraph, only the RooMultiPdfs and their index
+  categories are replaced in the workspace read from the input file;
+  candidate pdfs (and the functions they depend on) which are not used
+  anymore are dropped, all other members are left untouched.
 """
 )
 
@@ -36,7 +59,22 @@ parser.add_option("--rename_index",
                   help="instead of keeping the discrete index name instead use this one",
                   )
 
-wsutils.addCommonOptions(parser)
+parser.add_option("--subgraph",
+                  default = False,
+                  action = "store_true",
+                  help="replace only the RooMultiPdfs and their categories instead of copying all members into a new workspace",
+                  )
+
+parser.add_option("--rules",
+                  dest = "rulesFname",
+                  default = None,
+                  help="json file mapping names or patterns of RooMultiPdfs to the lists of pdfs to keep",
+                  metavar = "FILE",
+                  )
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
 
 (options, ARGV) = parser.parse_args()
 
@@ -45,13 +83,21 @@ wsutils.addCommonOptions(parser)
 #----------------------------------------
 wsutils.checkCommonOptions(options)
 
-if len(ARGV) < 4:
-    print >> sys.stderr,"expected at least three positional arguments"
+if options.rulesFname != None:
+    if len(ARGV) != 2:
+        print >> sys.stderr,"expected exactly two positional arguments with --rules"
+        sys.exit(1)
+
+    if options.rename_index != "":
+        print >> sys.stderr,"--rename_index can not be used together with --rules"
+        sys.exit(1)
+
+elif len(ARGV) < 4:
+    print >> sys.stderr,"expected at least four positional arguments"
     sys.exit(1)
 
 #----------------------------------------
 
-
 import ROOT
 
 def getClients(node):
@@ -74,15 +120,177 @@ def getServers(node):
         servers.append(server)
     return servers
 
+def findUnusedNodes(graph, dropNodes, keepNodes):
+    """ @return the nodes in dropNodes and those which are used only by
+        them (directly or indirectly), ordered such that clients come
+        before their servers. Variables, categories and the nodes
+        in keepNodes are never dropped. """
+
+    dropNodes = set(dropNodes)
+    candidates = set(node for node, depth in graph.reachable(dropNodes, servers = True))
+
+    retval = []
+    for node in reversed(graph.topologicalOrder()):
+        if not node in candidates:
+            continue
+
+        if not node in dropNodes:
+            className = graph.classNames[node]
+            if node in keepNodes or \
+                    wsutils.classInheritsFrom(className, "RooAbsRealLValue") or \
+                    wsutils.classInheritsFrom(className, "RooAbsCategoryLValue"):
+                continue
+
+            if not all(client in dropNodes for client in graph.clients[node]):
+                continue
+
+            dropNodes.add(node)
+
+        retval.append(node)
+
+    return retval
+
+def replaceMultiPdfs(workspace, replacements):
+    """ replaces RooMultiPdfs in the workspace in place.
+
+        @param replacements a list of (name, new pdf, name of the new
+        index category) tuples. Members with the names of the new
+        index categories are replaced as well.
+
+        The clients of the replaced members are redirected to the new
+        ones, candidate pdfs no longer used are deleted together with
+        the functions only they depend on.
+    """
+
+    graph = wsutils.getGraph(workspace, refresh = True)
+
+    replacedNames = []
+    keepNodes = set()
+
+    for name, newpdf, catname in replacements:
+        replacedNames.append(name)
+        if catname in graph.index and not catname in replacedNames:
+            replacedNames.append(catname)
+
+        keepNodes.update(graph.index[newpdf.getPdf(i).GetName()] for i in range(newpdf.getNumPdfs()))
+
+    # members of named sets (e.g. the parameters of a ModelConfig)
+    # are kept unless they are replaced
+    namedSets = wsutils.getNamedSets(workspace)
+    for elementNames in namedSets.values():
+        keepNodes.update(graph.index[name] for name in elementNames if name in graph.index)
+
+    dropNodes = findUnusedNodes(graph, [ graph.index[name] for name in replacedNames ], keepNodes)
+    dropNames = set(graph.names[node] for node in dropNodes)
+    dropObjs = [ workspace.obj(graph.names[node]) for node in dropNodes ]
+
+    for name in sorted(dropNames - set(replacedNames)):
+        print "-> Dropping", name
+
+    # take the replaced members out of the workspace so that the
+    # new ones can be imported under the same names
+    for obj in dropObjs:
+        workspace.components().remove(obj, True)
+
+    for name, newpdf, catname in replacements:
+        wsutils.importObj(workspace, newpdf)
+
+    # redirect the remaining clients to the imported copies
+    wsutils.replaceNodes(workspace, [ workspace.obj(name) for name in replacedNames ], exclude = dropNames)
+
+    for setName, elementNames in namedSets.items():
+        if any(name in replacedNames for name in elementNames):
+            workspace.defineSet(setName, ",".join(elementNames))
+
+    wsutils.deleteNodes(workspace, dropObjs)
+    wsutils.getGraph(workspace, refresh = True)
+
+def findIndexCategory(pdf):
+    """ @return the index category of the given RooMultiPdf or None """
+    retval = None
+    #print "CLIENTS:",getClients(pdf)
+    #print "SERVERS:",getServers(pdf)
+    for o in getServers(pdf):
+        #print "Considering Client",o.GetName()
+        if o.InheritsFrom("RooCategory"): retval=o
+
+    return retval
+
+def selectPdfs(pdf, keepItems):
+    """ @return the indices of the pdfs of the given RooMultiPdf
+        selected by keepItems (indices or regular expressions) """
+    retval = []
+
+    npdf=pdf.getNumPdfs()
+    for ipdf in range(0,npdf):
+        myfunc=pdf.getPdf(ipdf)
+        toadd=False
+        for item in keepItems:
+            item = str(item)
+            try:
+                idx=int(item)
+                if ipdf==idx:
+                    print "* mapping with index",item
+                    toadd=True
+            except ValueError:
+                if re.match(item,myfunc.GetName()):
+                    print "* mapping with regexp",item
+                    toadd=True
+
+        if toadd:
+            print "-> Adding function", myfunc.GetName()
+            retval.append(ipdf)
+
+    return retval
+
+def readRules(fname):
+    """ @return the list of (pattern, keepItems) pairs from the given
+        json file, in the order of the file """
+    import json, collections
+
+    fin = open(fname)
+    rules = json.load(fin, object_pairs_hook = collections.OrderedDict)
+    fin.close()
+
+    if not isinstance(rules, dict) or not all(isinstance(items, list) for items in rules.values()):
+        raise Exception("expected a json object mapping RooMultiPdf names or patterns to lists in " + fname)
+
+    return rules.items()
+
+def remapSnapshots(workspace, indexMaps):
+    """ maps the values of the index categories in the snapshots
+        of the workspace to the new indices.
+
+        @param indexMaps maps from category name to a dict
+        from old to new index
+    """
+    try:
+        snapshotNames = wsutils.getSnapshotNames(workspace)
+    except Exception, ex:
+        print >> sys.stderr,"WARNING: snapshots are not modified:",ex
+        return
+
+    for snapshotName in snapshotNames:
+        snapshot = workspace.getSnapshot(snapshotName)
+
+        for catname, indexMap in indexMaps.items():
+            cat = snapshot.find(catname)
+            if cat == None:
+                continue
+
+            cat.setIndex(indexMap.get(cat.getIndex(), 0))
+
 
 # avoid unnecessary X11 connections
 ROOT.gROOT.SetBatch(True)
 
 wsutils.loadLibraries(options)
 
+import time
+startTime = time.time()
+
 fname = ARGV.pop(0)
 outname = ARGV.pop(0)
-pdfname = ARGV.pop(0)
 
 fin = ROOT.TFile.Open(fname,"UPDATE")
 if not fin.IsOpen():
@@ -102,62 +310,149 @@ if len(workspaces) < 1:
 
 workspace = workspaces[0]
 
-pdf = workspace.pdf(pdfname)
-if pdf == None:
-    print >> sys.stderr,"could not find item %s in workspace %s in file %s" % (pdfname, workspace.GetName(), fname)
-    sys.exit(1)
-if not pdf.InheritsFrom("RooMultiPdf"):
-    print >> sys.stderr,"pdf %s is not a RooMultiPdf" % (pdfname)
-    sys.exit(1)
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+#----------
+# find the RooMultiPdfs to be modified and
+# the pdfs to be kept
+#----------
+
+# list of (pdf name, keepindex values)
+selections = []
+
+if options.rulesFname != None:
+    import fnmatch
+
+    try:
+        rules = readRules(options.rulesFname)
+    except Exception, ex:
+        print >> sys.stderr,"problems reading rules file %s: %s" % (options.rulesFname, ex)
+        sys.exit(1)
 
-catname=""
-#print "CLIENTS:",getClients(pdf)
-#print "SERVERS:",getServers(pdf)
-for o in getServers(pdf):
-    #print "Considering Client",o.GetName()
-    if o.InheritsFrom("RooCategory"): catname=o.GetName()
-
-if catname=="": 
-    print >>sys.stderr,"unable to find RooCategoryName. (?)"
-
-storedPdfs = ROOT.RooArgList();
-
-npdf=pdf.getNumPdfs()
-for ipdf in range(0,npdf):
-    myfunc=pdf.getPdf(ipdf)
-    toadd=False
-    for item in ARGV:
-        try:
-            idx=int(item)
-            if ipdf==idx: 
-                print "* mapping with index",item
-                toadd=True
-        except ValueError:
-            if re.match(item,myfunc.GetName()): 
-                print "* mapping with regexp",item
-                toadd=True
-    
-    if toadd: 
-        print "-> Adding function", myfunc.GetName()
-        storedPdfs.add(myfunc)
-
-if options.rename_index != "":
-    catname=options.rename_index
-print "catname is",catname
-pdf_cat = ROOT.RooCategory(catname,"remapped")
-newpdf=ROOT.RooMultiPdf(pdf.GetName(),pdf.GetTitle(),pdf_cat,storedPdfs)
-
-ws2=ROOT.RooWorkspace(workspace.GetName(),workspace.GetTitle())
-getattr(ws2,'import')(newpdf,ROOT.RooFit.RecycleConflictNodes(),ROOT.RooFit.Silence())
-allMembers = wsutils.getAllMembers(workspace)
-for x in allMembers:
-    if x.GetName() != pdfname:
-        getattr(ws2,'import')(x,ROOT.RooFit.RecycleConflictNodes(),ROOT.RooFit.Silence())
+    multiPdfNames = sorted(obj.GetName() for obj in wsutils.getAllMembers(workspace)
+                           if obj.InheritsFrom("RooMultiPdf"))
+
+    usedPatterns = set()
+    for pdfname in multiPdfNames:
+        for pattern, keepItems in rules:
+            if fnmatch.fnmatchcase(pdfname, pattern):
+                selections.append((pdfname, keepItems))
+                usedPatterns.add(pattern)
+                break
+
+    for pattern, keepItems in rules:
+        if not pattern in usedPatterns:
+            print >> sys.stderr,"WARNING: no RooMultiPdf matches rule '%s'" % pattern
+
+else:
+    selections.append((ARGV[0], ARGV[1:]))
+
+# new RooMultiPdfs as (name, new pdf, category name)
+replacements = []
+
+# keep the python references to the new categories: they are
+# not owned by the new pdfs
+newCategories = []
+
+# kept indices for each new category name
+keptIndicesByCat = {}
+
+# maps from old to new category index for the category names
+# which are not changed
+indexMaps = {}
+
+for pdfname, keepItems in selections:
+    pdf = workspace.pdf(pdfname)
+    if pdf == None:
+        print >> sys.stderr,"could not find item %s in workspace %s in file %s" % (pdfname, workspace.GetName(), fname)
+        sys.exit(1)
+    if not pdf.InheritsFrom("RooMultiPdf"):
+        print >> sys.stderr,"pdf %s is not a RooMultiPdf" % (pdfname)
+        sys.exit(1)
+
+    print "processing",pdfname
+
+    oldCat = findIndexCategory(pdf)
+    if oldCat == None:
+        print >>sys.stderr,"unable to find RooCategoryName. (?)"
+        catname = ""
+    else:
+        catname = oldCat.GetName()
+
+    keptIndices = selectPdfs(pdf, keepItems)
+    if not keptIndices:
+        print >> sys.stderr,"no pdf of %s selected" % pdfname
+        sys.exit(1)
+
+    indexMap = dict((oldIndex, newIndex) for newIndex, oldIndex in enumerate(keptIndices))
+
+    if options.rename_index != "":
+        catname=options.rename_index
+    print "catname is",catname
+
+    # all RooMultiPdfs using the same category must be
+    # remapped in the same way
+    if keptIndicesByCat.setdefault(catname, keptIndices) != keptIndices:
+        print >> sys.stderr,"RooMultiPdfs with index category %s keep different indices: %s and %s" % (
+            catname, keptIndicesByCat[catname], keptIndices)
+        sys.exit(1)
+
+    if oldCat != None and oldCat.GetName() == catname:
+        indexMaps[catname] = indexMap
+
+    storedPdfs = ROOT.RooArgList();
+    for ipdf in keptIndices:
+        storedPdfs.add(pdf.getPdf(ipdf))
+
+    pdf_cat = ROOT.RooCategory(catname,"remapped")
+    newpdf=ROOT.RooMultiPdf(pdf.GetName(),pdf.GetTitle(),pdf_cat,storedPdfs)
+
+    # keep the selected pdf if possible
+    if oldCat != None:
+        oldIndex = oldCat.getIndex()
+        if not oldIndex in indexMap:
+            print >> sys.stderr,"WARNING: the selected pdf %d of %s is dropped, selecting %s instead" % (
+                oldIndex, pdfname, newpdf.getPdf(0).GetName())
+        pdf_cat.setIndex(indexMap.get(oldIndex, 0))
+
+    replacements.append((pdfname, newpdf, catname))
+    newCategories.append(pdf_cat)
+
+    print "index mapping:", " ".join("%d->%d" % item for item in sorted(indexMap.items()))
+
+startTime = wsutils.reportTiming(options, "creating new RooMultiPdfs", startTime)
+
+if not replacements:
+    print >> sys.stderr,"no RooMultiPdf to be modified"
+
+#----------
+# replace the RooMultiPdfs
+#----------
+
+if options.subgraph:
+    # the old pdfs and categories are deleted here
+    replaceMultiPdfs(workspace, replacements)
+    remapSnapshots(workspace, indexMaps)
+    ws2 = workspace
+else:
+    replacedNames = set(name for name, newpdf, catname in replacements)
+
+    ws2=ROOT.RooWorkspace(workspace.GetName(),workspace.GetTitle())
+    for name, newpdf, catname in replacements:
+        getattr(ws2,'import')(newpdf,ROOT.RooFit.RecycleConflictNodes(),ROOT.RooFit.Silence())
+    allMembers = wsutils.getAllMembers(workspace)
+    for x in allMembers:
+        if not x.GetName() in replacedNames:
+            getattr(ws2,'import')(x,ROOT.RooFit.RecycleConflictNodes(),ROOT.RooFit.Silence())
+
+startTime = wsutils.reportTiming(options, "replacing RooMultiPdfs", startTime)
 
 ws2.writeToFile(outname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
 print "-- DONE --"
-ws2.pdf(pdfname).Print()
+for name, newpdf, catname in replacements:
+    ws2.pdf(name).Print()
 print "----------"
 del ws2
-
-    
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+def getHashes(ws):
+    """ @return a dict mapping from member name to
+        (class name, structural hash) """
+
+    graph = wsutils.getGraph(ws)
+    hashes = wsutils.computeHashes(ws)
+
+    return dict((name, (graph.classNames[node], hashes[node])) for node, name in enumerate(graph.names))
+
+#----------------------------------------------------------------------
+
+def getDataMergeModes(ws1, ws2):
+    """ @return a dict mapping the names of the datasets which exist in
+        both workspaces to 'same' if their contents are identical,
+        'append' if they are unbinned datasets with the same observables
+        (whose entries are then concatenated) or None if they
+        can't be combined """
+
+    retval = {}
+
+    for data2 in wsutils.rootListTolist(ws2.allData()):
+        data1 = ws1.data(data2.GetName())
+        if data1 == None:
+            continue
+
+        observables1 = sorted(var.GetName() for var in wsutils.rooArgSetToList(data1.get()))
+        observables2 = sorted(var.GetName() for var in wsutils.rooArgSetToList(data2.get()))
+
+        if observables1 == observables2 and data1.ClassName() == data2.ClassName() and \
+           data1.numEntries() == data2.numEntries() and \
+           wsutils.getDataDigest(data1) == wsutils.getDataDigest(data2):
+            mode = 'same'
+
+        elif observables1 == observables2 and data1.ClassName() == "RooDataSet" and data2.ClassName() == "RooDataSet":
+            mode = 'append'
+
+        else:
+            mode = None
+
+        retval[data2.GetName()] = mode
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def findConflicts(ws1, ws2, dataModes):
+    """ @return a list of descriptions of members which exist in both
+        workspaces with the same name but are defined differently
+        (i.e. have a different structural hash) or whose definitions
+        can not be compared (unhashable members, see
+        wsutils.computeHashes(..)) and of datasets which can't
+        be combined
+
+        @param dataModes the result of getDataMergeModes(ws1, ws2)
+    """
+
+    hashes1 = getHashes(ws1)
+    hashes2 = getHashes(ws2)
+
+    conflictNames = set(name for name in set(hashes1.keys()) & set(hashes2.keys())
+                        if hashes1[name] != hashes2[name] or wsutils.isUnhashable(hashes1[name][1]))
+
+    # a difference propagates to all clients, only report the
+    # nodes which do not just inherit it from one of their servers
+    graph1 = wsutils.getGraph(ws1)
+
+    retval = []
+
+    for name in sorted(conflictNames):
+        if any(graph1.names[server] in conflictNames for server in graph1.servers[graph1.index[name]]):
+            continue
+
+        if hashes1[name] == hashes2[name]:
+            retval.append("%s: %s can not be compared (internal state not known)" % (name, hashes1[name][0]))
+        else:
+            retval.append("%s: %s %s != %s %s" % ((name,) + hashes1[name] + hashes2[name]))
+
+    for name, mode in sorted(dataModes.items()):
+        if mode == None:
+            data1, data2 = ws1.data(name), ws2.data(name)
+            retval.append("dataset %s: %s with %d entries (sum %g) and %s with %d entries (sum %g) differ and can not be combined" % (
+                name, data1.ClassName(), data1.numEntries(), data1.sumEntries(),
+                data2.ClassName(), data2.numEntries(), data2.sumEntries()))
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def mergeInto(ws1, ws2, dataModes):
+    """ imports the contents of ws2 into ws1. Nodes with the same
+        name are taken from ws1.
+
+        @param dataModes the result of getDataMergeModes(ws1, ws2)
+    """
+    import ROOT
+
+    graph2 = wsutils.getGraph(ws2)
+
+    # importing the top level nodes brings in everything else
+    for node in graph2.topLevelNodes():
+        wsutils.importObj(ws1, ws2.obj(graph2.names[node]))
+
+    for data in wsutils.rootListTolist(ws2.allData()):
+        data1 = ws1.data(data.GetName())
+        if data1 == None:
+            wsutils.importObj(ws1, data)
+        elif dataModes.get(data.GetName()) == 'append':
+            data1.append(data)
+
+    snapshotNames1 = set(wsutils.getSnapshotNames(ws1))
+    for name in wsutils.getSnapshotNames(ws2):
+        snapshot = ROOT.RooArgSet()
+
+        if name in snapshotNames1:
+            snapshot.add(ws1.getSnapshot(name))
+
+        # silently skips parameters already in the snapshot
+        snapshot.add(ws2.getSnapshot(name), True)
+
+        ws1.saveSnapshot(name, snapshot, True)
+
+    sets1 = wsutils.getNamedSets(ws1)
+    for name, elementNames in wsutils.getNamedSets(ws2).items():
+        if not name in sets1 and elementNames:
+            ws1.defineSet(name, ",".join(elementNames))
+
+    modelConfigNames1 = set(mc.GetName() for mc in wsutils.getModelConfigs(ws1))
+    for mc in wsutils.getModelConfigs(ws2):
+        if not mc.GetName() in modelConfigNames1:
+            wsutils.copyModelConfig(mc, ws1)
+
+#----------------------------------------------------------------------
+
+def mergeFiles(args):
+    """ merges the workspaces in the two given files and writes
+        the result to the given output file. Run in a worker process.
+
+        @return the list of conflicts found (nothing is written
+        if this is not empty and --force was not given)
+    """
+
+    fname1, fname2, outputFname = args
+
+    ws1 = wsutils.readSingleWorkspace(fname1, options, raiseErrors = True)
+    ws2 = wsutils.readSingleWorkspace(fname2, options, raiseErrors = True)
+
+    dataModes = getDataMergeModes(ws1, ws2)
+
+    conflicts = findConflicts(ws1, ws2, dataModes)
+    conflicts = [ "%s + %s: %s" % (fname1, fname2, conflict) for conflict in conflicts ]
+
+    if not conflicts or options.force:
+        mergeInto(ws1, ws2, dataModes)
+        ws1.writeToFile(outputFname)
+
+    # worker processes are reused for several pairs
+    wsutils.clearGraphCache()
+
+    return conflicts
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] output_file input_file1 input_file2 [ input_file3 ... ]
+
+  merges the workspaces in the given input files into a single
+  workspace. Files are merged pairwise by a pool of worker
+  processes, halving the number of files at each level.
+
+  Members with the same name in two files must have the same definition,
+  i.e. the same structural hash (see wsHash.py) which covers class,
+  attributes such as values, ranges or formulas and all servers,
+  otherwise the conflict is reported and nothing is written (unless
+  --force is given, in which case the first definition is kept).
+  Members of classes whose internal state (e.g. histograms) is not
+  covered by the hash are always reported as conflicts.
+
+  Datasets, named sets, snapshots and ModelConfigs are merged as well.
+  Snapshots with the same name are combined. Datasets with the same
+  name are kept once if their contents are identical, unbinned datasets
+  with the same observables are appended to each other (e.g. the
+  data_obs of several channels), other datasets with the same name
+  are reported as conflicts. Named sets and ModelConfigs with the
+  same name are taken from the first file.
+
+  WARNING: the program will overwrite the output workspace file without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser)
+
+parser.add_option("--force",
+                  dest="force",
+                  default = False,
+                  action="store_true",
+                  help="merge even if conflicting definitions are found",
+                  )
+
+import multiprocessing
+parser.add_option("-j",
+                  dest="numProcesses",
+                  default = multiprocessing.cpu_count(),
+                  type = int,
+                  help="number of worker processes (default: %default)",
+                  metavar="N",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 3:
+    print >> sys.stderr,"expected at least three positional arguments"
+    sys.exit(1)
+
+outputFname = ARGV.pop(0)
+inputFnames = ARGV
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time, tempfile, shutil
+
+totalStartTime = time.time()
+
+tmpdir = tempfile.mkdtemp(prefix = "wsMerge")
+
+try:
+    fnames = inputFnames
+    level = 0
+    allConflicts = []
+
+    while len(fnames) > 1:
+        level += 1
+        startTime = time.time()
+
+        tasks = []
+        for i in range(0, len(fnames) - 1, 2):
+            tasks.append((fnames[i], fnames[i+1], os.path.join(tmpdir, "level%d_%d.root" % (level, i // 2))))
+
+        results = wsutils.parallelMap(mergeFiles, tasks, options.numProcesses)
+
+        for conflicts in results:
+            allConflicts.extend(conflicts)
+
+        if allConflicts and not options.force:
+            for conflict in allConflicts:
+                print >> sys.stderr,"conflict:",conflict
+            print >> sys.stderr,"found %d conflicts, not writing any output" % len(allConflicts)
+            sys.exit(1)
+
+        newFnames = [ task[2] for task in tasks ]
+
+        if len(fnames) % 2 == 1:
+            # odd number of files, pass the last one on to the next level
+            newFnames.append(fnames[-1])
+
+        print >> sys.stderr,"level %d: merged %d files into %d in %.1f s" % (level, len(fnames), len(newFnames), time.time() - startTime)
+
+        fnames = newFnames
+
+    for conflict in allConflicts:
+        print >> sys.stderr,"WARNING: conflict:",conflict
+
+    shutil.copyfile(fnames[0], outputFname)
+    print >> sys.stderr,"wrote %s after %.1f s" % (outputFname, time.time() - totalStartTime)
+
+finally:
+    shutil.rmtree(tmpdir)
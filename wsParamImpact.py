@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+def computeImpactIndex(workspace):
+    """ determines for each RooRealVar in the workspace which top level
+        objects (objects without clients, see wsPrintTopLevel.py) depend
+        on it.
+
+        Each top level object is assigned a bit. Going through the graph
+        from the top to the bottom, each node gets the union of the
+        bits of its clients, so all parameters are done in one pass.
+
+        @return a dict with the list of names of the top level objects
+        ('topLevel') and a dict ('params') mapping from parameter name
+        to a pair (bitmask as hex string, constness)
+    """
+    import ROOT
+
+    graph = wsutils.getGraph(workspace)
+
+    topLevel = graph.topLevelNodes()
+
+    masks = [ 0 ] * len(graph)
+
+    for bit, node in enumerate(topLevel):
+        masks[node] = 1 << bit
+
+    # clients come before their servers in this order
+    for node in reversed(graph.topologicalOrder()):
+        mask = masks[node]
+        for client in graph.clients[node]:
+            mask |= masks[client]
+        masks[node] = mask
+
+    # constness of all variables in one go
+    attrs = wsutils.getVarAttributes(workspace.allVars())
+    constness = dict(zip(attrs['name'], attrs['constant'].tolist()))
+
+    params = {}
+    for node, name in enumerate(graph.names):
+        if not name in constness or not ROOT.TClass.GetClass(graph.classNames[node]).InheritsFrom("RooRealVar"):
+            continue
+
+        params[name] = ('%x' % masks[node], constness[name])
+
+    return dict(topLevel = [ graph.names[node] for node in topLevel ],
+                params = params)
+
+#----------------------------------------------------------------------
+
+def maskToNames(mask, topLevel):
+    """ @return the names of the top level objects whose bits are set in mask """
+    return [ name for bit, name in enumerate(topLevel) if (mask >> bit) & 1 ]
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file [ param1 param2 ... ]
+
+  prints for each of the given parameters (fnmatch patterns,
+  all RooRealVars if none is given) the top level objects
+  of the workspace (i.e. objects without clients) which depend on it.
+
+  The parameter to top level object relations are computed once and
+  stored in a file next to the input file (with suffix """ + wsutils.sidecarSuffix + """)
+  so that subsequent queries do not need to read the workspace.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--non-const",
+                  dest="nonConst",
+                  default = False,
+                  action="store_true",
+                  help="only consider parameters which are not constant",
+                  )
+
+parser.add_option("--top",
+                  dest="topPatterns",
+                  default = [],
+                  action="append",
+                  help="instead print for each top level object matching the given fnmatch pattern the parameters it depends on. Can be specified multiple times",
+                  metavar="PATTERN",
+                  )
+
+parser.add_option("--group",
+                  dest="group",
+                  default = False,
+                  action="store_true",
+                  help="group the parameters affecting exactly the same set of top level objects",
+                  )
+
+parser.add_option("--json",
+                  dest="json",
+                  default = False,
+                  action="store_true",
+                  help="print the result in json format",
+                  )
+
+parser.add_option("--rebuild",
+                  dest="rebuild",
+                  default = False,
+                  action="store_true",
+                  help="recompute the index even if an up to date one exists",
+                  )
+
+parser.add_option("--no-index",
+                  dest="writeIndex",
+                  default = True,
+                  action="store_false",
+                  help="do not store the computed index next to the input file",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 1:
+    print >> sys.stderr,"no input file specified"
+    sys.exit(1)
+
+if options.group and options.topPatterns:
+    print >> sys.stderr,"--group and --top can't be specified together"
+    sys.exit(1)
+
+fname = ARGV.pop(0)
+paramPatterns = ARGV
+
+#----------------------------------------
+
+import time
+startTime = time.time()
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+indexKey = "paramImpact"
+if options.workspaceName != None:
+    indexKey += ":" + options.workspaceName
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+# opening the file does not read the workspace yet
+fin = ROOT.TFile.Open(fname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + fname
+    sys.exit(1)
+
+index = None
+if not options.rebuild:
+    index = wsutils.loadSidecar(fname, indexKey)
+
+if index == None:
+    wsutils.loadLibraries(options)
+
+    # insist that there is a single workspace in this file
+    workspace = wsutils.findSingleWorkspace(fin, options)
+
+    startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+    index = computeImpactIndex(workspace)
+
+    startTime = wsutils.reportTiming(options, "computing index", startTime)
+
+    if options.writeIndex:
+        wsutils.saveSidecar(fname, indexKey, index)
+
+else:
+    startTime = wsutils.reportTiming(options, "reading index", startTime)
+
+#----------
+# select the parameters
+#----------
+import fnmatch
+
+topLevel = index['topLevel']
+
+params = {}
+for name, (mask, constant) in index['params'].items():
+    if options.nonConst and constant:
+        continue
+
+    if paramPatterns and not any(fnmatch.fnmatchcase(name, pattern) for pattern in paramPatterns):
+        continue
+
+    params[name] = int(mask, 16)
+
+if paramPatterns and not params:
+    print >> sys.stderr,"no parameters matching %s found in %s" % (" ".join(paramPatterns), fname)
+    sys.exit(1)
+
+#----------
+# answer the query
+#----------
+
+if options.topPatterns:
+    # top level object -> parameters
+    result = {}
+    for bit, topName in enumerate(topLevel):
+        if not any(fnmatch.fnmatchcase(topName, pattern) for pattern in options.topPatterns):
+            continue
+
+        result[topName] = sorted(name for name, mask in params.items() if (mask >> bit) & 1)
+
+elif options.group:
+    # set of top level objects -> parameters
+    groups = {}
+    for name, mask in params.items():
+        groups.setdefault(mask, []).append(name)
+
+    result = [ dict(topLevel = maskToNames(mask, topLevel), params = sorted(names))
+               for mask, names in groups.items() ]
+    result.sort(key = lambda group: group['params'])
+
+else:
+    # parameter -> top level objects
+    result = dict((name, maskToNames(mask, topLevel)) for name, mask in params.items())
+
+if options.json:
+    import json
+    print json.dumps(result, indent = 1, sort_keys = True)
+
+elif options.group:
+    for group in result:
+        print " ".join(group['params']) + ": " + " ".join(group['topLevel'])
+
+else:
+    for name in sorted(result.keys()):
+        print name + ": " + " ".join(result[name])
+
+wsutils.reportTiming(options, "query", startTime)
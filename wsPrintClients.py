@@ -30,10 +30,45 @@ parser = OptionParser("""
 
   prints the objects which use the given items (i.e. are 'clients'
   of the specified objects)
+
+  With --recursive or --depth, also indirect clients are printed,
+  each object only once (together with its smallest distance
+  to any of the given items).
 """
 )
 
-wsutils.addCommonOptions(parser)
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--recursive",
+                  dest="recursive",
+                  default = False,
+                  action="store_true",
+                  help="also print indirect clients (or servers with --servers)",
+                  )
+
+parser.add_option("--depth",
+                  dest="depth",
+                  default = None,
+                  type = int,
+                  help="print clients (or servers) up to DEPTH edges away from the given items. Implies --recursive",
+                  metavar="DEPTH",
+                  )
+
+parser.add_option("--servers",
+                  dest="servers",
+                  default = False,
+                  action="store_true",
+                  help="print the objects used by the given items (i.e. their 'servers') instead of their clients",
+                  )
+
+parser.add_option("--brief",
+                  dest="brief",
+                  default = False,
+                  action="store_true",
+                  help="only print the names of the objects (and their depth in recursive mode) rather than the name and the description",
+                  )
 
 (options, ARGV) = parser.parse_args()
 
@@ -50,6 +85,17 @@ if len(ARGV) < 2:
     print >> sys.stderr,"no items specified"
     sys.exit(1)
 
+if options.depth != None:
+    if options.depth < 1:
+        print >> sys.stderr,"--depth must be at least one"
+        sys.exit(1)
+    options.recursive = True
+
+if options.recursive:
+    maxDepth = options.depth
+else:
+    maxDepth = 1
+
 fname = ARGV.pop(0)
 #----------------------------------------
 
@@ -81,24 +127,64 @@ if len(workspaces) < 1:
 
 workspace = workspaces[0]
 
+import time
+startTime = time.time()
+
+# extract the client/server relations of all nodes in one go
+graph = wsutils.getGraph(workspace)
+wsutils.reportTiming(options, "extracting graph (%d nodes)" % len(graph), startTime)
+
+startNodes = []
 for itemName in ARGV:
 
     # find the given items
 
     obj = workspace.obj(itemName)
-    if obj == None:
+    if obj == None or not itemName in graph.index:
         print >> sys.stderr,"could not find item %s in workspace %s in file %s" % (itemName, workspace.GetName(), fname)
         sys.exit(1)
 
+    startNodes.append(graph.index[itemName])
+
+startTime = time.time()
+
+# one traversal for all items together, starting from their direct
+# clients (servers) so that the given items themselves are only
+# printed if they are clients (servers) of another given item
+if options.servers:
+    neighbours = graph.servers
+else:
+    neighbours = graph.clients
+
+firstNodes = []
+for node in startNodes:
+    firstNodes.extend(neighbours[node])
+
+if maxDepth != None:
+    nodes = graph.reachable(firstNodes, servers = options.servers, maxDepth = maxDepth - 1)
+else:
+    nodes = graph.reachable(firstNodes, servers = options.servers)
+
+nodes = [ (node, depth + 1) for node, depth in nodes ]
+
+wsutils.reportTiming(options, "traversal (%d nodes found)" % len(nodes), startTime)
+
+lastDepth = None
+for node, depth in nodes:
+
+    if options.brief:
+        if options.recursive:
+            print depth, graph.names[node]
+        else:
+            print graph.names[node]
+        continue
 
-    # loop over clients
-    iter = obj.clientIterator()
-    while True:
-        client = iter.Next()
-        if client == None:
-            break
+    if options.recursive and depth != lastDepth:
+        print "depth %d:" % depth
+        sys.stdout.flush()
+        lastDepth = depth
 
-        client.Print()
+    workspace.obj(graph.names[node]).Print()
 
 ROOT.gROOT.cd()
 fin.Close()
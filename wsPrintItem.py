@@ -30,7 +30,8 @@ parser = OptionParser("""
 )
 
 wsutils.addCommonOptions(parser,
-                         addSetVars = True
+                         addSetVars = True,
+                         addTiming = True,
                          )
 
 parser.add_option("-v",
@@ -47,6 +48,20 @@ parser.add_option("--brief",
                   help="only print the name of the item (if it exists) rather than the name and the description. Useful together with wildcards to see which members are in a workspace",
                   )
 
+parser.add_option("--csv",
+                  dest="csv",
+                  default = False,
+                  action="store_true",
+                  help="print name, class, value, range and constness of the items in .csv format",
+                  )
+
+parser.add_option("--json",
+                  dest="json",
+                  default = False,
+                  action="store_true",
+                  help="print name, class, value, range and constness of the items in json format",
+                  )
+
 parser.add_option("--regex",
                   dest="regex",
                   default = False,
@@ -54,7 +69,42 @@ parser.add_option("--regex",
                   help="interpret the patterns as regular experssions (rather than using fnmatch)",
                   )
 
+parser.add_option("--class",
+                  dest="classNames",
+                  default = [],
+                  action="append",
+                  help="only print items inheriting from the given class. Can be specified multiple times (items inheriting from any of the classes are printed)",
+                  metavar="CLASS",
+                  )
 
+parser.add_option("--const",
+                  dest="constant",
+                  default = None,
+                  action="store_true",
+                  help="only print items which are constant",
+                  )
+
+parser.add_option("--non-const",
+                  dest="constant",
+                  action="store_false",
+                  help="only print items which are not constant",
+                  )
+
+parser.add_option("--min-value",
+                  dest="minValue",
+                  default = None,
+                  type = float,
+                  help="only print items with a value of at least MINVAL",
+                  metavar="MINVAL",
+                  )
+
+parser.add_option("--max-value",
+                  dest="maxValue",
+                  default = None,
+                  type = float,
+                  help="only print items with a value of at most MAXVAL",
+                  metavar="MAXVAL",
+                  )
 
 (options, ARGV) = parser.parse_args()
 
@@ -67,12 +117,39 @@ if len(ARGV) < 2:
     print >> sys.stderr,"expected at least two positional arguments"
     sys.exit(1)
 
-if options.verbose and options.brief:
-    print >> sys.stderr,"-v and --brief can't be specified together"
+if len([ x for x in (options.verbose, options.brief, options.csv, options.json) if x ]) > 1:
+    print >> sys.stderr,"only one of -v, --brief, --csv and --json can be specified"
     sys.exit(1)
 
 #----------------------------------------
 
+def makeFilter(options):
+    """ @return a function accepting the objects passing the filters
+        given on the command line or None if no filter was specified """
+
+    filters = []
+
+    if options.classNames:
+        filters.append(lambda obj: any(obj.InheritsFrom(cls) for cls in options.classNames))
+
+    if options.constant != None:
+        filters.append(lambda obj: hasattr(obj, 'isConstant') and bool(obj.isConstant()) == options.constant)
+
+    if options.minValue != None:
+        filters.append(lambda obj: hasattr(obj, 'getVal') and obj.getVal() >= options.minValue)
+
+    if options.maxValue != None:
+        filters.append(lambda obj: hasattr(obj, 'getVal') and obj.getVal() <= options.maxValue)
+
+    if not filters:
+        return None
+
+    return lambda obj: all(func(obj) for func in filters)
+
+#----------------------------------------
+
+import time
+startTime = time.time()
 
 # avoid ROOT trying to use the command line arguments
 # (which causes a segmentation fault if one e.g. a regex contains a $ etc.)
@@ -96,71 +173,62 @@ workspace = wsutils.findSingleWorkspace(fin, options)
 
 wsutils.applySetVars(workspace, options.setVars)
 
-allItemNames = None
-
-allObjs = []
-
-for itemName in ARGV:
-
-
-    if options.regex:
-        # always interpret this as a regex
-        if allItemNames == None:
-            # get the names of all items
-            allItemNames = [ x.GetName() for x in wsutils.getAllMembers(workspace) ]
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
 
-        import re
-
-        # use search(..) (not necessarily starting from the beginning) rather
-        # than match(..)
-
-        for name in allItemNames:
-            mo = re.search(itemName, name)
-            if mo:
-                # don't care about duplicates for the moment
-                obj = workspace.obj(name)
-                assert obj != None
-                allObjs.append(obj)
-                               
-        # end of loop over all items in the workspace
-
-    else:
+filterFunc = makeFilter(options)
 
+if not options.regex and not any(wsutils.isGlobPattern(itemName) for itemName in ARGV):
+    # only exact names given, no need to build the index
+    # of all members
+    allObjs = []
+    seen = set()
+    for itemName in ARGV:
         obj = workspace.obj(itemName)
+        if obj == None:
+            print >> sys.stderr,"could not find item %s in workspace %s in file %s" % (itemName, workspace.GetName(), fname)
+            sys.exit(1)
 
-        if obj != None:
-            # found in workspace, add to the list of items to be printed
-            allObjs.append(obj)
+        if itemName in seen:
             continue
+        seen.add(itemName)
 
-        # not found, try a wildcard
-        if allItemNames == None:
-            # get the names of all items
-            allItemNames = [ x.GetName() for x in wsutils.getAllMembers(workspace) ]
-            import fnmatch
-
-            matchingNames = fnmatch.filter(allItemNames, itemName)
+        if filterFunc == None or filterFunc(obj):
+            allObjs.append(obj)
 
-            if not matchingNames:
-                print >> sys.stderr,"could not find item %s (nor does it match as a wildcard) in workspace %s in file %s" % (itemName, workspace.GetName(), fname)
-                sys.exit(1)
+else:
+    query = wsutils.MemberQuery(workspace)
+    startTime = wsutils.reportTiming(options, "building member index", startTime)
 
-            allObjs.extend(workspace.obj(name) for name in matchingNames)
+    try:
+        allObjs = query.select(ARGV, regex = options.regex, filterFunc = filterFunc)
+    except KeyError, ex:
+        print >> sys.stderr,"could not find item %s in workspace %s in file %s" % (ex.args[0], workspace.GetName(), fname)
+        sys.exit(1)
 
-    # end of loop over item specifications
+startTime = wsutils.reportTiming(options, "selecting %d items" % len(allObjs), startTime)
 
 # print the objects found
 
-for obj in allObjs:
-    if options.brief:
-        print obj.GetName()
-    elif options.verbose:
-        obj.Print("V")
-    else:
-        obj.Print()
+if options.csv or options.json:
+    columns = [ "name", "className", "value", "min", "max", "constant" ]
+    rows = [ wsutils.getMemberAttributes(obj) for obj in allObjs ]
 
-    # sys.stdout.flush()
-    #     obj.Print()
-            
-
-    
+    if options.csv:
+        print ",".join(columns)
+        for row in rows:
+            print ",".join("" if row[col] == None else str(row[col]) for col in columns)
+    else:
+        import json
+        print json.dumps(rows, indent = 1, sort_keys = True)
+
+else:
+    for obj in allObjs:
+        if options.brief:
+            print obj.GetName()
+        elif options.verbose:
+            obj.Print("V")
+        else:
+            obj.Print()
+
+sys.stdout.flush()
+wsutils.reportTiming(options, "printing", startTime)
@@ -86,6 +86,18 @@ parser.add_option("--csv",
                   help="print information about variables in .csv format",
                   )
 
+parser.add_option("--json",
+                  default = False,
+                  action="store_true",
+                  help="print information about variables in json format",
+                  )
+
+parser.add_option("--table",
+                  default = False,
+                  action="store_true",
+                  help="print one line per variable with name, value, error, range and constness (much faster than the default output for large numbers of variables)",
+                  )
+
 parser.add_option("--only-non-const",
                   dest = "onlyNonConst",
                   default = False,
@@ -112,6 +124,10 @@ if len(ARGV) != 2:
     parser.print_help()
     sys.exit(1)
 
+if len([ x for x in (options.csv, options.json, options.table) if x ]) > 1:
+    print >> sys.stderr,"only one of --csv, --json and --table can be specified"
+    sys.exit(1)
+
 
 fname, snapshotName = ARGV
 
@@ -164,6 +180,10 @@ else:
 
 if options.csv:
     wsutils.printVarsCSV(snapshot, sortKeyFunc = sortKeyFunc, filterFunc = filterFunc)
+elif options.json:
+    wsutils.printVarsJSON(snapshot, sortKeyFunc = sortKeyFunc, filterFunc = filterFunc)
+elif options.table:
+    wsutils.printVarsTable(snapshot, sortKeyFunc = sortKeyFunc, filterFunc = filterFunc)
 else:
     wsutils.printVars(snapshot, sortKeyFunc = sortKeyFunc, filterFunc = filterFunc)
 
@@ -30,7 +30,8 @@ parser = OptionParser("""
 )
 
 wsutils.addCommonOptions(parser,
-                         addSetVars = True
+                         addSetVars = True,
+                         addTiming = True,
                          )
 
 parser.add_option("-v",
@@ -87,22 +88,23 @@ workspace = wsutils.findSingleWorkspace(fin, options)
 
 wsutils.applySetVars(workspace, options.setVars)
 
-allItemNames = None
+import time
+startTime = time.time()
 
-allObjs = wsutils.getAllMembers(workspace)
+# extract the client/server relations of all nodes in one go
+# (datasets are not part of the graph)
+graph = wsutils.getGraph(workspace)
+wsutils.reportTiming(options, "extracting graph (%d nodes)" % len(graph), startTime)
 
-for obj in allObjs:
-    if not hasattr(obj, 'hasClients'):
-        # RooDataSets for example don't have this function
-        continue
+for node in graph.topLevelNodes():
 
-    if obj.hasClients():
-        # this is not a top level object
+    if options.brief:
+        print graph.names[node]
         continue
 
-    if options.brief:
-        print obj.GetName()
-    elif options.verbose:
+    obj = workspace.obj(graph.names[node])
+
+    if options.verbose:
         obj.Print("V")
     else:
         obj.Print()
@@ -38,6 +38,18 @@ parser.add_option("--csv",
                   help="print information about variables in .csv format",
                   )
 
+parser.add_option("--json",
+                  default = False,
+                  action="store_true",
+                  help="print information about variables in json format",
+                  )
+
+parser.add_option("--table",
+                  default = False,
+                  action="store_true",
+                  help="print one line per variable with name, value, error, range and constness (much faster than the default output for large numbers of variables)",
+                  )
+
 parser.add_option("--sort",
                   default = False,
                   action="store_true",
@@ -50,7 +62,9 @@ parser.add_option("--snapshot",
                   )
 
 
-wsutils.addCommonOptions(parser)
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
 
 (options, ARGV) = parser.parse_args()
 
@@ -63,9 +77,14 @@ if len(ARGV) < 1:
     print >> sys.stderr,"no input file specified"
     sys.exit(1)
 
+if len([ x for x in (options.csv, options.json, options.table) if x ]) > 1:
+    print >> sys.stderr,"only one of --csv, --json and --table can be specified"
+    sys.exit(1)
+
 #----------------------------------------
 
 
+import time
 import ROOT
 
 # avoid unnecessary X11 connections
@@ -89,15 +108,24 @@ for fname in ARGV:
 
     # traverse all directories in this file
     for ws in wsutils.findWorkspaces(fin, options):
+        startTime = time.time()
         if options.snapshot: ws.loadSnapshot(options.snapshot)
         if options.csv:
             wsutils.printVarsCSV(ws.allVars(), sortKeyFunc = varSortFunc)
+        elif options.json:
+            wsutils.printVarsJSON(ws.allVars(), sortKeyFunc = varSortFunc)
         else:
             print "variables in " + fname + ":" + ws.GetName() + ":"
             print "----------------------------------------"
             sys.stdout.flush()
 
-            wsutils.printVars(ws.allVars(), sortKeyFunc = varSortFunc)
+            if options.table:
+                wsutils.printVarsTable(ws.allVars(), sortKeyFunc = varSortFunc)
+            else:
+                wsutils.printVars(ws.allVars(), sortKeyFunc = varSortFunc)
+
+        sys.stdout.flush()
+        wsutils.reportTiming(options, "printing variables of " + ws.GetName(), startTime)
 
     ROOT.gROOT.cd()
     fin.Close()
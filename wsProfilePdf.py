@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+def inclusiveTimes(graph, nodes, times):
+    """ @return a dict mapping the given nodes to the sum of the
+        exclusive times of the node itself and all nodes it
+        depends on (directly or indirectly) """
+
+    exclusive = dict(zip(nodes, times))
+
+    retval = {}
+    for node in nodes:
+        retval[node] = sum(exclusive.get(other, 0.) for other, depth in graph.reachable([ node ], servers = True))
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def frameName(name):
+    """ @return the given node name with the characters which have a
+        special meaning in the folded stack format replaced """
+    return name.replace(";", "_").replace(" ", "_")
+
+def writeFoldedStacks(fout, graph, top, nodes, times):
+    """ writes the exclusive times of the nodes in the 'folded stacks'
+        format of flamegraph.pl (one line per node with the path from
+        the top node and the time in nanoseconds).
+
+        Nodes with more than one client appear only below the client
+        through which they are reached first from the top node (with
+        the smallest number of edges) so that the total time
+        is not counted twice.
+    """
+    exclusive = dict(zip(nodes, times))
+
+    # path from the top node along the breadth first search tree
+    paths = {}
+    depths = {}
+    for node, depth in graph.reachable([ top ], servers = True):
+        depths[node] = depth
+
+        if node == top:
+            paths[node] = frameName(graph.names[node])
+            continue
+
+        parent = min((client for client in graph.clients[node] if depths.get(client) == depth - 1),
+                     key = lambda client: graph.names[client])
+        paths[node] = paths[parent] + ";" + frameName(graph.names[node])
+
+    for node in nodes:
+        value = int(round(exclusive[node] * 1e9))
+        if value > 0:
+            print >> fout, "%s %d" % (paths[node], value)
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file pdf data
+
+  evaluates the given pdf for all entries of the given dataset (after
+  touching all floating parameters, i.e. like one evaluation of the
+  negative log likelihood) and prints the wall time spent in each
+  function and pdf it depends on, sorted by decreasing exclusive time.
+
+  Exclusive times are measured by evaluating the members in
+  topological order for each entry so that the servers of each member
+  are up to date when it is evaluated. Work not represented by a
+  workspace member (e.g. normalization integrals) is attributed to the
+  member doing it. The inclusive time of a member is the sum of the
+  exclusive times of itself and of all members it depends on.
+
+  Only the selected pdf of each RooMultiPdf and, for each entry, the pdf
+  of the current category of each RooSimultaneous are evaluated. Pdfs
+  which RooFit evaluates with a different normalization set than the
+  top pdf (e.g. the factors of a RooProdPdf) are not timed separately,
+  their time is attributed to their clients.
+
+  With --folded, the exclusive times are written in the folded stacks
+  format of flamegraph.pl (https://github.com/brendangregg/FlameGraph).
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--passes",
+                  dest="numPasses",
+                  default = 1,
+                  type = int,
+                  help="number of passes over the dataset to average over",
+                  metavar="N",
+                  )
+
+parser.add_option("--top",
+                  dest="maxRows",
+                  default = None,
+                  type = int,
+                  help="print only the N members with the largest exclusive times",
+                  metavar="N",
+                  )
+
+parser.add_option("--inclusive",
+                  dest="sortInclusive",
+                  default = False,
+                  action="store_true",
+                  help="sort by inclusive instead of exclusive time",
+                  )
+
+parser.add_option("--folded",
+                  dest="foldedFname",
+                  default = None,
+                  help="write the exclusive times in the folded stacks format of flamegraph.pl to the given file",
+                  metavar="FILE",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 3:
+    print >> sys.stderr,"expected exactly three positional arguments"
+    sys.exit(1)
+
+inputFname, pdfName, dataName = ARGV
+
+if options.numPasses < 1:
+    print >> sys.stderr,"the number of passes must be at least one"
+    sys.exit(1)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+pdf = wsutils.getObj(workspace, pdfName)
+data = wsutils.getObj(workspace, dataName)
+
+if not pdf.InheritsFrom("RooAbsReal"):
+    print >> sys.stderr,"%s is not a function or pdf" % pdfName
+    sys.exit(1)
+
+if not data.InheritsFrom("RooAbsData"):
+    print >> sys.stderr,"%s is not a dataset" % dataName
+    sys.exit(1)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+#----------
+# profile
+#----------
+
+graph = wsutils.getGraph(workspace)
+
+nodes, times, plainTime = wsutils.profileNodes(workspace, pdfName, data, options.numPasses)
+
+startTime = wsutils.reportTiming(options, "profiling", startTime)
+
+inclusive = inclusiveTimes(graph, nodes, times)
+
+#----------
+# print the table
+#----------
+totalTime = max(float(times.sum()), 1e-12)
+
+rows = zip(nodes, times.tolist())
+if options.sortInclusive:
+    rows.sort(key = lambda row: (-inclusive[row[0]], graph.names[row[0]]))
+else:
+    rows.sort(key = lambda row: (-row[1], graph.names[row[0]]))
+
+if options.maxRows != None:
+    rows = rows[:options.maxRows]
+
+print "%12s %7s %12s %7s  %-20s %s" % ("excl [s]", "excl %", "incl [s]", "incl %", "class", "name")
+
+for node, exclusive in rows:
+    print "%12.6f %6.2f%% %12.6f %6.2f%%  %-20s %s" % (
+        exclusive, 100. * exclusive / totalTime,
+        inclusive[node], 100. * inclusive[node] / totalTime,
+        graph.classNames[node], graph.names[node])
+
+print
+print "%d members, %d entries, %d pass(es)" % (len(nodes), data.numEntries(), options.numPasses)
+print "sum of the exclusive times: %.6f s" % times.sum()
+print "evaluating %s alone: %.6f s" % (pdfName, plainTime)
+
+# the members are evaluated individually with the normalization set of
+# the top pdf, which may differ from what RooFit does when evaluating
+# the top pdf alone
+if abs(times.sum() - plainTime) > 0.5 * max(plainTime, 1e-12):
+    print >> sys.stderr,"WARNING: the sum of the exclusive times differs by more than 50% from the time for evaluating %s alone, the attribution may not be representative" % pdfName
+
+#----------
+# flamegraph input
+#----------
+if options.foldedFname != None:
+    fout = open(options.foldedFname, "w")
+    writeFoldedStacks(fout, graph, graph.index[pdfName], nodes, times.tolist())
+    fout.close()
+
+    print >> sys.stderr,"wrote",options.foldedFname
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+def timeLoading(fname, wsname):
+    """ @return the time needed to open the given file and read
+        the given workspace from it """
+    import ROOT, time
+
+    startTime = time.time()
+
+    fin = ROOT.TFile.Open(fname)
+    ws = fin.Get(wsname)
+    assert ws != None
+
+    retval = time.time() - startTime
+
+    ROOT.gROOT.cd()
+    fin.Close()
+
+    return retval
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file [ root1 root2 ... ]
+
+  writes a copy of the workspace which contains only the given root
+  objects and the objects they (directly or indirectly) depend on,
+  plus the datasets and snapshots selected with --data and --snapshot.
+  Everything else is dropped.
+
+  Roots are names of workspace members or fnmatch patterns which are
+  matched against the top level objects of the workspace (i.e. those
+  listed by wsPrintTopLevel.py).
+
+  WARNING: the program will overwrite the output workspace file without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--modelconfig",
+                  dest="modelConfigs",
+                  default = [],
+                  action="append",
+                  help="name of a RooStats::ModelConfig in the workspace. Its pdf is taken as a root and the ModelConfig is copied to the output. Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--data",
+                  dest="dataNames",
+                  default = [],
+                  action="append",
+                  help="name of a dataset to keep. Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--snapshot",
+                  dest="snapshotNames",
+                  default = [],
+                  action="append",
+                  help="name of a snapshot to keep. Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) < 2:
+    print >> sys.stderr,"expected at least two positional arguments"
+    sys.exit(1)
+
+inputFname = ARGV.pop(0)
+outputFname = ARGV.pop(0)
+
+if not ARGV and not options.modelConfigs:
+    print >> sys.stderr,"no roots and no ModelConfig given, nothing to keep"
+    sys.exit(1)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+inputLoadTime = time.time() - startTime
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+#----------
+# find the roots
+#----------
+import fnmatch
+
+graph = wsutils.getGraph(workspace)
+topLevelNames = [ graph.names[node] for node in graph.topLevelNodes() ]
+
+roots = []
+rootNames = set()
+
+def addRoot(obj):
+    if not obj.GetName() in rootNames:
+        rootNames.add(obj.GetName())
+        roots.append(obj)
+
+for pattern in ARGV:
+    if pattern in graph.index:
+        addRoot(workspace.obj(pattern))
+        continue
+
+    matchingNames = fnmatch.filter(topLevelNames, pattern)
+    if not matchingNames:
+        print >> sys.stderr,"could not find item %s (nor does it match any top level object as a wildcard) in workspace %s in file %s" % (pattern, workspace.GetName(), inputFname)
+        sys.exit(1)
+
+    for name in matchingNames:
+        addRoot(workspace.obj(name))
+
+modelConfigs = []
+for name in options.modelConfigs:
+    mc = workspace.genobj(name)
+    if mc == None or not isinstance(mc, ROOT.RooStats.ModelConfig):
+        print >> sys.stderr,"could not find ModelConfig %s in workspace %s in file %s" % (name, workspace.GetName(), inputFname)
+        sys.exit(1)
+
+    modelConfigs.append(mc)
+    addRoot(mc.GetPdf())
+
+#----------
+# copy the selected objects
+#----------
+try:
+    ws2 = wsutils.copyToNewWorkspace(workspace, roots,
+                                     dataNames = options.dataNames,
+                                     snapshotNames = options.snapshotNames,
+                                     modelConfigs = modelConfigs)
+except KeyError, ex:
+    print >> sys.stderr,"could not find dataset or snapshot %s in workspace %s in file %s" % (ex.args[0], workspace.GetName(), inputFname)
+    sys.exit(1)
+
+startTime = wsutils.reportTiming(options, "copying objects", startTime)
+
+numBefore = len(wsutils.getAllMembers(workspace))
+numAfter = len(wsutils.getAllMembers(ws2))
+
+print >> sys.stderr,"writing output file",outputFname
+ws2.writeToFile(outputFname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
+#----------
+# report the reduction
+#----------
+inputSize = os.path.getsize(inputFname)
+outputSize = os.path.getsize(outputFname)
+
+outputLoadTime = timeLoading(outputFname, ws2.GetName())
+
+print >> sys.stderr,"members:   %10d -> %10d" % (numBefore, numAfter)
+print >> sys.stderr,"file size: %10d -> %10d bytes (%.1f%%)" % (inputSize, outputSize, 100. * outputSize / inputSize)
+print >> sys.stderr,"load time: %10.2f -> %10.2f s" % (inputLoadTime, outputLoadTime)
@@ -18,34 +18,312 @@
 
 
 import sys, os, wsutils
+import re
+
+#----------------------------------------------------------------------
+
+def computeRenaming(oldNames, renameArgs):
+    """ applies the renaming rules to the given names (only the first
+        matching rule is applied to each name).
+
+        Checks that we do not produce any collisions with the names:
+        no new name must have been an old name and no two new names
+        must be the same.
+
+        @return a dict mapping the names to be changed to their new
+        names and a list of descriptions of the conflicts found
+    """
+
+    oldNameSet = set(oldNames)
+
+    mapping = {}
+
+    # maps from new name to old name
+    newNames = {}
+
+    conflicts = []
+
+    for name in oldNames:
+
+        # only apply the rules until the first
+        # pattern matches
+
+        newName = None
+
+        for src, dest in renameArgs:
+
+            newName, numSubs = re.subn(src, dest, name)
+
+            if numSubs > 0:
+                # the pattern matched, don't continue to apply rules
+                break
+            else:
+                # no match
+                newName = None
+
+        if newName == None:
+            continue
+
+        # we must rename this object
+        # check whether the new name does not appear in the
+        # list of original names
+        if newName in oldNameSet:
+            conflicts.append("%s -> %s where %s exists already in the list of original names" % (
+                name, newName, newName))
+
+        elif newName in newNames:
+            conflicts.append("%s -> %s where %s exists already in the list of new names (from %s)" % (
+                name, newName, newName, newNames[newName]))
+
+        newNames[newName] = name
+        mapping[name] = newName
+
+    return mapping, conflicts
+
+#----------------------------------------------------------------------
+
+def findFormulaChanges(ws, mapping):
+    """ @return a dict mapping from the (old) names of the RooFormulaVars
+        and RooGenericPdfs whose formula expression refers to parameters
+        which are renamed to the new formula expression """
+
+    catalog = wsutils.getFormulaCatalog(ws)
+
+    retval = {}
+
+    for name, (formula, paramNames) in catalog.items():
+        renamed = [ param for param in paramNames if param in mapping ]
+        if not renamed:
+            continue
+
+        # only the parameters can appear in the formula, replace all
+        # of them in one go (longer names first so that prefixes
+        # do not match)
+        renamed.sort(key = len, reverse = True)
+        pattern = re.compile(r'(?<![\w.@])(' + "|".join(re.escape(param) for param in renamed) + r')(?![\w.])')
+
+        newFormula = pattern.sub(lambda mo: mapping[mo.group(1)], formula)
+
+        if newFormula != formula:
+            retval[name] = newFormula
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def renameWorkspace(ws, mapping, formulaChanges):
+    """ applies the renaming to the members of the workspace, the
+        observables of its datasets, its snapshots and the formula
+        expressions referring to renamed members. The workspace
+        is modified in place.
+    """
+    import ROOT
+
+    # note that the graph and the formula catalog
+    # refer to the names before renaming
+    graph = wsutils.getGraph(ws)
+    catalog = wsutils.getFormulaCatalog(ws)
+
+    allMembers = wsutils.getAllMembers(ws)
+
+    # look up by original name, the workspace's
+    # index may not be up to date after renaming
+    members = dict((member.GetName(), member) for member in allMembers)
+
+    for member in allMembers:
+        oldName = member.GetName()
+        newName = mapping.get(oldName)
+        if newName == None:
+            continue
+
+        print >> sys.stderr,"renaming %s -> %s" % (oldName, newName)
+        member.SetName(newName)
+
+    ## datasets observables
+    for data in wsutils.rootListTolist(ws.allData()):
+        for var in wsutils.rooArgSetToList(data.get()):
+            oldName = var.GetName()
+            newName = mapping.get(oldName)
+            if newName != None:
+                print >>sys.stderr,"changing in %s: %s -> %s"%(data.GetName(),oldName,newName)
+                data.changeObservableName(oldName,newName)
+
+    ## snapshots (which contain copies of the parameters)
+    try:
+        snapshotNames = wsutils.getSnapshotNames(ws)
+    except Exception, ex:
+        print >> sys.stderr,"WARNING: snapshots are not renamed:",ex
+        snapshotNames = []
+
+    for snapshotName in snapshotNames:
+        for var in wsutils.rooArgSetToList(ws.getSnapshot(snapshotName)):
+            newName = mapping.get(var.GetName())
+            if newName != None:
+                var.SetName(newName)
+
+    if not formulaChanges:
+        return
+
+    ## formulas: the expressions are parsed when reading the workspace,
+    ## so they must refer to the new names. Formulas using other
+    ## changed formulas must be created after them.
+    changed = [ graph.names[node] for node in graph.topologicalOrder()
+                if graph.names[node] in formulaChanges ]
+
+    newObjs = {}
+
+    for oldName in changed:
+        obj = members[oldName]
+        newFormula = formulaChanges[oldName]
+
+        print >> sys.stderr,"changing formula of %s to %s" % (obj.GetName(), newFormula)
+
+        params = ROOT.RooArgList()
+        for param in catalog[oldName][1]:
+            params.add(newObjs.get(param, members[param]))
+
+        if obj.InheritsFrom("RooAbsPdf"):
+            newObjs[oldName] = ROOT.RooGenericPdf(obj.GetName(), obj.GetTitle(), newFormula, params)
+        else:
+            newObjs[oldName] = ROOT.RooFormulaVar(obj.GetName(), obj.GetTitle(), newFormula, params)
+
+    # the graph with the new names
+    graph = wsutils.getGraph(ws, refresh = True)
+
+    newNames = [ members[oldName].GetName() for oldName in changed ]
+    oldObjs = [ members[oldName] for oldName in changed ]
+
+    # take the old formulas out of the workspace so that the
+    # new ones can be imported under the same names
+    for obj in oldObjs:
+        ws.components().remove(obj, True)
+
+    for oldName in changed:
+        wsutils.importObj(ws, newObjs[oldName])
+
+    # redirect the remaining clients to the imported copies
+    wsutils.replaceNodes(ws, [ ws.obj(name) for name in newNames ], exclude = set(newNames))
+
+    for setName, elementNames in wsutils.getNamedSets(ws).items():
+        if any(name in newNames for name in elementNames):
+            ws.defineSet(setName, ",".join(elementNames))
+
+    # clients before servers
+    wsutils.deleteNodes(ws, oldObjs[::-1])
+    wsutils.getGraph(ws, refresh = True)
 
 #----------------------------------------------------------------------
 
-def findWorkspace(rootFile):
-    """ searches for a toplevel RooWorkspace instance in the given TFile """
 
+def getStructureFingerprint(ws):
+    """ @return a hash of the names and classes of all members of the
+        workspace. Workspaces with the same fingerprint can be renamed
+        with the same plan. """
+    import hashlib
+
+    h = hashlib.sha1()
+    for name, className in sorted((member.GetName(), member.ClassName()) for member in wsutils.getAllMembers(ws)):
+        h.update("%s\0%s\0" % (name, className))
+
+    return h.hexdigest()
+
+#----------------------------------------------------------------------
+
+def readWorkspaces(fname):
+    """ @return all workspaces in the given file (or the one selected
+        with -w). Raises an exception instead of exiting as this is
+        called from worker processes. """
     import ROOT
 
-    retval = None
+    fin = ROOT.TFile.Open(fname)
+    if fin == None or not fin.IsOpen():
+        raise Exception("error opening input file " + fname)
+
+    if options.workspaceName != None and fin.Get(options.workspaceName) == None:
+        raise Exception("no workspace named %s found in file %s" % (options.workspaceName, fname))
+
+    workspaces = wsutils.findWorkspaces(fin, options)
+    if not workspaces:
+        raise Exception("no RooWorkspace found in file " + fname)
+
+    ROOT.gROOT.cd()
+    fin.Close()
+
+    return workspaces
+
+#----------------------------------------------------------------------
+
+def processFile(fnames):
+    """ renames all workspaces in the given input file and writes them
+        to the given output file (unless running with -n or conflicts
+        were found). Run in a worker process.
 
-    for key in rootFile.GetListOfKeys():
-        name = key.GetName()
+        @return a dict with the number of renamed objects and changed
+        formulas, the conflicts and errors found, the plan entries for
+        the workspaces and the processing time
+    """
+    import ROOT, time
 
-        obj = rootFile.Get(name)
+    startTime = time.time()
+
+    inputFname, outputFname = fnames
+
+    result = dict(numRenames = 0, numFormulaChanges = 0, conflicts = [], errors = [], workspaces = {})
+
+    try:
+        workspaces = readWorkspaces(inputFname)
+
+        toRename = []
+
+        for ws in workspaces:
+            fingerprint = getStructureFingerprint(ws)
+
+            if plan != None:
+                entry = plan['workspaces'].get(ws.GetName())
+                if entry == None:
+                    result['conflicts'].append("workspace %s not found in the plan" % ws.GetName())
+                    continue
+
+                if entry['fingerprint'] != fingerprint:
+                    result['conflicts'].append("the structure of workspace %s differs from the one the plan was made for" % ws.GetName())
+                    continue
+
+                mapping, conflicts = entry['mapping'], []
 
-        if isinstance(obj,ROOT.RooWorkspace):
-            if retval == None:
-                retval = obj
             else:
-                print >> sys.stderr,"more than one instance of RooWorkspace found in file",rootFile
-                sys.exit(1)
+                oldNames = [ x.GetName() for x in wsutils.getAllMembers(ws) ]
+                mapping, conflicts = computeRenaming(oldNames, renameArgs)
 
-    if retval == None:
-        print >> sys.stderr,"no RooWorkspace found in file",rootFile
-        sys.exit(1)
+            result['conflicts'].extend("%s: %s" % (ws.GetName(), conflict) for conflict in conflicts)
+
+            formulaChanges = findFormulaChanges(ws, mapping)
 
-    return retval    
+            result['numRenames'] += len(mapping)
+            result['numFormulaChanges'] += len(formulaChanges)
+            result['workspaces'][ws.GetName()] = dict(fingerprint = fingerprint, mapping = mapping)
 
+            toRename.append((ws, mapping, formulaChanges))
+
+        if not options.dryrun and not result['conflicts']:
+            fOut = ROOT.TFile.Open(outputFname, "RECREATE")
+            if fOut == None or not fOut.IsOpen():
+                raise Exception("error opening output file " + outputFname)
+
+            for ws, mapping, formulaChanges in toRename:
+                renameWorkspace(ws, mapping, formulaChanges)
+                fOut.WriteTObject(ws)
+
+            fOut.Close()
+
+    except Exception, ex:
+        result['errors'].append(str(ex))
+
+    # worker processes are reused for several files
+    wsutils.clearGraphCache()
+
+    result['time'] = time.time() - startTime
+
+    return result
 
 #----------------------------------------------------------------------
 # main
@@ -55,17 +333,40 @@ from optparse import OptionParser
 
 parser = OptionParser(   """
    usage: %prog [options] input_workspace.root output_workspace.root old_pattern new_pattern [ old_pattern2 new_pattern2 ...]
+          %prog [options] --rule old_pattern new_pattern [ --rule ... ] input1.root output1.root [ input2.root output2.root ... ]
+          %prog [options] --rule old_pattern new_pattern [ --rule ... ] -o output_dir input1.root [ input2.root ... ]
+          %prog [options] --apply-plan plan.json input1.root output1.root [ input2.root output2.root ... ]
 
    Tool for mass renaming objects in a RooWorkspace.
 
-   WARNING: the program will overwrite the output workspace file without asking for confirmation.
+   All workspaces in each input file are renamed (use -w to select one).
+   Besides the names of the members themselves, the names of the
+   observables of the datasets, the parameters stored in snapshots and
+   references to renamed parameters in the expressions of RooFormulaVars
+   and RooGenericPdfs are changed.
+
+   Several input files can be given together with the renaming rules
+   specified with --rule, either as pairs of input and output files or
+   with an output directory (-o) where the output files get the
+   names of the input files. The files are processed in parallel.
+   Files for which conflicts are found are not written, the conflicts
+   of all files are reported at the end.
+
+   With -n --plan, the mapping from old to new names is written to a
+   json file (together with a fingerprint of the names and classes of
+   the workspace members) instead. With --apply-plan, the renaming
+   rules are not evaluated again but the mapping is taken from the plan.
+   It can be applied to several files with the same structure (e.g. one
+   per channel).
+
+   WARNING: the program will overwrite the output workspace files without asking for confirmation.
 
    example:
 
    %prog --lib $CMSSW_BASE/lib/$SCRAM_ARCH/libHiggsAnalysisCombinedLimit.so input.root output.root \\
       '(.*)_v2$' '\\1'
 
-   will rename e.g. XYZ_v2 to XYZ      
+   will rename e.g. XYZ_v2 to XYZ
 
 """)
 
@@ -80,134 +381,174 @@ parser.add_option("-n",
                   help="do NOT run any renaming but just check if renamings would not cause any conflict",
                   )
 
+parser.add_option("--rule",
+                  dest="renameArgs",
+                  default = [],
+                  nargs = 2,
+                  action="append",
+                  help="renaming rule (regular expression and replacement). Can be specified multiple times, the first matching rule is applied",
+                  metavar="OLD_PATTERN NEW_PATTERN",
+                  )
+
+parser.add_option("-o",
+                  dest="outputDir",
+                  default = None,
+                  help="write the output files with the names of the input files to the given directory",
+                  metavar="DIR",
+                  )
+
+parser.add_option("--plan",
+                  dest="planFname",
+                  default = None,
+                  help="with -n, write the renaming plan to the given file",
+                  metavar="FILE",
+                  )
+
+parser.add_option("--apply-plan",
+                  dest="applyPlanFname",
+                  default = None,
+                  help="rename according to a plan written with -n --plan instead of applying patterns",
+                  metavar="FILE",
+                  )
+
+import multiprocessing
+parser.add_option("-j",
+                  dest="numProcesses",
+                  default = multiprocessing.cpu_count(),
+                  type = int,
+                  help="number of files processed in parallel (default: %default)",
+                  metavar="N",
+                  )
+
 (options, ARGV) = parser.parse_args()
 
 #----------------------------------------
 wsutils.checkCommonOptions(options)
 
 
-if len(ARGV) < 4:
-    print >> sys.stderr,"must specify at least four positional arguments. Run with -h to get more information"
+if options.planFname != None and not options.dryrun:
+    print >> sys.stderr,"--plan requires -n"
     sys.exit(1)
 
-inputFname = ARGV.pop(0)
-outputFname = ARGV.pop(0)
+plan = None
 
-if len(ARGV) % 2 != 0:
-    print >> sys.stderr,"must specify an even number of arguments after the input and output files"
-    sys.exit(1)
+if options.applyPlanFname != None:
+    if options.dryrun:
+        print >> sys.stderr,"-n and --apply-plan can't be specified together"
+        sys.exit(1)
 
-renameArgs = zip(ARGV[::2],ARGV[1::2])
+    if options.renameArgs:
+        print >> sys.stderr,"--rule and --apply-plan can't be specified together"
+        sys.exit(1)
 
+    import json
 
-#----------------------------------------
+    planFile = open(options.applyPlanFname)
+    plan = json.load(planFile)
+    planFile.close()
 
-import ROOT; gcs = []
+renameArgs = options.renameArgs
 
-wsutils.loadLibraries(options)
+if plan == None and not renameArgs:
+    # the renaming rules are given as positional arguments
+    if options.outputDir != None:
+        print >> sys.stderr,"the renaming rules must be specified with --rule when using -o"
+        sys.exit(1)
 
-fin = ROOT.TFile.Open(inputFname)
+    if len(ARGV) < 4:
+        print >> sys.stderr,"must specify at least four positional arguments. Run with -h to get more information"
+        sys.exit(1)
 
-if fin == None or not fin.IsOpen():
-    print >> sys.stderr,"error opening input file " + inputFname
-    sys.exit(1)
+    if len(ARGV) % 2 != 0:
+        print >> sys.stderr,"must specify an even number of arguments after the input and output files"
+        sys.exit(1)
 
+    renameArgs = zip(ARGV[2::2],ARGV[3::2])
+    ARGV = ARGV[:2]
 
-ws = findWorkspace(fin)
-allMembers = wsutils.getAllMembers(ws)
+if options.outputDir != None:
+    if not ARGV:
+        print >> sys.stderr,"must specify at least one input file"
+        sys.exit(1)
 
-#----------
-# check that we do not produce any collisions
-# with the names: no new name must have been
-# an old name and no two new names must
-# be the same
+    fnamePairs = [ (fname, os.path.join(options.outputDir, os.path.basename(fname))) for fname in ARGV ]
 
-import re
+else:
+    if not ARGV or len(ARGV) % 2 != 0:
+        print >> sys.stderr,"must specify pairs of input and output files"
+        sys.exit(1)
 
-oldNames = [ x.GetName() for x in allMembers ]
-newNames = [ ]
+    fnamePairs = zip(ARGV[::2], ARGV[1::2])
 
-numRenames = 0
+for inputFname, outputFname in fnamePairs:
+    if os.path.abspath(inputFname) == os.path.abspath(outputFname):
+        print >> sys.stderr,"output file %s is the same as the input file" % outputFname
+        sys.exit(1)
 
-for name in oldNames:
+if options.planFname != None and len(fnamePairs) != 1:
+    print >> sys.stderr,"--plan requires exactly one input file"
+    sys.exit(1)
 
-    # only apply the rules until the first
-    # pattern matches
+#----------------------------------------
 
-    newName = None
+import ROOT; gcs = []
 
-    for src, dest in renameArgs:
+wsutils.loadLibraries(options)
 
-        newName, numSubs = re.subn(src, dest, name)
+import time
+startTime = time.time()
 
-        if numSubs > 0:
-            # the pattern matched, don't continue to apply rules
-            break
-        else:
-            # no match
-            newName = None
+if options.outputDir != None and not options.dryrun and not os.path.exists(options.outputDir):
+    os.makedirs(options.outputDir)
 
-    if newName != None:
+results = wsutils.parallelMap(processFile, fnamePairs, options.numProcesses)
 
-        numRenames += 1
+#----------
+# summary
+#----------
+allConflicts = []
+allErrors = []
 
-        # we must rename this object
-        # check whether the new name does not appear in the
-        # list of original names
-        if newName in oldNames:
-            print >> sys.stderr,"conflict: %s -> %s where %s exists already in the list of original names" % (
-                name, newName, newName)
-            sys.exit(1)
-
-        if newName in newNames:
-            print >> sys.stderr,"conflict: %s -> %s where %s exists already in the list of new names" % (
-                name, newName, newName)
-            sys.exit(1)
-        
-    newNames.append(newName)
-
-# now we can do the renaming
-assert len(oldNames) == len(newNames)
-assert len(oldNames) == len(allMembers)
-
-for oldName, newName, member in zip(oldNames, newNames, allMembers):
-    if newName == None:
-        continue
-
-    print >> sys.stderr,"renaming %s -> %s" % (oldName, newName)
-    member.SetName(newName)
-
-## datasets observables
-for member in allMembers:
-    if not isinstance(member,ROOT.RooAbsData):continue
-    argset=member.get()
-    #for j in range(0,argset.getSize() ):
-    it = argset.createIterator()
-    x=it.Next()
-    while x:
-        oldName=x.GetName()
-        if oldName in oldNames:
-            pos=oldNames.index(oldName)
-            newName=newNames[pos]
-            if newName != None:
-                print >>sys.stderr,"changing in %s: %s -> %s"%(member.GetName(),oldName,newName)
-                member.changeObservableName(oldName,newName)
-            else:
-                print >>sys.stderr,"WARNING wanted to change in %s: %s -> %s but new name is None"%(member.GetName(),oldName,newName)
-        x=it.Next()
-    
+print >> sys.stderr,"%-50s %8s %8s %8s" % ("file", "renamed", "formulas", "time/s")
+
+for (inputFname, outputFname), result in zip(fnamePairs, results):
+    print >> sys.stderr,"%-50s %8d %8d %8.2f" % (inputFname, result['numRenames'], result['numFormulaChanges'], result['time'])
+
+    allConflicts.extend("%s: %s" % (inputFname, conflict) for conflict in result['conflicts'])
+    allErrors.extend("%s: %s" % (inputFname, error) for error in result['errors'])
+
+numRenames = sum(result['numRenames'] for result in results)
+
+print >> sys.stderr,"total: %d objects in %d files, %.2f s wall time" % (numRenames, len(fnamePairs), time.time() - startTime)
 
 if numRenames == 0:
     if options.dryrun:
         print >> sys.stderr,"WARNING: no object would be renamed"
     else:
         print >> sys.stderr,"WARNING: no object renamed"
-else:
-    if options.dryrun:
-        print >> sys.stderr,"%d objects would be renamed" % numRenames
-    else:
-        print >> sys.stderr,"%d objects renamed" % numRenames
 
-if not options.dryrun:
-    print >> sys.stderr,"writing output file",outputFname
-    ws.writeToFile(outputFname)
+for error in allErrors:
+    print >> sys.stderr,"error:",error
+
+for conflict in allConflicts:
+    print >> sys.stderr,"conflict:",conflict
+
+if allErrors or allConflicts:
+    failed = set(fnamePairs[i][0] for i, result in enumerate(results) if result['errors'] or result['conflicts'])
+    if not options.dryrun:
+        print >> sys.stderr,"%d files were not written because of errors or conflicts" % len(failed)
+    sys.exit(1)
+
+if options.planFname != None:
+    import json
+
+    plan = dict(input = fnamePairs[0][0],
+                rules = renameArgs,
+                workspaces = results[0]['workspaces'],
+                )
+
+    fout = open(options.planFname, "w")
+    json.dump(plan, fout, indent = 1, sort_keys = True)
+    fout.close()
+
+    print >> sys.stderr,"wrote plan to",options.planFname
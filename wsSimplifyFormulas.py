@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+import re, ast
+
+#----------------------------------------------------------------------
+# polynomials are represented as dicts mapping from the sorted tuple
+# of parameter indices of a monomial to its coefficient
+#----------------------------------------------------------------------
+
+def addPolynomials(poly1, poly2, factor = 1.):
+    retval = dict(poly1)
+    for monomial, coef in poly2.items():
+        retval[monomial] = retval.get(monomial, 0.) + factor * coef
+    return retval
+
+def multiplyPolynomials(poly1, poly2):
+    retval = {}
+    for monomial1, coef1 in poly1.items():
+        for monomial2, coef2 in poly2.items():
+            monomial = tuple(sorted(monomial1 + monomial2))
+            retval[monomial] = retval.get(monomial, 0.) + coef1 * coef2
+    return retval
+
+#----------------------------------------------------------------------
+
+def toPolynomial(node):
+    """ @return the polynomial corresponding to the given node of the
+        parsed formula expression. Raises ValueError for anything which
+        is not a polynomial in the parameters.
+    """
+
+    if isinstance(node, ast.Expression):
+        return toPolynomial(node.body)
+
+    if isinstance(node, ast.Num):
+        return { (): float(node.n) }
+
+    if isinstance(node, ast.Name):
+        mo = re.match(r'p_(\d+)$', node.id)
+        if not mo:
+            raise ValueError(node.id)
+        return { (int(mo.group(1)),): 1. }
+
+    if isinstance(node, ast.UnaryOp):
+        operand = toPolynomial(node.operand)
+        if isinstance(node.op, ast.USub):
+            return addPolynomials({}, operand, -1.)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    if isinstance(node, ast.BinOp):
+        left, right = toPolynomial(node.left), toPolynomial(node.right)
+
+        if isinstance(node.op, ast.Add):
+            return addPolynomials(left, right)
+
+        if isinstance(node.op, ast.Sub):
+            return addPolynomials(left, right, -1.)
+
+        if isinstance(node.op, ast.Mult):
+            return multiplyPolynomials(left, right)
+
+        if isinstance(node.op, ast.Div) and right.keys() == [ () ] and right[()] != 0:
+            return addPolynomials({}, left, 1. / right[()])
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'pow' \
+            and len(node.args) == 2 and isinstance(node.args[1], ast.Num):
+        exponent = node.args[1].n
+        if exponent == int(exponent) and 0 <= exponent <= 4:
+            base = toPolynomial(node.args[0])
+            retval = { (): 1. }
+            for i in range(int(exponent)):
+                retval = multiplyPolynomials(retval, base)
+            return retval
+
+    raise ValueError(ast.dump(node))
+
+#----------------------------------------------------------------------
+
+def parseFormula(expression):
+    """ @return the polynomial corresponding to the formula expression
+        (with parameters referred to as @0, @1, ...) or None if it
+        is not a polynomial """
+
+    try:
+        tree = ast.parse(re.sub(r'@(\d+)', r'p_\1', expression).strip(), mode = 'eval')
+        poly = toPolynomial(tree)
+    except (SyntaxError, ValueError):
+        return None
+
+    return dict((monomial, coef) for monomial, coef in poly.items() if coef != 0)
+
+#----------------------------------------------------------------------
+
+def classifyPolynomial(poly, canUseLinearCombination):
+    """ @return a tuple describing the native RooFit node which can
+        evaluate the given polynomial or None:
+
+          ('product', indices)
+          ('sum', indices)
+          ('poly', x index, lowest order, coefficients)
+             where each coefficient is ('const', value) or ('param', index)
+          ('linear', list of (coefficient, index or None for the constant term))
+    """
+
+    monomials = sorted(poly.items())
+
+    if len(monomials) == 1:
+        monomial, coef = monomials[0]
+        if coef == 1 and len(monomial) >= 2 and len(set(monomial)) == len(monomial):
+            return ('product', monomial)
+
+    if len(monomials) >= 2 and all(coef == 1 and len(monomial) == 1 for monomial, coef in monomials):
+        return ('sum', tuple(monomial[0] for monomial, coef in monomials))
+
+    #----------
+    # polynomial in a single parameter whose coefficients
+    # are constants or single parameters
+    #----------
+    for x in sorted(set(index for monomial, coef in monomials for index in monomial)):
+        coefs = {}
+
+        for monomial, coef in monomials:
+            order = monomial.count(x)
+            rest = tuple(index for index in monomial if index != x)
+
+            if order in coefs:
+                break
+
+            if not rest:
+                coefs[order] = ('const', coef)
+            elif len(rest) == 1 and coef == 1:
+                coefs[order] = ('param', rest[0])
+            else:
+                break
+        else:
+            if len(coefs) >= 2 and max(coefs.keys()) >= 1:
+                lowestOrder = min(coefs.keys())
+                return ('poly', x, lowestOrder, [ coefs.get(order, ('const', 0.))
+                                                  for order in range(lowestOrder, max(coefs.keys()) + 1) ])
+
+    #----------
+    # general linear combination
+    #----------
+    if canUseLinearCombination and len(monomials) >= 2 and all(len(monomial) <= 1 for monomial, coef in monomials):
+        return ('linear', [ (coef, monomial[0] if monomial else None) for monomial, coef in monomials ])
+
+    return None
+
+#----------------------------------------------------------------------
+
+def buildNode(formula, params, shape):
+    """ @return the native node replacing the given formula and the list of
+        additional constants it uses """
+    import ROOT
+
+    name, title = formula.GetName(), formula.GetTitle()
+    kind = shape[0]
+
+    if kind in ('product', 'sum'):
+        # RooArgList's constructor takes at most nine arguments
+        # in older ROOT versions
+        terms = ROOT.RooArgList()
+        for i in shape[1]:
+            terms.add(params[i])
+
+        if kind == 'product':
+            return ROOT.RooProduct(name, title, terms), []
+        else:
+            return ROOT.RooAddition(name, title, terms), []
+
+    if kind == 'poly':
+        x, lowestOrder, coefs = shape[1:]
+        constants = []
+        coefList = ROOT.RooArgList()
+
+        for order, (coefKind, value) in enumerate(coefs, lowestOrder):
+            if coefKind == 'const':
+                constant = ROOT.RooConstVar("%s_c%d" % (name, order), "", value)
+                constants.append(constant)
+                coefList.add(constant)
+            else:
+                coefList.add(params[value])
+
+        return ROOT.RooPolyVar(name, title, params[x], coefList, lowestOrder), constants
+
+    if kind == 'linear':
+        constants = []
+        node = ROOT.RooLinearCombination(name)
+        node.SetTitle(title)
+
+        for coef, index in shape[1]:
+            if index == None:
+                constant = ROOT.RooConstVar("%s_one" % name, "", 1.)
+                constants.append(constant)
+                node.add(coef, constant)
+            else:
+                node.add(coef, params[index])
+
+        return node, constants
+
+    raise Exception("unknown shape " + kind)
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_file
+
+  replaces RooFormulaVars with simple expressions by dedicated RooFit
+  classes which avoid the evaluation through TFormula:
+
+    @0*@1*...            RooProduct
+    @0+@1+...            RooAddition
+    1+@0*@1, 2*@0-@0*@0  RooPolyVar (polynomial in one of the parameters
+                         with constant or parameter coefficients)
+    0.5*@0-2*@1+3        RooLinearCombination (if available in the
+                         ROOT version used)
+
+  Formulas involving other functions (e.g. exp(..)) have no dedicated
+  class and are left unchanged (see wsCompileFormulas.py for these).
+
+  The replacements keep the names of the original formulas, so all
+  clients keep working.
+
+  With --cache-formulas, the formula expressions extracted from the
+  input file are stored in a file next to it (with suffix """ + wsutils.sidecarSuffix + """)
+  and taken from there in subsequent runs.
+
+  WARNING: the program will overwrite the output workspace file without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--pattern",
+                  dest="patterns",
+                  default = [],
+                  action="append",
+                  help="only consider the RooFormulaVars whose name matches the given fnmatch pattern. Can be specified multiple times",
+                  metavar="PATTERN",
+                  )
+
+parser.add_option("--benchmark",
+                  dest="numEvaluations",
+                  default = 100,
+                  type = int,
+                  help="number of evaluations of all replaced formulas to time before and after the replacement, 0 to disable (default: %default)",
+                  metavar="N",
+                  )
+
+parser.add_option("--cache-formulas",
+                  dest="cacheFormulas",
+                  default = False,
+                  action="store_true",
+                  help="store the formula expressions of the input file in a file next to it and reuse them in subsequent runs",
+                  )
+
+parser.add_option("-n",
+                  dest="dryrun",
+                  default = False,
+                  action="store_true",
+                  help="only print which formulas would be replaced, do not write the output file",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+inputFname, outputFname = ARGV
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time, fnmatch
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+canUseLinearCombination = hasattr(ROOT, "RooLinearCombination")
+
+#----------
+# find the formulas to replace
+#----------
+graph = wsutils.getGraph(workspace)
+catalog = wsutils.getFormulaCatalog(workspace, inputFname if options.cacheFormulas else None)
+
+# list of (formula, parameters, shape)
+toReplace = []
+
+for name, className in sorted(zip(graph.names, graph.classNames)):
+    if className != "RooFormulaVar":
+        continue
+
+    if options.patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in options.patterns):
+        continue
+
+    expression, paramNames = catalog[name]
+
+    formula = workspace.obj(name)
+    params = [ workspace.obj(paramName) for paramName in paramNames ]
+
+    if not all(param.InheritsFrom("RooAbsReal") for param in params):
+        continue
+
+    expression = wsutils.normalizeFormula(expression, paramNames)
+
+    poly = parseFormula(expression)
+    if poly == None:
+        continue
+
+    shape = classifyPolynomial(poly, canUseLinearCombination)
+    if shape == None:
+        continue
+
+    toReplace.append((formula, params, shape))
+
+    if options.dryrun:
+        print "%s: %s -> %s" % (name, expression, shape[0])
+
+startTime = wsutils.reportTiming(options, "analyzing formulas", startTime)
+
+counts = {}
+for formula, params, shape in toReplace:
+    counts[shape[0]] = counts.get(shape[0], 0) + 1
+
+print >> sys.stderr,"%d formulas to replace: %s" % (len(toReplace),
+    ", ".join("%d %s" % (count, kind) for kind, count in sorted(counts.items())))
+
+if not toReplace or options.dryrun:
+    sys.exit(0)
+
+if options.numEvaluations > 0:
+    timeBefore = wsutils.timeFunctions([ formula for formula, params, shape in toReplace ], options.numEvaluations)
+
+    startTime = wsutils.reportTiming(options, "timing original formulas", startTime)
+
+#----------
+# replace the formulas
+#----------
+replacements = []
+
+# the additional constants must be kept alive until imported
+constants = []
+
+# formulas using other replaced formulas must be built after them
+# so that they use the new nodes
+order = dict((node, i) for i, node in enumerate(graph.topologicalOrder()))
+toReplace.sort(key = lambda item: order[graph.index[item[0].GetName()]])
+
+newNodes = {}
+
+for formula, params, shape in toReplace:
+    params = [ newNodes.get(param.GetName(), param) for param in params ]
+
+    node, nodeConstants = buildNode(formula, params, shape)
+
+    if any(constant.GetName() in graph.index for constant in nodeConstants):
+        print >> sys.stderr,"WARNING: not replacing %s, the name of a constant it needs is already used" % formula.GetName()
+        continue
+
+    newNodes[node.GetName()] = node
+    replacements.append(node)
+    constants.extend(nodeConstants)
+
+topLevelNames = set(graph.names[node] for node in graph.topLevelNodes())
+
+wsutils.replaceNodes(workspace, replacements)
+
+ws2 = wsutils.rebuildWorkspace(workspace,
+                               dropNames = set(node.GetName() for node in replacements),
+                               extraRoots = [ node for node in replacements if node.GetName() in topLevelNames ])
+
+startTime = wsutils.reportTiming(options, "rebuilding workspace", startTime)
+
+print >> sys.stderr,"writing output file",outputFname
+ws2.writeToFile(outputFname)
+
+startTime = wsutils.reportTiming(options, "writing output file", startTime)
+
+print >> sys.stderr,"replaced %d formulas" % len(replacements)
+
+if options.numEvaluations > 0:
+    timeAfter = wsutils.timeFunctions([ ws2.function(node.GetName()) for node in replacements ], options.numEvaluations)
+
+    print >> sys.stderr,"evaluation time of the replaced formulas: %.3g -> %.3g s (speedup %.2f)" % (
+        timeBefore, timeAfter, timeBefore / max(timeAfter, 1e-12))
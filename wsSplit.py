@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+# rfwsutils - utilities for manipulating RooFit workspaces from the command line
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys, os, wsutils
+
+#----------------------------------------------------------------------
+
+# (output file name, workspace) pairs, filled before forking
+# the worker processes
+outputs = []
+
+def writeOutput(index):
+    """ writes the index-th output workspace, run in a worker process """
+    fname, ws = outputs[index]
+    ws.writeToFile(fname)
+    return os.path.getsize(fname)
+
+#----------------------------------------------------------------------
+
+def findSimultaneous(workspace, graph):
+    """ @return the single top level RooSimultaneous in the workspace """
+    import ROOT
+
+    retval = []
+    for node in graph.topLevelNodes():
+        if ROOT.TClass.GetClass(graph.classNames[node]).InheritsFrom("RooSimultaneous"):
+            retval.append(workspace.obj(graph.names[node]))
+
+    if len(retval) != 1:
+        print >> sys.stderr,"found %d top level RooSimultaneous objects, use --sim to select one" % len(retval)
+        sys.exit(1)
+
+    return retval[0]
+
+#----------------------------------------------------------------------
+
+# the containers returned by RooAbsData::split(..), kept so
+# that the slices are not deleted
+splitResults = []
+
+def splitData(data, indexCat):
+    """ splits the dataset by the states of the given category in one pass.
+
+        @return a dict mapping from state label to slice
+    """
+    slices = data.split(indexCat, True)
+    splitResults.append(slices)
+
+    # a TList before ROOT 6.28, a
+    # std::vector<std::unique_ptr<RooAbsData>> afterwards
+    if hasattr(slices, 'MakeIterator'):
+        items = []
+        it = slices.MakeIterator()
+        while True:
+            item = it.Next()
+            if item == None:
+                break
+            items.append(item)
+    else:
+        items = [ item for item in slices ]
+
+    return dict((item.GetName(), item) for item in items if item != None)
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+from optparse import OptionParser
+parser = OptionParser("""
+
+  usage: %prog [options] input_file output_pattern
+
+  splits a combined workspace into one workspace per channel. Each output
+  workspace contains the channel's pdf and all objects it depends on
+  (including the parameters shared with other channels).
+
+  By default, the channels are the states of the index category of the
+  (single) top level RooSimultaneous and the datasets given with --data
+  are split along this category.
+
+  With --pattern, each top level pdf matching one of the given fnmatch
+  patterns becomes a channel and the datasets are copied to each of
+  them (reduced to the variables present in the channel).
+
+  output_pattern must contain the string {channel} which is
+  replaced by the channel name (category label or pdf name).
+
+  The input file is read once and the output files are written by
+  several processes in parallel.
+
+  WARNING: the program will overwrite the output workspace files without asking for confirmation.
+"""
+)
+
+wsutils.addCommonOptions(parser,
+                         addTiming = True,
+                         )
+
+parser.add_option("--sim",
+                  dest="simName",
+                  default = None,
+                  help="name of the RooSimultaneous to split (needed if there is more than one top level RooSimultaneous)",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--pattern",
+                  dest="patterns",
+                  default = [],
+                  action="append",
+                  help="split by top level pdfs matching the given fnmatch pattern instead of by category. Can be specified multiple times",
+                  metavar="PATTERN",
+                  )
+
+parser.add_option("--data",
+                  dest="dataNames",
+                  default = [],
+                  action="append",
+                  help="name of a dataset to split (or copy with --pattern). Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+parser.add_option("--snapshot",
+                  dest="snapshotNames",
+                  default = [],
+                  action="append",
+                  help="name of a snapshot to copy (restricted to the parameters of each channel). Can be specified multiple times",
+                  metavar="NAME",
+                  )
+
+import multiprocessing
+parser.add_option("-j",
+                  dest="numProcesses",
+                  default = multiprocessing.cpu_count(),
+                  type = int,
+                  help="number of processes writing output files in parallel (default: %default)",
+                  metavar="N",
+                  )
+
+(options, ARGV) = parser.parse_args()
+
+#----------------------------------------
+# check the command line options
+#----------------------------------------
+wsutils.checkCommonOptions(options)
+
+if len(ARGV) != 2:
+    print >> sys.stderr,"expected exactly two positional arguments"
+    sys.exit(1)
+
+inputFname, outputPattern = ARGV
+
+if not "{channel}" in outputPattern:
+    print >> sys.stderr,"the output pattern must contain {channel}"
+    sys.exit(1)
+
+if options.simName != None and options.patterns:
+    print >> sys.stderr,"--sim and --pattern can't be specified together"
+    sys.exit(1)
+
+#----------------------------------------
+
+# avoid ROOT trying to use the command line arguments
+sys.argv[1:] = []
+
+import ROOT
+
+# avoid unnecessary X11 connections
+ROOT.gROOT.SetBatch(True)
+
+wsutils.loadLibraries(options)
+
+import time
+startTime = time.time()
+
+fin = ROOT.TFile.Open(inputFname)
+if fin == None or not fin.IsOpen():
+    print >> sys.stderr,"problems opening file " + inputFname
+    sys.exit(1)
+
+# insist that there is a single workspace in this file
+workspace = wsutils.findSingleWorkspace(fin, options)
+
+startTime = wsutils.reportTiming(options, "reading workspace", startTime)
+
+graph = wsutils.getGraph(workspace)
+
+datasets = []
+for name in options.dataNames:
+    data = workspace.data(name)
+    if data == None:
+        print >> sys.stderr,"could not find dataset %s in workspace %s in file %s" % (name, workspace.GetName(), inputFname)
+        sys.exit(1)
+    datasets.append(data)
+
+#----------
+# find the channels: list of (channel name, pdf, datasets)
+#----------
+channels = []
+
+if options.patterns:
+    import fnmatch
+
+    for node in graph.topLevelNodes():
+        name = graph.names[node]
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in options.patterns):
+            continue
+
+        pdf = workspace.obj(name)
+        if not pdf.InheritsFrom("RooAbsPdf"):
+            continue
+
+        channels.append((name, pdf, datasets))
+
+    if not channels:
+        print >> sys.stderr,"no top level pdfs matching %s found" % " ".join(options.patterns)
+        sys.exit(1)
+
+else:
+    if options.simName != None:
+        sim = wsutils.getObj(workspace, options.simName)
+        if not sim.InheritsFrom("RooSimultaneous"):
+            print >> sys.stderr,"%s is not a RooSimultaneous" % options.simName
+            sys.exit(1)
+    else:
+        sim = findSimultaneous(workspace, graph)
+
+    indexCat = sim.indexCat()
+
+    # split each dataset in one pass
+    slicesPerData = [ splitData(data, indexCat) for data in datasets ]
+
+    for label in wsutils.getCategoryLabels(indexCat):
+        pdf = sim.getPdf(label)
+        if pdf == None:
+            # no pdf for this category state
+            continue
+
+        slices = []
+        for data, dataSlices in zip(datasets, slicesPerData):
+            dataSlice = dataSlices.get(label)
+            if dataSlice == None:
+                print >> sys.stderr,"WARNING: no slice of dataset %s for category state %s" % (data.GetName(), label)
+                continue
+
+            dataSlice.SetName(data.GetName())
+            slices.append(dataSlice)
+
+        channels.append((label, pdf, slices))
+
+#----------
+# build the per channel workspaces
+#----------
+for channel, pdf, channelData in channels:
+    try:
+        ws2 = wsutils.copyToNewWorkspace(workspace, [ pdf ],
+                                         snapshotNames = options.snapshotNames,
+                                         datasets = channelData,
+                                         reduceData = True)
+    except KeyError, ex:
+        print >> sys.stderr,"could not find snapshot %s in workspace %s in file %s" % (ex.args[0], workspace.GetName(), inputFname)
+        sys.exit(1)
+
+    outputs.append((outputPattern.replace("{channel}", channel), ws2))
+
+startTime = wsutils.reportTiming(options, "building %d workspaces" % len(outputs), startTime)
+
+#----------
+# write them in parallel
+#----------
+sizes = wsutils.parallelMap(writeOutput, range(len(outputs)), options.numProcesses)
+
+for (fname, ws2), size in zip(outputs, sizes):
+    print >> sys.stderr,"wrote %s (%d bytes)" % (fname, size)
+
+wsutils.reportTiming(options, "writing output files", startTime)
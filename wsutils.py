@@ -97,6 +97,7 @@ rootListTolist.initialized = False
 #----------------------------------------------------------------------
 def addCommonOptions(parser,
                      addSetVars = False,
+                     addTiming = False,
                      ):
     """ adds common options to the command line arguments parser """
 
@@ -142,6 +143,14 @@ def addCommonOptions(parser,
                           metavar = "EXPRS",
                           )
 
+    if addTiming:
+        parser.add_option("--timing",
+                          dest="timing",
+                          default = False,
+                          action="store_true",
+                          help="print the time spent in the different processing steps to stderr",
+                          )
+
 
 #----------------------------------------------------------------------
 
@@ -175,6 +184,23 @@ def checkCommonOptions(options):
 
 #----------------------------------------------------------------------
 
+def reportTiming(options, label, startTime):
+    """ prints the wall time elapsed since startTime (as returned
+        by time.time()) to stderr if timing was requested on the command line
+
+        @return the current time so that calls can be chained
+    """
+    import time
+
+    now = time.time()
+
+    if getattr(options, "timing", False):
+        print >> sys.stderr,"timing: %-30s %8.3f s" % (label, now - startTime)
+
+    return now
+
+#----------------------------------------------------------------------
+
 def findWorkspaces(topdir, options):
     import ROOT
 
@@ -220,6 +246,42 @@ def findSingleWorkspace(topdir, options):
 
     return workspaces[0]
 
+#----------------------------------------------------------------------
+
+def readSingleWorkspace(fname, options, raiseErrors = False):
+    """ opens the given file, finds the single workspace in it (see
+        findSingleWorkspace(..)) and closes the file again.
+
+        @param raiseErrors if True, problems are reported by raising an
+        exception instead of printing a message and exiting (exiting
+        from a worker process would block the pool)
+    """
+    import ROOT
+
+    fin = ROOT.TFile.Open(fname)
+    if fin == None or not fin.IsOpen():
+        if raiseErrors:
+            raise Exception("problems opening file " + fname)
+        print >> sys.stderr,"problems opening file " + fname
+        sys.exit(1)
+
+    if raiseErrors:
+        if options.workspaceName != None and fin.Get(options.workspaceName) == None:
+            raise Exception("no workspace named %s found in file %s" % (options.workspaceName, fname))
+
+        workspaces = findWorkspaces(fin, options)
+        if len(workspaces) != 1:
+            raise Exception("found %d workspaces in file %s, expected exactly one" % (len(workspaces), fname))
+
+        workspace = workspaces[0]
+    else:
+        workspace = findSingleWorkspace(fin, options)
+
+    ROOT.gROOT.cd()
+    fin.Close()
+
+    return workspace
+
 #----------------------------------------------------------------------    
 
 
@@ -331,6 +393,171 @@ def filterAndSortObjects(objs, sortKeyFunc = None, filterFunc = None):
 
 #----------------------------------------------------------------------
 
+# C++ helpers which are compiled on first use, keyed by name
+_declaredHelpers = set()
+
+def declareHelper(name, code):
+    """ declares the given C++ code to the interpreter, unless
+        a helper with the same name was declared before """
+
+    if name in _declaredHelpers:
+        return
+
+    import ROOT
+
+    # workaround for CMSSW
+    if os.environ.has_key("ROOFITSYS"):
+        ROOT.gInterpreter.AddIncludePath(os.path.join(os.environ["ROOFITSYS"], "include"))
+
+    if not ROOT.gInterpreter.Declare(code):
+        raise Exception("failed to compile C++ helper " + name)
+
+    _declaredHelpers.add(name)
+
+#----------------------------------------------------------------------
+
+def stdVectorToArray(vec, dtype):
+    """ copies the contents of a std::vector into a numpy array """
+    import numpy
+
+    size = vec.size()
+    if size == 0:
+        return numpy.zeros(0, dtype = dtype)
+
+    try:
+        # use the buffer interface to avoid a python call per element
+        return numpy.frombuffer(vec.data(), dtype = dtype, count = size).copy()
+    except (TypeError, ValueError, AttributeError):
+        return numpy.array(list(vec), dtype = dtype)
+
+#----------------------------------------------------------------------
+
+_varAttributesCode = """
+#include "RVersion.h"
+#include "RooAbsCollection.h"
+#include "RooAbsArg.h"
+#include "RooAbsReal.h"
+#include "RooAbsRealLValue.h"
+#include "RooRealVar.h"
+#include "RooAbsCategory.h"
+#include "TIterator.h"
+
+#include <vector>
+#include <string>
+#include <limits>
+
+namespace rfwsutils {
+
+  struct VarAttributes {
+    // names and class names are newline separated
+    // to transfer them in one go
+    std::string names;
+    std::string classNames;
+    std::vector<double> values;
+    std::vector<double> errors;
+    std::vector<double> mins;
+    std::vector<double> maxs;
+    std::vector<int> constant;
+  };
+
+  void fillVarAttributes(VarAttributes &attrs, const RooAbsArg *arg) {
+    const double nan = std::numeric_limits<double>::quiet_NaN();
+
+    attrs.names += arg->GetName();
+    attrs.names += '\\n';
+    attrs.classNames += arg->ClassName();
+    attrs.classNames += '\\n';
+
+    double value = nan, error = nan, vmin = nan, vmax = nan;
+
+    if (const RooAbsReal *real = dynamic_cast<const RooAbsReal *>(arg))
+      value = real->getVal();
+    else if (const RooAbsCategory *cat = dynamic_cast<const RooAbsCategory *>(arg))
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,22,0)
+      value = cat->getCurrentIndex();
+#else
+      value = cat->getIndex();
+#endif
+
+    if (const RooRealVar *var = dynamic_cast<const RooRealVar *>(arg))
+      error = var->getError();
+
+    if (const RooAbsRealLValue *lvalue = dynamic_cast<const RooAbsRealLValue *>(arg)) {
+      vmin = lvalue->getMin();
+      vmax = lvalue->getMax();
+    }
+
+    attrs.values.push_back(value);
+    attrs.errors.push_back(error);
+    attrs.mins.push_back(vmin);
+    attrs.maxs.push_back(vmax);
+    attrs.constant.push_back(arg->isConstant());
+  }
+
+  VarAttributes getVarAttributes(const RooAbsCollection &coll) {
+    VarAttributes attrs;
+
+    attrs.values.reserve(coll.getSize());
+    attrs.errors.reserve(coll.getSize());
+    attrs.mins.reserve(coll.getSize());
+    attrs.maxs.reserve(coll.getSize());
+    attrs.constant.reserve(coll.getSize());
+
+    TIterator *it = coll.createIterator();
+    while (RooAbsArg *arg = (RooAbsArg *) it->Next())
+      fillVarAttributes(attrs, arg);
+    delete it;
+
+    return attrs;
+  }
+
+} // namespace rfwsutils
+"""
+
+def getVarAttributes(vars):
+    """ extracts names, class names, values, errors, ranges and constness
+        of all elements of the given RooArgSet/RooArgList in one call to
+        a compiled helper.
+
+        @return a dict with lists 'name' and 'className', float numpy arrays
+        'value', 'error', 'min', 'max' (NaN where not applicable) and
+        a boolean numpy array 'constant'
+    """
+    import ROOT, numpy
+
+    declareHelper("varAttributes", _varAttributesCode)
+
+    attrs = ROOT.rfwsutils.getVarAttributes(vars)
+
+    return dict(
+        name = str(attrs.names).split("\n")[:-1],
+        className = str(attrs.classNames).split("\n")[:-1],
+        value = stdVectorToArray(attrs.values, numpy.float64),
+        error = stdVectorToArray(attrs.errors, numpy.float64),
+        min = stdVectorToArray(attrs.mins, numpy.float64),
+        max = stdVectorToArray(attrs.maxs, numpy.float64),
+        constant = stdVectorToArray(attrs.constant, numpy.int32).astype(bool),
+        )
+
+#----------------------------------------------------------------------
+
+def _selectVars(vars, sortKeyFunc, filterFunc):
+    """ @return vars if no sorting or filtering is requested, otherwise
+        a RooArgList with the selected elements in the requested order """
+
+    if sortKeyFunc == None and filterFunc == None:
+        return vars
+
+    import ROOT
+
+    retval = ROOT.RooArgList()
+    for var in filterAndSortObjects(rooArgSetToList(vars), sortKeyFunc, filterFunc):
+        retval.add(var)
+
+    return retval
+
+#----------------------------------------------------------------------
+
 def printVars(vars, sortKeyFunc = None, filterFunc = None):
     # vars is a RooArgSet
     # convert this to a python list
@@ -344,31 +571,76 @@ def printVars(vars, sortKeyFunc = None, filterFunc = None):
 
 #----------------------------------------------------------------------
 
-def printVarsCSV(vars, sortKeyFunc = None, filterFunc = None):
-    # vars is a RooArgSet
-    # convert this to a python list
-    vars = rooArgSetToList(vars)
+def printVarsTable(vars, sortKeyFunc = None, filterFunc = None):
+    """ like printVars(..) but prints one line per variable
+        (name, value, error, range and constness) from the
+        attributes extracted with getVarAttributes(..) """
 
-    vars = filterAndSortObjects(vars, sortKeyFunc, filterFunc)
+    attrs = getVarAttributes(_selectVars(vars, sortKeyFunc, filterFunc))
+
+    names = attrs['name']
+    nameWidth = max([ len(name) for name in names ] + [ 4 ])
+
+    lines = [ "%-*s %14s %14s %14s %14s %s" % (nameWidth, "name", "value", "error", "min", "max", "constant") ]
+
+    for name, value, error, vmin, vmax, constant in zip(names, attrs['value'], attrs['error'],
+                                                          attrs['min'], attrs['max'], attrs['constant']):
+        lines.append("%-*s %14g %14g %14g %14g %s" % (nameWidth, name, value, error, vmin, vmax,
+                                                      "C" if constant else ""))
+
+    print "\n".join(lines)
+
+#----------------------------------------------------------------------
 
-    print ",".join([
+def printVarsCSV(vars, sortKeyFunc = None, filterFunc = None):
+    attrs = getVarAttributes(_selectVars(vars, sortKeyFunc, filterFunc))
+
+    lines = [ ",".join([
         "name",
         "value",
         "min",
         "max",
-        "constant"])
+        "constant"]) ]
 
-    for var in vars:
+    for parts in zip(attrs['name'],
+                     attrs['value'].tolist(),
+                     attrs['min'].tolist(),
+                     attrs['max'].tolist(),
+                     attrs['constant'].tolist()):
 
-        parts = [
-            var.GetName(),
-            var.getVal(),
-            var.getMin(),
-            var.getMax(),
-            var.isConstant(),
-            ]
-        
-        print ",".join([ str(p) for p in parts ])
+        lines.append(",".join([ str(p) for p in parts ]))
+
+    print "\n".join(lines)
+
+#----------------------------------------------------------------------
+
+def printVarsJSON(vars, sortKeyFunc = None, filterFunc = None):
+    """ prints name, class, value, error, range and constness of the
+        given variables as a json list. Values which do not apply to
+        a variable are written as null. """
+    import json, math
+
+    attrs = getVarAttributes(_selectVars(vars, sortKeyFunc, filterFunc))
+
+    def toJSON(value):
+        if math.isnan(value):
+            return None
+        return value
+
+    rows = []
+    for name, className, value, error, vmin, vmax, constant in zip(
+        attrs['name'], attrs['className'], attrs['value'].tolist(), attrs['error'].tolist(),
+        attrs['min'].tolist(), attrs['max'].tolist(), attrs['constant'].tolist()):
+
+        rows.append(dict(name = name,
+                         className = className,
+                         value = toJSON(value),
+                         error = toJSON(error),
+                         min = toJSON(vmin),
+                         max = toJSON(vmax),
+                         constant = constant))
+
+    print json.dumps(rows, indent = 1, sort_keys = True)
 
 #----------------------------------------------------------------------
 
@@ -384,3 +656,1523 @@ def getClients(node):
     return clients
 
 #----------------------------------------------------------------------
+
+# characters which have a special meaning in fnmatch patterns
+_globSpecialChars = re.compile(r'[*?\[]')
+
+def isGlobPattern(name):
+    """ @return True if the given name contains characters with a
+        special meaning in fnmatch patterns """
+    return _globSpecialChars.search(name) != None
+
+# characters which have a special meaning in regular expressions
+_regexSpecialChars = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+class MemberQuery:
+    """ answers name queries (exact names, fnmatch patterns and regular
+        expressions) on the members of a workspace.
+
+        The member list is read only once. Patterns are compiled once
+        and glob patterns starting with a literal prefix only look at the
+        names sharing this prefix (found by bisection on the sorted list
+        of names). Names matching a pattern are returned in the order
+        of the members in the workspace.
+    """
+
+    def __init__(self, ws):
+        allMembers = getAllMembers(ws)
+
+        self.members = dict((obj.GetName(), obj) for obj in allMembers)
+        self.positions = dict((obj.GetName(), i) for i, obj in enumerate(allMembers))
+        self.sortedNames = sorted(self.members.keys())
+
+    #----------------------------------------
+
+    def _namesWithPrefix(self, prefix):
+        import bisect
+
+        if prefix == "":
+            return self.sortedNames
+
+        start = bisect.bisect_left(self.sortedNames, prefix)
+
+        # all names starting with prefix sort before prefix + the
+        # highest possible byte
+        end = bisect.bisect_left(self.sortedNames, prefix + chr(255), lo = start)
+
+        return self.sortedNames[start:end]
+
+    #----------------------------------------
+
+    def matchGlob(self, pattern):
+        """ @return the list of member names matching the given fnmatch
+            pattern, in workspace order """
+        import fnmatch
+
+        if pattern in self.members:
+            return [ pattern ]
+
+        mo = _globSpecialChars.search(pattern)
+        if mo:
+            prefix = pattern[:mo.start()]
+        else:
+            prefix = pattern
+
+        matcher = re.compile(fnmatch.translate(pattern)).match
+
+        return sorted((name for name in self._namesWithPrefix(prefix) if matcher(name)),
+                      key = self.positions.get)
+
+    #----------------------------------------
+
+    def matchRegex(self, pattern):
+        """ @return the list of member names in which the given regular
+            expression matches somewhere (i.e. using re.search), in
+            workspace order """
+
+        # anchored patterns with a literal prefix can use the prefix index
+        prefix = ""
+        if pattern.startswith('^') and not '|' in pattern:
+            mo = _regexSpecialChars.search(pattern, 1)
+            if mo:
+                prefix = pattern[1:mo.start()]
+
+                # a quantifier applies to the preceding character
+                if pattern[mo.start()] in '*?{':
+                    prefix = prefix[:-1]
+            else:
+                prefix = pattern[1:]
+
+        searcher = re.compile(pattern).search
+
+        return sorted((name for name in self._namesWithPrefix(prefix) if searcher(name)),
+                      key = self.positions.get)
+
+    #----------------------------------------
+
+    def select(self, patterns, regex = False, filterFunc = None):
+        """ @return the list of members matching any of the given patterns,
+            without duplicates and in the order of the patterns
+
+            @param filterFunc if not None, only objects for which this
+            function returns True are kept
+
+            Raises a KeyError with the offending name if an exact name
+            (i.e. not a regular expression and without wildcards) is
+            not a member. Patterns matching no member are ignored.
+        """
+
+        seen = set()
+        retval = []
+
+        for pattern in patterns:
+            if regex:
+                names = self.matchRegex(pattern)
+            else:
+                names = self.matchGlob(pattern)
+
+            if not names and not regex and not isGlobPattern(pattern):
+                raise KeyError(pattern)
+
+            for name in names:
+                if name in seen:
+                    continue
+                seen.add(name)
+
+                obj = self.members[name]
+
+                if filterFunc != None and not filterFunc(obj):
+                    continue
+
+                retval.append(obj)
+
+        return retval
+
+#----------------------------------------------------------------------
+
+def getMemberAttributes(obj):
+    """ @return a dict with the name, class name and (where applicable)
+        value, range and constness of the given workspace member.
+        Attributes which do not apply to the object are set to None.
+    """
+
+    retval = dict(name = obj.GetName(),
+                  className = obj.ClassName(),
+                  value = None,
+                  min = None,
+                  max = None,
+                  constant = None)
+
+    if hasattr(obj, 'getVal'):
+        retval['value'] = obj.getVal()
+
+    if hasattr(obj, 'getMin') and hasattr(obj, 'getMax'):
+        retval['min'] = obj.getMin()
+        retval['max'] = obj.getMax()
+
+    if hasattr(obj, 'isConstant'):
+        retval['constant'] = bool(obj.isConstant())
+
+    return retval
+
+#----------------------------------------------------------------------
+
+_workspaceGraphCode = """
+#include "RVersion.h"
+#include "RooWorkspace.h"
+#include "RooAbsArg.h"
+#include "RooArgSet.h"
+#include "TIterator.h"
+
+#include <vector>
+#include <string>
+#include <unordered_map>
+
+namespace rfwsutils {
+
+  struct WorkspaceGraph {
+    // names and class names are newline separated
+    // to transfer them in one go
+    std::string names;
+    std::string classNames;
+
+    // edge i goes from node edgeServers[i] to its
+    // client edgeClients[i] (indices into the list of nodes)
+    std::vector<int> edgeServers;
+    std::vector<int> edgeClients;
+  };
+
+  WorkspaceGraph getWorkspaceGraph(RooWorkspace &ws) {
+    WorkspaceGraph graph;
+
+    const RooArgSet &components = ws.components();
+
+    std::vector<RooAbsArg *> nodes;
+    nodes.reserve(components.getSize());
+    std::unordered_map<const RooAbsArg *, int> indices;
+
+    TIterator *it = components.createIterator();
+    while (RooAbsArg *arg = (RooAbsArg *) it->Next()) {
+      indices[arg] = nodes.size();
+      nodes.push_back(arg);
+      graph.names += arg->GetName();
+      graph.names += '\\n';
+      graph.classNames += arg->ClassName();
+      graph.classNames += '\\n';
+    }
+    delete it;
+
+    for (size_t client = 0; client < nodes.size(); ++client) {
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,18,0)
+      for (const RooAbsArg *server : nodes[client]->servers()) {
+#else
+      TIterator *sit = nodes[client]->serverIterator();
+      while (const RooAbsArg *server = (const RooAbsArg *) sit->Next()) {
+#endif
+        std::unordered_map<const RooAbsArg *, int>::const_iterator found = indices.find(server);
+        if (found == indices.end())
+          // server not owned by the workspace
+          continue;
+
+        graph.edgeServers.push_back(found->second);
+        graph.edgeClients.push_back(client);
+      }
+#if ROOT_VERSION_CODE < ROOT_VERSION(6,18,0)
+      delete sit;
+#endif
+    }
+
+    return graph;
+  }
+
+} // namespace rfwsutils
+"""
+
+class WorkspaceGraph:
+    """ client/server graph of the components of a workspace.
+
+        Nodes are identified by their index into the list 'names',
+        'clients[i]' and 'servers[i]' are the lists of indices of the
+        direct clients and servers of node i. Datasets are not part
+        of the graph.
+    """
+
+    def __init__(self, ws):
+        import ROOT, numpy
+
+        declareHelper("workspaceGraph", _workspaceGraphCode)
+
+        graph = ROOT.rfwsutils.getWorkspaceGraph(ws)
+
+        self.names = str(graph.names).split("\n")[:-1]
+        self.classNames = str(graph.classNames).split("\n")[:-1]
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+
+        self.edgeServers = stdVectorToArray(graph.edgeServers, numpy.int32)
+        self.edgeClients = stdVectorToArray(graph.edgeClients, numpy.int32)
+
+        self.clients = [ [] for name in self.names ]
+        self.servers = [ [] for name in self.names ]
+
+        for server, client in zip(self.edgeServers.tolist(), self.edgeClients.tolist()):
+            self.clients[server].append(client)
+            self.servers[client].append(server)
+
+    #----------------------------------------
+
+    def __len__(self):
+        return len(self.names)
+
+    #----------------------------------------
+
+    def topLevelNodes(self):
+        """ @return the indices of the nodes which have no clients """
+        return [ i for i, clients in enumerate(self.clients) if not clients ]
+
+    #----------------------------------------
+
+    def topologicalOrder(self):
+        """ @return the list of all node indices ordered such that
+            every node comes after all of its servers """
+
+        numServers = [ len(servers) for servers in self.servers ]
+
+        retval = [ i for i, num in enumerate(numServers) if num == 0 ]
+
+        # retval doubles as the queue of nodes whose servers
+        # have all been visited
+        pos = 0
+        while pos < len(retval):
+            node = retval[pos]
+            pos += 1
+
+            for client in self.clients[node]:
+                numServers[client] -= 1
+                if numServers[client] == 0:
+                    retval.append(client)
+
+        if len(retval) != len(self.names):
+            raise Exception("the graph of workspace members contains cycles")
+
+        return retval
+
+    #----------------------------------------
+
+    def reachable(self, startNodes, servers = False, maxDepth = None):
+        """ breadth first search from all given nodes at once, following
+            client edges (or server edges if servers is True).
+
+            @param maxDepth if not None, nodes further away than this
+            number of edges from all start nodes are not visited
+
+            @return a list of (node index, depth) pairs in the order of
+            visiting, each node appearing once with the smallest
+            distance to any of the start nodes (the start nodes
+            themselves have depth zero)
+        """
+
+        if servers:
+            neighbours = self.servers
+        else:
+            neighbours = self.clients
+
+        depths = {}
+        retval = []
+
+        for node in startNodes:
+            if not node in depths:
+                depths[node] = 0
+                retval.append((node, 0))
+
+        # retval doubles as the BFS queue
+        pos = 0
+        while pos < len(retval):
+            node, depth = retval[pos]
+            pos += 1
+
+            if maxDepth != None and depth >= maxDepth:
+                continue
+
+            for other in neighbours[node]:
+                if not other in depths:
+                    depths[other] = depth + 1
+                    retval.append((other, depth + 1))
+
+        return retval
+
+#----------------------------------------------------------------------
+
+# graphs already extracted, keyed by the address of the workspace.
+# The values are (workspace, graph) pairs: keeping a reference to the
+# workspace makes sure its address is not reused by another one.
+_workspaceGraphs = {}
+
+def _workspaceKey(ws):
+    """ @return the address of the given workspace """
+    import ROOT
+
+    if hasattr(ROOT, 'addressof'):
+        return ROOT.addressof(ws)
+    else:
+        return ROOT.AddressOf(ws)[0]
+
+def getGraph(ws, refresh = False):
+    """ @return the WorkspaceGraph of the given workspace. The graph is
+        extracted only once per workspace unless refresh is True
+        (which must be used after the workspace was modified) """
+
+    key = _workspaceKey(ws)
+
+    if refresh or not key in _workspaceGraphs:
+        _workspaceGraphs[key] = (ws, WorkspaceGraph(ws))
+
+    return _workspaceGraphs[key][1]
+
+#----------------------------------------------------------------------
+
+def clearGraphCache():
+    """ forgets all graphs and formula catalogs extracted so far (and
+        releases the references to the corresponding workspaces) """
+    _workspaceGraphs.clear()
+    _formulaCatalogs.clear()
+
+#----------------------------------------------------------------------
+
+# results derived from a ROOT file can be stored in a 'sidecar'
+# json file next to it (see loadSidecar(..) and saveSidecar(..))
+sidecarSuffix = ".rfwsidx"
+
+def getFileFingerprint(fname):
+    """ @return a dict with the size and modification time of the given
+        file or None if it is not a local file (e.g. a root:// url)
+        or can not be accessed """
+
+    if "://" in fname:
+        return None
+
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+
+    return dict(size = stat.st_size, mtime = stat.st_mtime)
+
+#----------------------------------------------------------------------
+
+def _readSidecar(fname):
+    """ @return the contents of the sidecar file of the given ROOT file
+        or an empty index if it does not exist or refers to a different
+        version of the ROOT file. Sidecar files are only used for
+        local ROOT files, for other files the fingerprint
+        of the returned index is None. """
+    import json
+
+    fingerprint = getFileFingerprint(fname)
+    if fingerprint == None:
+        return dict(fingerprint = None, entries = {})
+
+    try:
+        with open(fname + sidecarSuffix) as fin:
+            contents = json.load(fin)
+    except (IOError, ValueError):
+        contents = None
+
+    if contents == None or contents.get('fingerprint') != fingerprint:
+        contents = dict(fingerprint = fingerprint, entries = {})
+
+    return contents
+
+#----------------------------------------------------------------------
+
+def loadSidecar(fname, key):
+    """ @return the data stored under the given key in the sidecar file
+        of the given ROOT file or None if there is no such data or the
+        ROOT file was modified after the data was stored """
+
+    return _readSidecar(fname)['entries'].get(key)
+
+#----------------------------------------------------------------------
+
+def saveSidecar(fname, key, data):
+    """ stores the given (json serializable) data under the given key in
+        the sidecar file of the given ROOT file (unless it is not a local
+        file). Prints a warning if the sidecar file can not be written. """
+    import json
+
+    contents = _readSidecar(fname)
+    if contents['fingerprint'] == None:
+        return
+
+    contents['entries'][key] = data
+
+    try:
+        with open(fname + sidecarSuffix, "w") as fout:
+            json.dump(contents, fout)
+    except (IOError, OSError), ex:
+        print >> sys.stderr,"WARNING: could not write index file %s: %s" % (fname + sidecarSuffix, ex)
+
+#----------------------------------------------------------------------
+
+def importObj(ws, obj, *args):
+    """ imports obj into the workspace, recycling nodes with the same
+        name already in the workspace and suppressing messages.
+        Further RooCmdArgs can be given as additional arguments. """
+    import ROOT
+
+    getattr(ws,'import')(obj, ROOT.RooFit.RecycleConflictNodes(), ROOT.RooFit.Silence(), *args)
+
+#----------------------------------------------------------------------
+
+def getSnapshotNames(ws):
+    """ @return the names of all snapshots stored in the workspace """
+
+    if not hasattr(ws, 'getSnapshots'):
+        raise Exception("this version of ROOT does not allow to list the snapshots of a workspace")
+
+    retval = []
+
+    it = ws.getSnapshots().MakeIterator()
+    while True:
+        snapshot = it.Next()
+        if snapshot == None:
+            break
+        retval.append(snapshot.GetName())
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def getNamedSets(ws):
+    """ @return a dict of the names of the named sets of the workspace to
+        the lists of the names of their elements. Returns an empty
+        dict if the named sets can't be accessed with this version of ROOT """
+
+    if not hasattr(ws, 'sets'):
+        return {}
+
+    retval = {}
+    for item in ws.sets():
+        name = str(item.first)
+        retval[name] = [ arg.GetName() for arg in rooArgSetToList(item.second) ]
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def copyModelConfig(mc, ws):
+    """ imports a copy of the given RooStats::ModelConfig into ws
+        (which must already contain the model's pdf and parameters)
+        pointing to the corresponding objects in ws """
+    import ROOT
+
+    mc2 = ROOT.RooStats.ModelConfig(mc.GetName(), mc.GetTitle(), ws)
+
+    if mc.GetPdf():
+        mc2.SetPdf(mc.GetPdf().GetName())
+
+    if mc.GetPriorPdf():
+        mc2.SetPriorPdf(mc.GetPriorPdf().GetName())
+
+    for what in ("ParametersOfInterest", "NuisanceParameters", "Observables",
+                 "GlobalObservables", "ConditionalObservables", "ConstraintParameters"):
+
+        argset = getattr(mc, "Get" + what)()
+        if argset:
+            getattr(mc2, "Set" + what)(argset)
+
+    snapshot = mc.GetSnapshot()
+    if snapshot:
+        mc2.SetSnapshot(snapshot)
+
+    getattr(ws,'import')(mc2)
+
+#----------------------------------------------------------------------
+
+def copyToNewWorkspace(ws, roots, dataNames = [], snapshotNames = [],
+                       modelConfigs = [], reduceData = False, datasets = []):
+    """ creates a new workspace (with the same name and title as ws) which
+        contains only the given root objects and the objects they
+        depend on (directly or indirectly), i.e. nothing else is imported.
+
+        @param dataNames names of datasets to be copied as well
+        @param snapshotNames names of snapshots to be copied. Only the
+          values of variables present in the new workspace are kept.
+        @param modelConfigs RooStats::ModelConfig objects to be copied
+          (their pdfs should be among the roots)
+        @param reduceData if True, the datasets are reduced to the
+          variables present in the new workspace
+        @param datasets further datasets (objects rather than names,
+          e.g. not stored in ws) to be copied
+
+        Named sets whose elements all exist in the new workspace are
+        copied as well. Raises a KeyError if a dataset or snapshot
+        does not exist.
+    """
+    import ROOT
+
+    ws2 = ROOT.RooWorkspace(ws.GetName(), ws.GetTitle())
+
+    for root in roots:
+        importObj(ws2, root)
+
+    allData = []
+    for name in dataNames:
+        data = ws.data(name)
+        if data == None:
+            raise KeyError(name)
+        allData.append(data)
+
+    for data in allData + list(datasets):
+
+        if reduceData:
+            keep = ROOT.RooArgSet()
+            for var in rooArgSetToList(data.get()):
+                if ws2.obj(var.GetName()) != None:
+                    keep.add(var)
+
+            reduced = data.reduce(ROOT.RooFit.SelectVars(keep))
+            reduced.SetName(data.GetName())
+            importObj(ws2, reduced)
+        else:
+            importObj(ws2, data)
+
+    for name in snapshotNames:
+        snapshot = ws.getSnapshot(name)
+        if snapshot == None:
+            raise KeyError(name)
+
+        # only the variables existing in ws2 are taken
+        # into the new snapshot
+        ws2.saveSnapshot(name, snapshot, True)
+
+    for name, elementNames in getNamedSets(ws).items():
+        if elementNames and all(ws2.obj(elementName) != None for elementName in elementNames):
+            ws2.defineSet(name, ",".join(elementNames))
+
+    for mc in modelConfigs:
+        copyModelConfig(mc, ws2)
+
+    return ws2
+
+#----------------------------------------------------------------------
+
+def parallelMap(func, items, numProcesses):
+    """ applies func to all items, using a pool of numProcesses worker
+        processes if numProcesses > 1. The workers are forked from the
+        current process, so they see all objects created before
+        calling this function, but func and the results must be
+        picklable (i.e. func must be defined at module level).
+
+        @return the list of results in the order of items
+    """
+
+    items = list(items)
+
+    if numProcesses <= 1 or len(items) <= 1:
+        return [ func(item) for item in items ]
+
+    import multiprocessing
+
+    pool = multiprocessing.Pool(min(numProcesses, len(items)))
+    try:
+        return pool.map(func, items, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+
+#----------------------------------------------------------------------
+
+def getCategoryLabels(cat):
+    """ @return the list of labels of the states of the given
+        category, ordered by their index """
+
+    if hasattr(cat, 'states'):
+        # ROOT 6.22 and later
+        states = [ (item.second, str(item.first)) for item in cat.states() ]
+        return [ label for index, label in sorted(states) ]
+
+    retval = []
+    it = cat.typeIterator()
+    while True:
+        state = it.Next()
+        if state == None:
+            break
+        retval.append(state.GetName())
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def getFormulaString(obj):
+    """ @return the formula expression of a RooFormulaVar or RooGenericPdf """
+    import ROOT
+
+    s = ROOT.std.stringstream()
+    obj.printMetaArgs(s)
+    return re.sub('"\ +$','',re.sub('formula="','',s.str()))
+
+#----------------------------------------------------------------------
+
+def getFormulaParameters(obj):
+    """ @return the list of parameters of a RooFormulaVar, in the
+        order in which they are referred to as @0, @1, ... """
+
+    retval = []
+    idx = 0
+    while True:
+        param = obj.getParameter(idx)
+        if param == None:
+            break
+        retval.append(param)
+        idx += 1
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def normalizeFormula(formula, paramNames):
+    """ rewrites the references to parameters by name or as x[i]
+        in the given formula expression to the form @i """
+
+    formula = re.sub(r'(?<![\w.])x\[(\d+)\]', r'@\1', formula)
+
+    if paramNames:
+        indices = dict((name, i) for i, name in enumerate(paramNames))
+
+        # longer names first so that prefixes do not match
+        names = sorted(paramNames, key = len, reverse = True)
+        pattern = re.compile(r'(?<![\w.@])(' + "|".join(re.escape(name) for name in names) + r')(?![\w.])')
+
+        formula = pattern.sub(lambda mo: "@%d" % indices[mo.group(1)], formula)
+
+    return formula
+
+#----------------------------------------------------------------------
+
+_formulaCatalogCode = """
+#include "RVersion.h"
+#include "RooWorkspace.h"
+#include "RooAbsArg.h"
+#include "RooArgSet.h"
+#include "RooFormulaVar.h"
+#include "RooGenericPdf.h"
+#include "TIterator.h"
+
+#include <vector>
+#include <string>
+#include <sstream>
+
+namespace rfwsutils {
+
+  struct FormulaCatalog {
+    // names, formulas and parameter names are newline separated
+    // to transfer them in one go. The parameters of formula i are
+    // the next numParams[i] entries of paramNames.
+    std::string names;
+    std::string formulas;
+    std::string paramNames;
+    std::vector<int> numParams;
+  };
+
+  FormulaCatalog getFormulaCatalog(RooWorkspace &ws) {
+    FormulaCatalog catalog;
+
+    TIterator *it = ws.components().createIterator();
+    while (RooAbsArg *arg = (RooAbsArg *) it->Next()) {
+
+      RooFormulaVar *formulaVar = dynamic_cast<RooFormulaVar *>(arg);
+      if (formulaVar == NULL && dynamic_cast<RooGenericPdf *>(arg) == NULL)
+        continue;
+
+      // same as getFormulaString(..)
+      std::ostringstream os;
+      arg->printMetaArgs(os);
+      std::string formula = os.str();
+
+      const std::string prefix = "formula=\\"";
+      size_t pos = formula.find(prefix);
+      if (pos != std::string::npos)
+        formula.erase(pos, prefix.size());
+
+      size_t end = formula.find_last_not_of(' ');
+      if (end != std::string::npos && formula[end] == '"')
+        formula.erase(end);
+
+      catalog.names += arg->GetName();
+      catalog.names += '\\n';
+      catalog.formulas += formula;
+      catalog.formulas += '\\n';
+
+      int numParams = 0;
+
+      if (formulaVar != NULL) {
+        while (RooAbsArg *param = formulaVar->getParameter(numParams)) {
+          catalog.paramNames += param->GetName();
+          catalog.paramNames += '\\n';
+          ++numParams;
+        }
+      } else {
+        // RooGenericPdf has no accessor for its parameters,
+        // they are its servers in the same order
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,18,0)
+        for (const RooAbsArg *param : arg->servers()) {
+#else
+        TIterator *sit = arg->serverIterator();
+        while (const RooAbsArg *param = (const RooAbsArg *) sit->Next()) {
+#endif
+          catalog.paramNames += param->GetName();
+          catalog.paramNames += '\\n';
+          ++numParams;
+        }
+#if ROOT_VERSION_CODE < ROOT_VERSION(6,18,0)
+        delete sit;
+#endif
+      }
+
+      catalog.numParams.push_back(numParams);
+    }
+    delete it;
+
+    return catalog;
+  }
+
+} // namespace rfwsutils
+"""
+
+# catalogs already extracted, keyed like _workspaceGraphs
+_formulaCatalogs = {}
+
+def getFormulaCatalog(ws, fname = None, refresh = False):
+    """ @return a dict mapping from the names of the RooFormulaVars and
+        RooGenericPdfs of the workspace to (formula expression, tuple of
+        parameter names), the parameters being in the order in which
+        they are referred to as @0, @1, ...
+
+        The catalog is extracted in one pass by a compiled helper and
+        only once per workspace unless refresh is True.
+
+        @param fname if given, the name of the (unmodified) file the
+        workspace was read from: the catalog is then taken from the
+        sidecar file next to it if up to date or stored there otherwise
+    """
+    import ROOT
+
+    key = _workspaceKey(ws)
+
+    if not refresh and key in _formulaCatalogs:
+        return _formulaCatalogs[key][1]
+
+    sidecarKey = "formulas:" + ws.GetName()
+
+    catalog = None
+    if fname != None and not refresh:
+        data = loadSidecar(fname, sidecarKey)
+        if data != None:
+            catalog = dict((name, (formula, tuple(paramNames))) for name, formula, paramNames in data)
+
+    if catalog == None:
+        declareHelper("formulaCatalog", _formulaCatalogCode)
+
+        result = ROOT.rfwsutils.getFormulaCatalog(ws)
+
+        names = str(result.names).split("\n")[:-1]
+        formulas = str(result.formulas).split("\n")[:-1]
+        paramNames = str(result.paramNames).split("\n")[:-1]
+
+        catalog = {}
+        pos = 0
+        for name, formula, numParams in zip(names, formulas, result.numParams):
+            catalog[name] = (formula, tuple(paramNames[pos:pos + numParams]))
+            pos += numParams
+
+        if fname != None:
+            saveSidecar(fname, sidecarKey, [ (name, formula, list(params))
+                                             for name, (formula, params) in sorted(catalog.items()) ])
+
+    _formulaCatalogs[key] = (ws, catalog)
+
+    return catalog
+
+#----------------------------------------------------------------------
+
+# classes whose instances are completely described by their class, the
+# attributes returned by getNodeAttributes(..) and their servers (in
+# addition to variables, constants, categories and the classes with
+# dedicated attributes in getNodeAttributes(..)). Instances of other
+# classes may have internal state which is not extracted (e.g.
+# histograms, spline coefficients or flags) and are 'unhashable'.
+_hashableClasses = set([
+    "RooFormulaVar",
+    "RooGenericPdf",
+    "RooProduct",
+    "RooAddition",
+    "RooAddPdf",
+    "RooExtendPdf",
+    "RooGaussian",
+    "RooBifurGauss",
+    "RooLognormal",
+    "RooLandau",
+    "RooChebychev",
+    "RooBernstein",
+    ])
+
+def _getServerNames(obj):
+    """ @return the names of the servers of obj in the order
+        of the workspace graph """
+    retval = []
+    it = obj.serverIterator()
+    while True:
+        server = it.Next()
+        if server == None:
+            break
+        retval.append(server.GetName())
+    return retval
+
+def getDataDigest(data):
+    """ @return a hex digest of the coordinates and weights of all
+        entries (or bins) of the given dataset """
+    import hashlib
+
+    h = hashlib.sha1()
+
+    for i in range(data.numEntries()):
+        coords = data.get(i)
+        h.update(",".join(_formatAttribute(var.getVal()) if var.InheritsFrom("RooAbsReal") else str(var.getIndex())
+                          for var in rooArgSetToList(coords)))
+        h.update("=" + _formatAttribute(data.weight()) + "\0")
+
+    return h.hexdigest()
+
+def _formatNormSet(normSet):
+    """ @return a string describing a normalization set of a RooProdPdf """
+    if normSet == None:
+        return ""
+    return normSet.GetName() + ":" + ",".join(sorted(arg.GetName() for arg in rooArgSetToList(normSet)))
+
+def getNodeAttributes(obj, formula = None, paramNames = None):
+    """ @return a list of (name, value) pairs describing the given
+        workspace member itself, i.e. not including its name,
+        its class name and its servers.
+
+        For members whose class may have internal state which is
+        not extracted here, ('unhashable', True) is returned
+        (see computeHashes(..)).
+
+        Formula expressions refer to the parameters by their position
+        among the servers of obj (see normalizeFormula(..)), so
+        formulas differing only in how the parameters are named
+        get the same attributes.
+
+        @param formula, paramNames the formula expression of obj and
+        the names of its parameters if already known
+        (see getFormulaCatalog(..))
+    """
+
+    retval = []
+
+    if obj.InheritsFrom("RooAbsRealLValue"):
+        retval += [ ('value', obj.getVal()),
+                    ('min', obj.getMin()),
+                    ('max', obj.getMax()),
+                    ('bins', obj.getBins()),
+                    ('constant', bool(obj.isConstant())),
+                    ]
+
+    elif obj.InheritsFrom("RooConstVar"):
+        retval.append(('value', obj.getVal()))
+
+    elif obj.InheritsFrom("RooAbsCategory"):
+        retval.append(('states', ",".join(getCategoryLabels(obj))))
+
+    elif obj.ClassName() in ("RooHistFunc", "RooHistPdf"):
+        retval += [ ('histogram', getDataDigest(obj.dataHist())),
+                    ('interpolationOrder', obj.getInterpolationOrder()),
+                    ]
+
+    elif obj.ClassName() in ("RooPolyVar", "RooPolynomial") and hasattr(obj, 'lowestOrder'):
+        retval.append(('lowestOrder', obj.lowestOrder()))
+
+    elif obj.ClassName() == "RooSimultaneous":
+        # the position of the pdf among the servers for each state
+        serverNames = _getServerNames(obj)
+        retval.append(('pdfs', ",".join("%s:%d" % (label, serverNames.index(obj.getPdf(label).GetName()))
+                                        for label in getCategoryLabels(obj.indexCat())
+                                        if obj.getPdf(label) != None)))
+
+    elif obj.ClassName() == "RooProdPdf":
+        # the normalization sets given with Conditional(..) are not servers
+        if hasattr(obj, 'findPdfNSet'):
+            retval.append(('normSets', ";".join(_formatNormSet(obj.findPdfNSet(pdf))
+                                                for pdf in rooArgSetToList(obj.pdfList()))))
+        else:
+            retval.append(('unhashable', True))
+
+    elif obj.ClassName() == "RooRealSumPdf":
+        retval += [ ('funcs', obj.funcList().getSize()),
+                    ('extended', int(obj.extendMode())),
+                    ]
+        if hasattr(obj, 'getFloor'):
+            retval.append(('floor', bool(obj.getFloor())))
+
+    elif not obj.ClassName() in _hashableClasses:
+        retval.append(('unhashable', True))
+
+    if obj.InheritsFrom("RooFormulaVar") or obj.InheritsFrom("RooGenericPdf"):
+        if formula == None:
+            formula = getFormulaString(obj)
+
+        if paramNames == None:
+            if hasattr(obj, 'getParameter'):
+                paramNames = [ param.GetName() for param in getFormulaParameters(obj) ]
+            else:
+                paramNames = _getServerNames(obj)
+
+        # refer to the parameters by their position among the servers
+        serverNames = _getServerNames(obj)
+        positions = [ serverNames.index(name) if name in serverNames else i
+                      for i, name in enumerate(paramNames) ]
+
+        formula = re.sub(r'@(\d+)',
+                         lambda mo: "@%d" % positions[int(mo.group(1))] if int(mo.group(1)) < len(positions) else mo.group(0),
+                         normalizeFormula(formula, paramNames))
+
+        retval.append(('formula', formula))
+
+    return retval
+
+#----------------------------------------------------------------------
+
+# cache for classInheritsFrom(..)
+_inheritsFrom = {}
+
+def classInheritsFrom(className, baseName):
+    """ @return True if the class with the given name inherits from
+        (or is) the class baseName """
+
+    key = (className, baseName)
+    if not key in _inheritsFrom:
+        import ROOT
+        cls = ROOT.TClass.GetClass(className)
+        _inheritsFrom[key] = bool(cls) and bool(cls.InheritsFrom(baseName))
+
+    return _inheritsFrom[key]
+
+#----------------------------------------------------------------------
+
+def _formatAttribute(value):
+    if isinstance(value, float):
+        # full precision, independent of the python version
+        return '%.17g' % value
+    return str(value)
+
+def getAllNodeAttributes(ws):
+    """ @return a list with the result of getNodeAttributes(..) for all
+        components of the workspace, indexed like the nodes of getGraph(ws) """
+
+    catalog = getFormulaCatalog(ws)
+
+    return [ getNodeAttributes(ws.obj(name), *catalog.get(name, (None, None))) for name in getGraph(ws).names ]
+
+#----------------------------------------------------------------------
+
+# prefix of the digests of unhashable members (see computeHashes(..))
+unhashablePrefix = "!"
+
+def computeHashes(ws, includeLeafNames = True, attributes = None):
+    """ computes a structural (Merkle) hash for each component of the
+        workspace from its class name, its own attributes (see
+        getNodeAttributes(..)) and the hashes of its servers (in order).
+        Names of nodes do not enter the hash, except for those of
+        fundamental nodes (variables and categories) if includeLeafNames
+        is True: two parameters with the same values are not
+        interchangeable, so by default functions of different parameters
+        get different hashes.
+
+        The hashes of unhashable members (whose internal state is not
+        known, see getNodeAttributes(..)) include their name, so
+        such members are never considered identical to another member
+        in the same workspace. Their digests start with
+        unhashablePrefix: equal digests of such members in different
+        workspaces do not imply that they are identical
+        (see isUnhashable(..)).
+
+        @param attributes the result of getAllNodeAttributes(ws) if
+        already available
+
+        @return a list of hex digests, indexed like the nodes of
+        getGraph(ws)
+    """
+    import hashlib
+
+    graph = getGraph(ws)
+
+    if attributes == None:
+        attributes = getAllNodeAttributes(ws)
+
+    digests = [ None ] * len(graph)
+    unhashable = [ ('unhashable', True) in nodeAttributes for nodeAttributes in attributes ]
+
+    for node in graph.topologicalOrder():
+        name = graph.names[node]
+        className = graph.classNames[node]
+
+        h = hashlib.sha1(className)
+
+        for key, value in attributes[node]:
+            h.update("\0%s=%s" % (key, _formatAttribute(value)))
+
+        if includeLeafNames and (classInheritsFrom(className, "RooAbsRealLValue") or
+                                 classInheritsFrom(className, "RooAbsCategoryLValue")):
+            h.update("\0name=" + name)
+
+        if unhashable[node]:
+            h.update("\0name=" + name)
+
+        h.update("\0servers")
+        for server in graph.servers[node]:
+            h.update(digests[server])
+
+        digests[node] = h.digest()
+
+    return [ (unhashablePrefix if unhashable[node] else "") + digest.encode('hex')
+             for node, digest in enumerate(digests) ]
+
+def isUnhashable(digest):
+    """ @return True if the given digest (as returned by computeHashes(..))
+        is the one of a member whose internal state is not known,
+        i.e. which may differ from a member with the same digest
+        in another workspace """
+    return digest.startswith(unhashablePrefix)
+
+#----------------------------------------------------------------------
+
+def getModelConfigs(ws):
+    """ @return the list of RooStats::ModelConfig objects stored in the workspace """
+    import ROOT
+
+    return [ obj for obj in ws.allGenericObjects() if isinstance(obj, ROOT.RooStats.ModelConfig) ]
+
+#----------------------------------------------------------------------
+
+def rebuildWorkspace(ws, dropNames = set(), extraRoots = []):
+    """ copies the top level objects (and thus everything they depend
+        on), all datasets, snapshots, named sets and ModelConfigs into
+        a new workspace. Used after modifying the graph of objects
+        (e.g. with replaceNodes(..)) to drop the objects which
+        are not used anymore.
+
+        @param dropNames names of objects which must not be copied even
+        if they are top level objects (e.g. the nodes which were replaced)
+
+        @param extraRoots further objects (not in ws) to be copied,
+        e.g. replacements of top level objects
+    """
+
+    graph = getGraph(ws, refresh = True)
+
+    roots = [ ws.obj(graph.names[node]) for node in graph.topLevelNodes()
+              if not graph.names[node] in dropNames ] + list(extraRoots)
+
+    try:
+        snapshotNames = getSnapshotNames(ws)
+    except Exception, ex:
+        print >> sys.stderr,"WARNING: snapshots are not copied:",ex
+        snapshotNames = []
+
+    return copyToNewWorkspace(ws, roots,
+                              dataNames = [ data.GetName() for data in rootListTolist(ws.allData()) ],
+                              snapshotNames = snapshotNames,
+                              modelConfigs = getModelConfigs(ws))
+
+#----------------------------------------------------------------------
+
+def replaceNodes(ws, replacements, exclude = set()):
+    """ makes the clients of nodes in the workspace use new nodes instead.
+
+        @param replacements is a list of new nodes (not in the
+        workspace) with the same names as the nodes they replace
+
+        @param exclude names of clients which should not be modified
+
+        Note that the replaced nodes stay in the workspace, use
+        rebuildWorkspace(..) to get rid of them.
+    """
+    import ROOT
+
+    graph = getGraph(ws)
+
+    for newNode in replacements:
+        newSet = ROOT.RooArgSet(newNode)
+
+        for client in graph.clients[graph.index[newNode.GetName()]]:
+            if graph.names[client] in exclude:
+                continue
+
+            # servers are matched by name
+            ws.obj(graph.names[client]).redirectServers(newSet, False, False)
+
+#----------------------------------------------------------------------
+
+def deleteNodes(ws, objs):
+    """ removes the given objects from the components of the workspace
+        in place (if they are still there) and deletes them, which also
+        removes them from the client lists of their servers. Unlike
+        rebuildWorkspace(..), this does not touch any other member.
+
+        Clients must come before their servers in objs and no object
+        outside objs may still use them as servers (use replaceNodes(..)
+        first). The given python references must not be used anymore
+        afterwards and getGraph(ws, refresh = True) must be called
+        before the graph of ws is used again.
+    """
+
+    for obj in objs:
+        # silent: the object may have been removed from the
+        # components already
+        ws.components().remove(obj, True)
+        obj.IsA().Destructor(obj)
+
+#----------------------------------------------------------------------
+
+def parseNLLSpecs(specs):
+    """ @return a list of (pdf name, dataset name) pairs from the given
+        PDF,DATA arguments (of --nll). Prints an error message and exits
+        if an argument does not have this form. """
+
+    retval = []
+    for spec in specs:
+        parts = spec.split(",")
+        if len(parts) != 2:
+            print >> sys.stderr,"expected PDF,DATA for --nll but got '%s'" % spec
+            sys.exit(1)
+        retval.append(tuple(parts))
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def timeNLL(pdf, data, numEvaluations = 10):
+    """ @return the average wall time for evaluating the negative log
+        likelihood of pdf on data. All floating parameters are touched
+        before each evaluation so that nothing is taken from caches. """
+    import time
+
+    nll = pdf.createNLL(data)
+
+    params = [ param for param in rooArgSetToList(nll.getParameters(data))
+               if param.InheritsFrom("RooRealVar") and not param.isConstant() ]
+
+    # the first evaluation may include initialization
+    nll.getVal()
+
+    startTime = time.time()
+    for i in range(numEvaluations):
+        for param in params:
+            param.setVal(param.getVal())
+        nll.getVal()
+
+    return (time.time() - startTime) / numEvaluations
+
+#----------------------------------------------------------------------
+
+def timeFunctions(funcs, numEvaluations = 100):
+    """ @return the average wall time for evaluating all of the given
+        functions once. All floating parameters of the functions are
+        touched before each evaluation so that nothing is taken
+        from caches. """
+    import time, ROOT
+
+    params = {}
+    for func in funcs:
+        for param in rooArgSetToList(func.getParameters(ROOT.RooArgSet())):
+            if param.InheritsFrom("RooRealVar") and not param.isConstant():
+                params[param.GetName()] = param
+
+    params = params.values()
+
+    startTime = time.time()
+    for i in range(numEvaluations):
+        for param in params:
+            param.setVal(param.getVal())
+        for func in funcs:
+            func.getVal()
+
+    return (time.time() - startTime) / numEvaluations
+
+#----------------------------------------------------------------------
+
+_profileCode = """
+#include "RVersion.h"
+#include "RooAbsArg.h"
+#include "RooAbsReal.h"
+#include "RooAbsPdf.h"
+#include "RooAbsCategory.h"
+#include "RooAbsData.h"
+#include "RooArgSet.h"
+#include "RooArgList.h"
+#include "RooRealVar.h"
+#include "RooSimultaneous.h"
+
+#include <vector>
+#include <chrono>
+
+namespace rfwsutils {
+
+  typedef std::chrono::steady_clock ProfileClock;
+
+  enum ProfileNodeKind { PROFILE_PDF, PROFILE_REAL, PROFILE_CATEGORY, PROFILE_OTHER };
+
+  struct ProfileResult {
+    // exclusive time per node in seconds, indexed like the nodes given
+    std::vector<double> times;
+
+    // time for evaluating the top node alone
+    double plainTime;
+  };
+
+  // touches the floating parameters so that nothing is taken from caches
+  void touchParameters(const RooArgList &params) {
+    for (int i = 0; i < params.getSize(); ++i) {
+      RooRealVar *var = dynamic_cast<RooRealVar *>(params.at(i));
+      if (var != NULL && !var->isConstant())
+        var->setVal(var->getVal());
+    }
+  }
+
+  int getProfileNodeKind(RooAbsArg *arg) {
+    if (dynamic_cast<RooAbsPdf *>(arg) != NULL)
+      return PROFILE_PDF;
+    if (dynamic_cast<RooAbsReal *>(arg) != NULL)
+      return PROFILE_REAL;
+    if (dynamic_cast<RooAbsCategory *>(arg) != NULL)
+      return PROFILE_CATEGORY;
+    return PROFILE_OTHER;
+  }
+
+  void evaluateNode(RooAbsArg *arg, int kind, const RooArgSet *normSet) {
+    switch (kind) {
+      case PROFILE_PDF:
+        static_cast<RooAbsPdf *>(arg)->getVal(normSet);
+        break;
+      case PROFILE_REAL:
+        static_cast<RooAbsReal *>(arg)->getVal();
+        break;
+      case PROFILE_CATEGORY:
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,22,0)
+        static_cast<RooAbsCategory *>(arg)->getCurrentIndex();
+#else
+        static_cast<RooAbsCategory *>(arg)->getIndex();
+#endif
+        break;
+    }
+  }
+
+  // @return the pdf of the given RooSimultaneous for the current
+  // state of its index category
+  RooAbsPdf *getActivePdf(RooSimultaneous *sim) {
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,22,0)
+    return sim->getPdf(sim->indexCat().getCurrentLabel());
+#else
+    return sim->getPdf(sim->indexCat().getLabel());
+#endif
+  }
+
+  // nodes must be ordered such that servers come before their
+  // clients, the last node is the top node. The servers of node k
+  // (as indices into nodes) are serverIndices[serverStart[k]] to
+  // serverIndices[serverStart[k+1] - 1]. Nodes with timed[k] == 0
+  // are not evaluated separately but by their clients.
+  ProfileResult profileNodes(const RooArgList &nodes,
+                             const std::vector<int> &serverStart,
+                             const std::vector<int> &serverIndices,
+                             const std::vector<int> &timed,
+                             RooArgSet &observables,
+                             const RooArgList &params, RooAbsData &data,
+                             const RooArgSet *normSet, int numPasses) {
+    ProfileResult result;
+    result.times.assign(nodes.getSize(), 0.);
+    result.plainTime = 0;
+
+    std::vector<RooAbsArg *> args;
+    std::vector<int> kinds;
+    std::vector<RooSimultaneous *> sims;
+    for (int k = 0; k < nodes.getSize(); ++k) {
+      args.push_back(nodes.at(k));
+      kinds.push_back(getProfileNodeKind(nodes.at(k)));
+      sims.push_back(dynamic_cast<RooSimultaneous *>(nodes.at(k)));
+    }
+
+    if (args.empty())
+      return result;
+
+    const int numNodes = args.size();
+    RooAbsArg *top = args.back();
+    int topKind = kinds.back();
+
+    std::vector<char> active(numNodes);
+
+    for (int pass = 0; pass < numPasses; ++pass) {
+
+      // each node separately: when a node is evaluated, its
+      // servers are up to date already
+      touchParameters(params);
+      for (int i = 0; i < data.numEntries(); ++i) {
+        observables.assignValueOnly(*data.get(i));
+
+        // only the pdf of the current category state
+        // of a RooSimultaneous is evaluated
+        active.assign(numNodes, 0);
+        active[numNodes - 1] = 1;
+        for (int k = numNodes - 1; k >= 0; --k) {
+          if (!active[k])
+            continue;
+
+          RooAbsPdf *activePdf = sims[k] != NULL ? getActivePdf(sims[k]) : NULL;
+
+          for (int j = serverStart[k]; j < serverStart[k + 1]; ++j) {
+            int server = serverIndices[j];
+            if (sims[k] != NULL && kinds[server] == PROFILE_PDF && args[server] != activePdf)
+              continue;
+            active[server] = 1;
+          }
+        }
+
+        for (int k = 0; k < numNodes; ++k) {
+          if (!active[k] || !timed[k])
+            continue;
+
+          ProfileClock::time_point start = ProfileClock::now();
+          evaluateNode(args[k], kinds[k], normSet);
+          result.times[k] += std::chrono::duration<double>(ProfileClock::now() - start).count();
+        }
+      }
+
+      // the top node alone for comparison
+      touchParameters(params);
+      ProfileClock::time_point start = ProfileClock::now();
+      for (int i = 0; i < data.numEntries(); ++i) {
+        observables.assignValueOnly(*data.get(i));
+        evaluateNode(top, topKind, normSet);
+      }
+      result.plainTime += std::chrono::duration<double>(ProfileClock::now() - start).count();
+    }
+
+    return result;
+  }
+
+} // namespace rfwsutils
+"""
+
+# pdfs which evaluate their component pdfs with their own normalization
+# set, so the components can be timed separately with the same one
+_normSetPassingClasses = [
+    "RooAddPdf",
+    "RooSimultaneous",
+    "RooMultiPdf",
+    "RooExtendPdf",
+    ]
+
+def profileNodes(ws, pdfName, data, numPasses = 1):
+    """ measures the wall time spent in each member of the workspace
+        below the given pdf (including the pdf itself) when evaluating
+        the pdf for all entries of data after touching all floating
+        parameters, i.e. like one evaluation of the negative log
+        likelihood.
+
+        For each entry, the nodes are evaluated in topological order, so
+        the servers of a node are already up to date when it is
+        evaluated and its time does not include theirs (exclusive
+        time). Variables and categories are not timed. Work not
+        represented by a workspace member (e.g. normalization
+        integrals) is attributed to the member doing it.
+
+        Only the branches RooFit evaluates are timed: the selected pdf
+        of a RooMultiPdf and, for each entry, the pdf of the current
+        category of a RooSimultaneous. Pdfs which are evaluated with a
+        normalization set different from the one of pdfName (e.g. the
+        factors of a RooProdPdf) are not timed separately, their time
+        is included in the exclusive time of their clients.
+
+        @return (list of node indices into getGraph(ws) which were
+        timed, numpy array of their exclusive times per pass in
+        seconds, time per pass for evaluating the pdf alone)
+    """
+    import ROOT, numpy
+
+    declareHelper("profileNodes", _profileCode)
+
+    graph = getGraph(ws)
+
+    pdf = ws.obj(pdfName)
+    top = graph.index[pdfName]
+
+    # the members below the pdf, following only the selected
+    # pdf of RooMultiPdfs
+    below = set([ top ])
+    queue = [ top ]
+    while queue:
+        node = queue.pop()
+        servers = graph.servers[node]
+
+        if classInheritsFrom(graph.classNames[node], "RooMultiPdf"):
+            selected = ws.obj(graph.names[node]).getCurrentPdf().GetName()
+            servers = [ server for server in servers
+                        if graph.names[server] == selected or
+                        not classInheritsFrom(graph.classNames[server], "RooAbsPdf") ]
+
+        for server in servers:
+            if not server in below:
+                below.add(server)
+                queue.append(server)
+
+    nodes = [ node for node in graph.topologicalOrder() if node in below and
+              not classInheritsFrom(graph.classNames[node], "RooAbsRealLValue") and
+              not classInheritsFrom(graph.classNames[node], "RooAbsCategoryLValue") ]
+
+    positions = dict((node, k) for k, node in enumerate(nodes))
+
+    # pdfs are timed separately only if all their clients evaluate
+    # them with the normalization set of the top pdf (clients
+    # come before their servers in this loop)
+    timed = {}
+    for node in reversed(nodes):
+        if node == top or not classInheritsFrom(graph.classNames[node], "RooAbsPdf"):
+            timed[node] = True
+            continue
+
+        clients = [ client for client in graph.clients[node] if client in positions ]
+        timed[node] = all(timed[client] and
+                          any(classInheritsFrom(graph.classNames[client], className)
+                              for className in _normSetPassingClasses)
+                          for client in clients)
+
+    nodeList = ROOT.RooArgList()
+    serverStart = ROOT.std.vector('int')()
+    serverIndices = ROOT.std.vector('int')()
+    timedFlags = ROOT.std.vector('int')()
+
+    for node in nodes:
+        nodeList.add(ws.obj(graph.names[node]))
+        serverStart.push_back(serverIndices.size())
+        for server in graph.servers[node]:
+            if server in positions:
+                serverIndices.push_back(positions[server])
+        timedFlags.push_back(int(timed[node]))
+    serverStart.push_back(serverIndices.size())
+
+    observables = pdf.getObservables(data)
+
+    params = ROOT.RooArgList()
+    for param in rooArgSetToList(pdf.getParameters(data)):
+        if param.InheritsFrom("RooRealVar") and not param.isConstant():
+            params.add(param)
+
+    result = ROOT.rfwsutils.profileNodes(nodeList, serverStart, serverIndices, timedFlags,
+                                         observables, params, data, observables, numPasses)
+
+    times = stdVectorToArray(result.times, numpy.float64) / numPasses
+    selected = [ k for k, node in enumerate(nodes) if timed[node] ]
+
+    return [ nodes[k] for k in selected ], times[selected], result.plainTime / numPasses
+
+#----------------------------------------------------------------------